@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
-from incawrapper.core import load_matlab_file
-from dataclasses import dataclass
+from incawrapper.core.matlab_file_cache import MatlabFileCache
+from collections.abc import Mapping
+from dataclasses import dataclass, field
 import pathlib
-from typing import Dict, Iterable, Callable
+from typing import Dict, Iterable, Callable, Optional
 import scipy.stats
 
 
@@ -19,6 +20,10 @@ class INCAFitData:
     ----------
     inca_matlab_file : pathlib.Path
         The path to the matlab file containing the INCA output.
+    matlab_file_cache : MatlabFileCache, optional
+        Cache holding the parsed matlab file. INCAResults passes the same cache to all
+        the objects it creates, such that the file is only parsed once. If None, a new cache
+        is created.
 
     Attributes
     ----------
@@ -28,6 +33,8 @@ class INCAFitData:
     degrees_of_freedom
     expected_chi2
     fitted_parameters
+    covariance_matrix
+    correlation_matrix
     measurements_and_fit_overview
     measurements_and_fit_detailed
 
@@ -36,10 +43,18 @@ class INCAFitData:
     The data in the this object is directly parsed from the matlab file and is not modified
     by the incawrapper package. Thus, please refer to the INCA documentation for more information
     on how they are calculated.
+
+    The data frames are computed on the first access and memoized in the matlab_file_cache. The
+    same data frame object is returned on later accesses, thus copy it before modifying it in place.
     """
 
     inca_matlab_file: pathlib.Path
     """The path to the matlab file containing the INCA output."""
+    matlab_file_cache: Optional[MatlabFileCache] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.matlab_file_cache is None:
+            self.matlab_file_cache = MatlabFileCache(self.inca_matlab_file)
 
     @property
     def raw(self) -> Dict:
@@ -49,7 +64,7 @@ class INCAFitData:
         -------
         Dict
             This attribute contains the raw fitdata from the INCA output."""
-        return load_matlab_file.load_matlab_file(self.inca_matlab_file)["f"]
+        return self.matlab_file_cache["f"]
 
     @property
     def alpha(self) -> float:
@@ -60,7 +75,7 @@ class INCAFitData:
         float
             This attribute contains the alpha value used for to obtain the confidence intervals.
         """
-        return self.raw["alf"]
+        return self.matlab_file_cache.get_derived("fitdata.alpha", lambda: self.raw["alf"])
 
     @property
     def chi2(self) -> float:
@@ -71,7 +86,7 @@ class INCAFitData:
         float
             This attribute contains the chi2 value of the fit.
         """
-        return self.raw["chi2"]
+        return self.matlab_file_cache.get_derived("fitdata.chi2", lambda: self.raw["chi2"])
 
     @property
     def degrees_of_freedom(self) -> int:
@@ -83,7 +98,7 @@ class INCAFitData:
             This attribute contains the degrees of freedom of the fit.
         """
 
-        return self.raw["dof"]
+        return self.matlab_file_cache.get_derived("fitdata.degrees_of_freedom", lambda: self.raw["dof"])
 
     @property
     def expected_chi2(self) -> Iterable[float]:
@@ -95,7 +110,7 @@ class INCAFitData:
         Iterable[float]
             This attribute contains the expected chi2 interval of the fit.
         """
-        return self.raw["Echi2"]
+        return self.matlab_file_cache.get_derived("fitdata.expected_chi2", lambda: self.raw["Echi2"])
 
     @property
     def fitted_parameters(self) -> pd.DataFrame:
@@ -124,32 +139,87 @@ class INCAFitData:
             * vals: value of the parameter of each restart of the estimation algorithm (length of vals is
             equal to the number of fit_starts option)
             * base: don't know what this is
+
+            Use `covariance_matrix` and `correlation_matrix` to get the cor and cov vectors as
+            matrices.
         """
-        df = (
-            pd.DataFrame.from_records(self.raw["par"])
-            .reindex(
-                columns=[
-                    "type",
-                    "id",
-                    "eqn",
-                    "val",
-                    "std",
-                    "lb",
-                    "ub",
-                    "unit",
-                    "free",
-                    "alf",
-                    "chi2s",
-                    "cont",
-                    "cor",
-                    "cov",
-                    "vals",
-                    "base",
-                ]
-            )
-            .apply(lambda x: pd.to_numeric(x, errors="ignore"))
+        return self.matlab_file_cache.get_derived(
+            "fitdata.fitted_parameters", self._parse_fitted_parameters
+        )
+
+    def _parse_fitted_parameters(self) -> pd.DataFrame:
+        """Parse the fitted parameters from the raw INCA results. Columns with only numeric
+        values get a numeric dtype, all other columns (e.g. the cor and cov vectors) are kept as
+        object columns."""
+        parameters = _as_records(self.raw["par"])
+        columns = {
+            name: _typed_column([parameter.get(name, np.nan) for parameter in parameters])
+            for name in [
+                "type",
+                "id",
+                "eqn",
+                "val",
+                "std",
+                "lb",
+                "ub",
+                "unit",
+                "free",
+                "alf",
+                "chi2s",
+                "cont",
+                "cor",
+                "cov",
+                "vals",
+                "base",
+            ]
+        }
+        return pd.DataFrame(columns)
+
+    @property
+    def covariance_matrix(self) -> pd.DataFrame:
+        """
+        Gets the covariance matrix of the fitted parameters. The matrix is assembled once from
+        the cov column of fitted_parameters and memoized.
+
+        Returns
+        -------
+        pd.DataFrame
+            Square data frame with the parameter ids as index and columns. `.to_numpy()` gives the
+            underlying contiguous 2D float array without copying.
+        """
+        return self.matlab_file_cache.get_derived(
+            "fitdata.covariance_matrix", lambda: self._assemble_parameter_matrix("cov")
         )
-        return df
+
+    @property
+    def correlation_matrix(self) -> pd.DataFrame:
+        """
+        Gets the correlation matrix of the fitted parameters. The matrix is assembled once from
+        the cor column of fitted_parameters and memoized.
+
+        Returns
+        -------
+        pd.DataFrame
+            Square data frame with the parameter ids as index and columns.
+        """
+        return self.matlab_file_cache.get_derived(
+            "fitdata.correlation_matrix", lambda: self._assemble_parameter_matrix("cor")
+        )
+
+    def _assemble_parameter_matrix(self, column: str) -> pd.DataFrame:
+        """Stack the per-parameter vectors of the cor or cov column into a square matrix."""
+        parameters = self.fitted_parameters
+        ids = parameters["id"].tolist()
+        matrix = np.empty((len(ids), len(ids)), dtype=float)
+        for row, vector in enumerate(parameters[column]):
+            vector = np.atleast_1d(np.asarray(vector, dtype=float))
+            if vector.shape != (len(ids),):
+                raise ValueError(
+                    f"The {column} vector of the parameter {ids[row]} has {vector.size} values, "
+                    f"expected {len(ids)}"
+                )
+            matrix[row] = vector
+        return pd.DataFrame(matrix, index=pd.Index(ids, name="id"), columns=ids, copy=False)
 
     @property
     def measurements_and_fit_overview(self):
@@ -160,6 +230,11 @@ class INCAFitData:
         experiment. Further for fragements this combines all the all mass isopote
         measurements within the fragment.
         """
+        return self.matlab_file_cache.get_derived(
+            "fitdata.measurements_and_fit_overview", self._parse_measurements_and_fit_overview
+        )
+
+    def _parse_measurements_and_fit_overview(self) -> pd.DataFrame:
         overview = pd.DataFrame.from_records(self.raw["mnt"]).drop(
             columns=["res"]
         )  # drop the residuals infomation. This is accessed seperatly through the measurements_and_fit_detailed attribute
@@ -186,32 +261,39 @@ class INCAFitData:
             * cont: contribution of the measurement to each fitted parameter.
             * base: DONT know what this is
         """
-        detailed_info = np.array([])
-        for measurement in self.raw["mnt"]:
-            detailed_info = np.append(detailed_info, measurement["res"])
-        df = (
-            pd.DataFrame.from_records(detailed_info)
-            # drop the columns which are not needed
-            # esens and msens are the sensitivity diagnostics, which are handled seperatly
-            .drop(columns=["esens", "msens", "cont"])
-            .rename(columns={"val": "weighted residual"})
-            .reindex(
-                columns=[
-                    "type",
-                    "expt",
-                    "id",
-                    "peak",
-                    "time",
-                    "data",
-                    "std",
-                    "fit",
-                    "weighted residual",
-                    "cont",
-                    "base",
-                ]
-            )
+        return self.matlab_file_cache.get_derived(
+            "fitdata.measurements_and_fit_detailed", self._parse_measurements_and_fit_detailed
         )
-        return df
+
+    def _parse_measurements_and_fit_detailed(self) -> pd.DataFrame:
+        """Parse the residuals of all measurements from the raw INCA results. The residual
+        records are collected in a single pass and each column is created with its final dtype,
+        the numeric columns as float and the other columns as object columns with the values
+        from the results file. The sensitivity diagnostics (esens and msens) are handled
+        seperatly and not included."""
+        residuals = [
+            residual
+            for measurement in _as_records(self.raw["mnt"])
+            for residual in _as_records(measurement["res"])
+        ]
+        columns = {}
+        # the peak is an empty matlab array for measurements without peaks, e.g. fluxes
+        for name in ["type", "expt", "id", "peak"]:
+            columns[name] = _object_column([residual[name] for residual in residuals])
+        for name, source in [
+            ("time", "time"),
+            ("data", "data"),
+            ("std", "std"),
+            ("fit", "fit"),
+            ("weighted residual", "val"),
+        ]:
+            columns[name] = np.fromiter(
+                (residual[source] for residual in residuals), dtype=float, count=len(residuals)
+            )
+        # the contributions are not parsed, the column is kept for backwards compatibility
+        columns["cont"] = np.full(len(residuals), np.nan)
+        columns["base"] = _object_column([residual["base"] for residual in residuals])
+        return pd.DataFrame(columns)
 
     def get_goodness_of_fit(self) -> None:
         """
@@ -247,3 +329,34 @@ Expected chi-square range: {self.expected_chi2}"""
         print(
             f"Residuals are normally distributed: {p_value > alpha} on a {alpha} significance level"
         )
+
+
+def _as_records(value) -> list:
+    """Return the structs of a parsed matlab struct or struct array as a list of mappings. Handles
+    the dictionaries and lazy proxies that load_matlab_file can return. Empty arrays give an
+    empty list."""
+    if isinstance(value, Mapping):
+        return [value]
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        return [record for elem in value.ravel() for record in _as_records(elem)]
+    return []
+
+
+def _typed_column(values: list):
+    """Create a column with an integer or float dtype if all values are numeric scalars, else an
+    object column. Empty matlab arrays count as missing (NaN) values in numeric columns."""
+    numeric = [np.nan if isinstance(v, np.ndarray) and v.size == 0 else v for v in values]
+    value_types = set(map(type, numeric))
+    if value_types and all(issubclass(t, (int, np.integer)) and not issubclass(t, bool) for t in value_types):
+        return np.array(numeric, dtype=np.int64)
+    if value_types and all(issubclass(t, (int, float, np.integer, np.floating)) for t in value_types):
+        return np.array(numeric, dtype=float)
+    return _object_column(values)
+
+
+def _object_column(values: list) -> np.ndarray:
+    """Create an object column. np.array can not be used, as it would turn a list of equally long
+    vectors into a 2D array."""
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
@@ -1,9 +1,9 @@
 import pandas as pd
 import numpy as np
-from incawrapper.core import load_matlab_file
-from dataclasses import dataclass
+from incawrapper.core.matlab_file_cache import MatlabFileCache
+from dataclasses import dataclass, field
 import pathlib
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 @dataclass
 class INCAModel:
@@ -17,6 +17,10 @@ class INCAModel:
     -----------
     inca_matlab_file : pathlib.Path
         Path to the .mat file produced by INCA.
+    matlab_file_cache : MatlabFileCache, optional
+        Cache holding the parsed matlab file. INCAResults passes the same cache to all
+        the objects it creates, such that the file is only parsed once. If None, a new cache
+        is created.
 
     Attributes
     -----------
@@ -27,6 +31,11 @@ class INCAModel:
     """
 
     inca_matlab_file: pathlib.Path
+    matlab_file_cache: Optional[MatlabFileCache] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.matlab_file_cache is None:
+            self.matlab_file_cache = MatlabFileCache(self.inca_matlab_file)
 
     @property
     def raw(self) -> Dict:
@@ -39,7 +48,7 @@ class INCAModel:
         Dict
             Dictionary with the model information
         """
-        return load_matlab_file.load_matlab_file(self.inca_matlab_file)['m']
+        return self.matlab_file_cache['m']
 
     @property
     def inca_options(self) -> Dict:
@@ -68,8 +77,10 @@ class INCAModel:
         List 
             List of metabolite ids
         """
-        metabolites = pd.DataFrame.from_records(self.raw["mets"])
-        return metabolites["id"].to_list()
+        return self.matlab_file_cache.get_derived(
+            "model.metabolite_ids",
+            lambda: pd.DataFrame.from_records(self.raw["mets"])["id"].to_list(),
+        )
 
     @property
     def states(self) -> pd.DataFrame:
@@ -82,13 +93,19 @@ class INCAModel:
         pd.DataFrame
             Dataframe with the states
         """
-        return pd.DataFrame.from_records(self.raw["states"])
-    
+        return self.matlab_file_cache.get_derived(
+            "model.states", lambda: pd.DataFrame.from_records(self.raw["states"])
+        )
+
     
     @property
     def rates(self)->pd.DataFrame:
         """Extract the reaction ids from the raw model data. Reactions that are reversible has two ids
         one for the forward and one for exchange direction.""" 
+        return self.matlab_file_cache.get_derived("model.rates", self._parse_rates)
+
+    def _parse_rates(self) -> pd.DataFrame:
+        """Parse the rates from the raw model data."""
         rates_collector = []
         for rate in self.raw['rates']:
             if type(rate['flx']) == dict:
@@ -100,7 +117,27 @@ class INCAModel:
     
     @property
     def rates_in_net_exch_format(self) -> pd.DataFrame:
-        return _convert_reactions_to_net_exch_format(self.rates)
+        return self.matlab_file_cache.get_derived(
+            "model.rates_in_net_exch_format",
+            lambda: _convert_reactions_to_net_exch_format(self.rates),
+        )
+
+    def convert_samples_to_net_exch_format(self, samples: pd.DataFrame) -> pd.DataFrame:
+        """Convert a matrix of forward and backward fluxes with a column per rate id (e.g. "R2.f"
+        and "R2.b") to net and exchange fluxes, e.g. a set of Monte Carlo samples. All samples are
+        converted at once.
+
+        Parameters
+        ----------
+        samples : pd.DataFrame
+            Data frame with a row per sample and the rate ids of `rates` as columns.
+
+        Returns
+        -------
+        pd.DataFrame
+            Data frame with a column per reaction in net and exchange format.
+        """
+        return convert_samples_to_net_exch_format(samples, self.rates)
 
 
 def _convert_reactions_to_net_exch_format(df)->pd.DataFrame:
@@ -112,49 +149,125 @@ def _convert_reactions_to_net_exch_format(df)->pd.DataFrame:
     Parameters
     ----------
     df : pd.DataFrame
-        Dataframe with the reactions. The dataframe must have the columns `rxn_id` and `flux`.
-        Usually obtain from the `reactions` property of the `INCAModel` class.
+        Dataframe with the reactions. The dataframe must have the columns `rxn`, `dir` and `val`.
+        Usually obtain from the `rates` property of the `INCAModel` class. If the values are
+        vectors of equal length, the conversion is applied to each element.
     
     Returns
     -------
     pd.DataFrame
-        Dataframe with the reactions in net and exchange format.
+        Dataframe with the reactions in net and exchange format, with the columns `rxn_id` and
+        `flux`. The reactions are sorted by id.
     
     Notes
     -----
     This function is separeted from the `INCAModel` class, to ease testing.
     """
-    df=df.copy()
-
-    new_reactions_df = pd.DataFrame()
-    for rxn_id, dat in df.groupby('rxn'):
-        if dat.shape[0] == 2:
-            forward_flux = dat[dat['dir'] == 'f']['val'].values[0]
-            backward_flux = dat[dat['dir'] == 'b']['val'].values[0]
-
-            net_flux = forward_flux - backward_flux
-            exch_flux = min([forward_flux, backward_flux])
-            rxn_df = pd.DataFrame.from_dict(
-                {
-                    'rxn_id': [f'{rxn_id} net', f'{rxn_id} exch'],
-                    'flux': [net_flux, exch_flux],
-                }
-            ) 
-
-            new_reactions_df = pd.concat([
-                new_reactions_df,
-                rxn_df 
-            ])
-        else:
-            new_reactions_df = pd.concat([
-                new_reactions_df,
-                dat[['rxn', 'val']].rename(columns={'rxn': 'rxn_id', 'val': 'flux'})
-            ])
-
-    return new_reactions_df.reset_index(drop=True)
+    rxn_ids, kind, first, second = _net_exch_conversion_plan(df['rxn'], df['dir'])
+    values = df['val'].to_numpy()
+    if values.dtype == object and len(values) > 0 and isinstance(values[0], np.ndarray):
+        values = np.stack(values)
+    flux = _apply_net_exch_conversion(values, kind, first, second, axis=0)
+    if flux.ndim > 1:
+        flux = list(flux)
+    return pd.DataFrame({'rxn_id': rxn_ids, 'flux': flux})
+
+
+def convert_samples_to_net_exch_format(samples: pd.DataFrame, rates: pd.DataFrame) -> pd.DataFrame:
+    """Convert a matrix of forward and backward fluxes, e.g. Monte Carlo samples, to net and
+    exchange fluxes. All rows are converted at once.
+
+    Parameters
+    ----------
+    samples : pd.DataFrame
+        Data frame with a row per sample and a column per rate, named by the rate ids in the `id`
+        column of `rates` (e.g. "R2.f" and "R2.b").
+    rates : pd.DataFrame
+        The rates of the model, see `INCAModel.rates`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Data frame with the same index as samples and a column per reaction, named like the
+        `rxn_id` column of `INCAModel.rates_in_net_exch_format`.
+    """
+    rxn_ids, kind, first, second = _net_exch_conversion_plan(rates['rxn'], rates['dir'])
+    values = samples[rates['id'].tolist()].to_numpy()
+    converted = _apply_net_exch_conversion(values, kind, first, second, axis=1)
+    return pd.DataFrame(converted, index=samples.index, columns=rxn_ids)
+
+
+_PASSTHROUGH, _NET, _EXCH = 0, 1, 2
+
+
+def _net_exch_conversion_plan(rxn: pd.Series, direction: pd.Series):
+    """Compute which input rows make up each output row of the net/exchange conversion.
+
+    Reactions with exactly one forward and one backward row give a net row (forward - backward)
+    and an exchange row (min of forward and backward), all other rows are passed through. The
+    output is sorted by reaction id, and rows of the same reaction keep their input order.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        The output reaction ids, the kind of each output row (passthrough, net or exchange) and
+        the positions of the first (forward) and second (backward) input rows.
+    """
+    rxn = np.asarray(rxn, dtype=object)
+    direction = np.asarray(direction, dtype=object)
+    order = np.argsort(rxn.astype(str), kind='stable')
+    sorted_rxn = rxn[order]
+    sorted_dir = direction[order]
+
+    # group boundaries in the sorted order
+    is_group_start = np.ones(len(order), dtype=bool)
+    is_group_start[1:] = sorted_rxn[1:] != sorted_rxn[:-1]
+    group = np.cumsum(is_group_start) - 1
+    group_size = np.bincount(group)
+    group_forward = np.bincount(group, weights=sorted_dir == 'f')
+    group_backward = np.bincount(group, weights=sorted_dir == 'b')
+    reversible = (group_size == 2) & (group_forward == 1) & (group_backward == 1)
+
+    # position of the forward and backward row of each reversible group
+    forward_pos = np.zeros(len(group_size), dtype=np.int64)
+    backward_pos = np.zeros(len(group_size), dtype=np.int64)
+    forward_pos[group[sorted_dir == 'f']] = order[sorted_dir == 'f']
+    backward_pos[group[sorted_dir == 'b']] = order[sorted_dir == 'b']
+
+    row_reversible = reversible[group]
+    n_outputs = np.where(row_reversible, np.where(is_group_start, 2, 0), 1)
+    source = np.repeat(np.arange(len(order)), n_outputs)
+    source_group = group[source]
+    is_reversible_output = row_reversible[source]
+    # the reversible groups give two consecutive outputs, net followed by exchange
+    is_second_output = np.zeros(len(source), dtype=bool)
+    is_second_output[1:] = is_reversible_output[1:] & (source[1:] == source[:-1])
+
+    kind = np.where(is_reversible_output, np.where(is_second_output, _EXCH, _NET), _PASSTHROUGH)
+    first = np.where(is_reversible_output, forward_pos[source_group], order[source])
+    second = np.where(is_reversible_output, backward_pos[source_group], order[source])
+    suffix = np.where(kind == _NET, ' net', np.where(kind == _EXCH, ' exch', ''))
+    rxn_ids = np.array([f'{r}{s}' for r, s in zip(sorted_rxn[source], suffix)], dtype=object)
+    return rxn_ids, kind, first, second
+
+
+def _apply_net_exch_conversion(values: np.ndarray, kind, first, second, axis: int) -> np.ndarray:
+    """Apply a conversion plan along the reaction axis of an array of forward/backward fluxes."""
+    first_values = np.take(values, first, axis=axis)
+    second_values = np.take(values, second, axis=axis)
+    shape = [1] * first_values.ndim
+    shape[axis] = len(kind)
+    kind = kind.reshape(shape)
+    return np.where(
+        kind == _NET,
+        first_values - second_values,
+        np.where(kind == _EXCH, np.minimum(first_values, second_values), first_values),
+    )
 
 def _clean_flx_dict(flx_dict):
-    """Cleans the flux dictionary. Removes the keys that are not needed.
+    """Cleans the flux dictionary. Removes the keys that are not needed. The input
+    dictionary is not modified, as it is part of the parsed matlab file which is shared
+    between objects.
 
     Parameters
     ----------
@@ -167,8 +280,4 @@ def _clean_flx_dict(flx_dict):
         Dictionary with the parsed flux information.
     """
     # remove the keys that are not needed
-    flx_dict.pop('prod', None)
-    flx_dict.pop('sub', None)
-    flx_dict.pop('base', None)
-
-    return flx_dict
\ No newline at end of file
+    return {k: v for k, v in flx_dict.items() if k not in ('prod', 'sub', 'base')}
\ No newline at end of file
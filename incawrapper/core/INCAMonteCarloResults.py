@@ -1,36 +1,213 @@
 from dataclasses import dataclass
 from incawrapper.core import load_matlab_file
-from typing import List
+from incawrapper.core.monte_carlo_statistics import MonteCarloSummary
+from typing import Iterator, List, Optional, Union
 import pathlib
+import numpy as np
 import pandas as pd
 
 
 @dataclass
 class INCAMonteCarloResults:
+    """
+    This class parses the Monte Carlo results from INCA, either from a finished Monte Carlo run
+    or from the dump file that INCA writes while the sampling is running. This class is not intended
+    to be used directly, but rather through the `.mc` property of the INCAResults class.
+
+    Parameters
+    ----------
+    mcfile : pathlib.Path
+        The path to the matlab file containing the Monte Carlo results.
+    parameter_names : List[str]
+        The names of the fitted parameters, in the order used by INCA.
+    dtype : np.dtype or str, optional
+        The dtype of the samples, e.g. np.float32 to halve the memory used by the samples. If None
+        (default), the dtype of the file is kept (float64).
+
+    Attributes
+    ----------
+    ci : pd.DataFrame
+        Confidence intervals of the parameters, with the index ["lb", "ub"].
+    samples_array : np.ndarray
+        The samples as one 2D array with a row per sample and a column per parameter. Assigning
+        a new array replaces the samples.
+    samples : pd.DataFrame
+        Data frame view of samples_array with the parameter names as columns. Assigning a new
+        data frame replaces the samples, and samples_array is updated with its values.
+
+    Notes
+    -----
+    The samples are read into a single 2D array with at most one copy of the data. For finished
+    files with the default dtype the array is a view of the loaded matrix. The data frame is
+    created on the first access of `samples` and shares the memory of `samples_array`, thus the
+    two must not be modified in place.
+
+    For summary statistics of very large runs, use `summary()`, which processes the samples in
+    blocks without building the full data frame.
+    """
+
     mcfile: pathlib.Path
     parameter_names: List[str]
-    
+    dtype: Optional[Union[np.dtype, str]] = None
+
     def __post_init__(self):
         self.mc = load_matlab_file.load_matlab_file(self.mcfile)
+        self._samples_array = None
+        self._samples = None
 
         if "CI" in self.mc.keys(): # test if the mc file is a finished mc file
             self.ci = pd.DataFrame(self.mc["CI"], columns = self.parameter_names, index = ["lb", "ub"])
-            self.samples = pd.DataFrame(self.mc["K"], columns = self.parameter_names)
-        
+
         # parsing samples from dump file
         elif "ci0" in self.mc.keys(): # test if the mc file is a dump file
-            samples = {}
-
-            # if the mc sampling has been interrupted early, i.e. only 1 iteration has finished, the shape 
-            # of the k matrix is (n_samples, n_parameters), and not (n_iterations, n_samples, n_parameters)
-            # this is a quick fix to make sure that the shape is always (n_iterations, n_samples, n_parameters)
-            if len(self.mc['k'].shape) == 2:
-                self.mc['k'] = self.mc['k'].reshape(1, self.mc['k'].shape[0], self.mc['k'].shape[1])
-
-            for idx, name in enumerate(self.parameter_names):
-                samples[name] = (self.mc['k'][:,:,idx]).flatten()
-            self.samples = pd.DataFrame.from_dict(samples)
             self.ci = pd.DataFrame(self.mc["ci0"], columns = self.parameter_names, index = ["lb", "ub"])
         else:
             raise TypeError("The mc file is not a valid mc file")
-             
\ No newline at end of file
+
+    @property
+    def samples_array(self) -> np.ndarray:
+        """Gets the samples as a 2D array with shape (n_samples, n_parameters). The array is
+        built on the first access.
+
+        Returns
+        -------
+        np.ndarray
+            The Monte Carlo samples.
+        """
+        if self._samples_array is None:
+            if "CI" in self.mc.keys():
+                self._samples_array = _read_samples(self.mc["K"], self.dtype)
+            else:
+                self._samples_array = _stack_iterations(self.mc["k"], self.dtype)
+        return self._samples_array
+
+    @samples_array.setter
+    def samples_array(self, value: np.ndarray) -> None:
+        """Replace the samples, e.g. by a subset of the samples. samples is rebuilt from the new
+        array on its next access."""
+        value = np.asarray(value, dtype=self.dtype)
+        if value.ndim != 2 or value.shape[1] != len(self.parameter_names):
+            raise ValueError(
+                f"The samples must be a 2D array with {len(self.parameter_names)} columns, one "
+                f"per parameter, got shape {value.shape}"
+            )
+        self._samples_array = value
+        self._samples = None
+
+    @property
+    def samples(self) -> pd.DataFrame:
+        """Gets the samples as a data frame with the parameter names as columns. The data frame is
+        a view of samples_array.
+
+        Returns
+        -------
+        pd.DataFrame
+            The Monte Carlo samples.
+        """
+        if self._samples is None:
+            self._samples = pd.DataFrame(
+                self.samples_array, columns=self.parameter_names, copy=False
+            )
+        return self._samples
+
+    @samples.setter
+    def samples(self, value: pd.DataFrame) -> None:
+        """Replace the samples by a data frame, e.g. a filtered copy of the samples. samples_array,
+        iter_sample_blocks and summary use the values of the new data frame."""
+        self._samples = value
+        self._samples_array = value.to_numpy(dtype=self.dtype)
+
+    def iter_sample_blocks(self, block_size: int = 10000) -> Iterator[np.ndarray]:
+        """Iterate over the samples in blocks of rows, in the same order as samples_array. The
+        blocks are views of the loaded data where possible, samples_array is not built. Sample
+        matrices kept on disk (see load_matlab_file) are read one block at a time.
+
+        Parameters
+        ----------
+        block_size : int, optional
+            Maximum number of samples per block. Default is 10000.
+
+        Yields
+        ------
+        np.ndarray
+            Blocks with shape (n_samples_in_block, n_parameters) and the dtype of the object.
+        """
+        if self._samples_array is not None:
+            blocks = _iter_row_blocks(self._samples_array, block_size)
+        elif "CI" in self.mc.keys():
+            blocks = _iter_row_blocks(self.mc["K"], block_size)
+        else:
+            k = np.asarray(self.mc["k"])
+            iterations = [k] if k.ndim == 2 else k
+            blocks = (block for iteration in iterations for block in _iter_row_blocks(iteration, block_size))
+        for block in blocks:
+            yield np.asarray(block, dtype=self.dtype)
+
+    def summary(self, block_size: int = 10000, relative_accuracy: float = 0.01) -> MonteCarloSummary:
+        """Compute the mean, variance, covariance and quantile sketches of the samples in a single
+        pass over blocks of samples. The summaries of several Monte Carlo files can be combined
+        with `MonteCarloSummary.merge`.
+
+        Parameters
+        ----------
+        block_size : int, optional
+            Number of samples processed at a time. Default is 10000.
+        relative_accuracy : float, optional
+            Relative accuracy of the quantiles. Default is 0.01.
+
+        Returns
+        -------
+        MonteCarloSummary
+            The summary of the samples, e.g. `summary().confidence_intervals(alpha=0.05)`.
+        """
+        summary = MonteCarloSummary(self.parameter_names, relative_accuracy)
+        for block in self.iter_sample_blocks(block_size):
+            summary.update(block)
+        return summary
+
+
+def _iter_row_blocks(samples, block_size: int) -> Iterator[np.ndarray]:
+    """Slice a 2D in memory array or H5MatArray into blocks of rows."""
+    if hasattr(samples, "iter_blocks"):
+        yield from samples.iter_blocks(block_size)
+        return
+    for start in range(0, len(samples), block_size):
+        yield samples[start:start + block_size]
+
+
+def _read_samples(samples, dtype=None) -> np.ndarray:
+    """Return the sample matrix of a finished mc file as a 2D array without copying it, unless a
+    different dtype is requested. Matrices that are kept on disk (H5MatArray, see load_matlab_file)
+    are read block by block directly into the output array."""
+    if hasattr(samples, "iter_blocks"):
+        out = np.empty(samples.shape, dtype=dtype or samples.dtype, order="F")
+        start = 0
+        for block in samples.iter_blocks(max(1, 2**20 // max(1, samples.shape[1]))):
+            out[start:start + len(block)] = block
+            start += len(block)
+        return out
+    return np.asarray(samples, dtype=dtype)
+
+
+def _stack_iterations(k, dtype=None) -> np.ndarray:
+    """Stack the samples of the iterations in a dump file to one 2D array.
+
+    The k matrix of a dump file has the shape (n_iterations, n_samples, n_parameters), or
+    (n_samples, n_parameters) if only one iteration has finished. The rows of the output are
+    ordered by iteration and then by sample, i.e. the same order as `k.reshape(-1, n_parameters)`.
+    The output is built with a single copy (including the dtype conversion) into a Fortran ordered
+    array, in which each parameter column is contiguous. If only one iteration has finished and no
+    dtype conversion is needed, the output is a view of k.
+    """
+    k = np.asarray(k)
+    if k.ndim == 2:
+        return np.asarray(k, dtype=dtype)
+
+    n_iterations, n_samples, n_parameters = k.shape
+    if n_iterations == 1:
+        return np.asarray(k[0], dtype=dtype)
+    out = np.empty((n_iterations * n_samples, n_parameters), dtype=dtype or k.dtype, order="F")
+    # in Fortran order, row r = iteration * n_samples + sample of the output has the same memory
+    # layout as the (sample, iteration, parameter) array below.
+    out.reshape((n_samples, n_iterations, n_parameters), order="F")[...] = k.transpose(1, 0, 2)
+    return out
@@ -2,6 +2,8 @@ from incawrapper.core.INCAModel import INCAModel
 from incawrapper.core.INCAFitData import INCAFitData
 from incawrapper.core.INCASimulation import INCASimulation
 from incawrapper.core.INCAMonteCarloResults import INCAMonteCarloResults
+from incawrapper.core.matlab_file_cache import MatlabFileCache
+from incawrapper.core.sidecar_cache import SidecarCache
 from dataclasses import dataclass
 import pathlib
 from typing import Union
@@ -14,6 +16,15 @@ class INCAResults:
     INCAFitData, and INCASimulation). The subclasses mimmick the structure in the .mat file. The purpose
     of this class is to ensure the data, model and simulation remain linked.
 
+    The .mat file is parsed once and shared by the model, fitdata and simulation objects. Data frames
+    derived from the file are memoized per INCAResults object. Use `clear_cache()` to discard the
+    parsed data, e.g. if the .mat file has been overwritten by a new INCA run.
+
+    With `sidecar_cache` enabled, the parsed data frames are also stored in a columnar on-disk
+    cache next to the .mat file. Later INCAResults objects for the same file read the cache
+    instead of parsing the .mat file. The cache is discarded automatically when the content of
+    the .mat file changes. This requires the pyarrow package.
+
     Parameters
     ----------
     inca_matlab_file : pathlib.Path or str
@@ -22,6 +33,10 @@ class INCAResults:
         If True, the Monte Carlo results will be loaded and the file name will be inferred from the
         inca_matlab_file. If a pathlib.Path object is passed, the Monte Carlo results will be loaded
         from the specified file. If False, the Monte Carlo results will not be loaded. Default is False.
+    sidecar_cache : bool or pathlib.Path, optional
+        If True, the parsed data is cached in the directory `<inca_matlab_file>.incawrapper_cache`.
+        If a pathlib.Path object is passed, the cache is stored in the specified directory. If False,
+        no on-disk cache is used. Default is False.
     
     Attributes
     ----------
@@ -33,10 +48,14 @@ class INCAResults:
 
     inca_matlab_file: Union[str, pathlib.Path]
     load_mc_data: Union[bool,pathlib.Path] = False
+    sidecar_cache: Union[bool, pathlib.Path] = False
     
     def __post_init__(self):
         """Ensure that the inca_matlab_file is a pathlib.Path object."""
         self._inca_matlab_file = self._coerce_pathlib(self.inca_matlab_file)
+        self._sidecar = self._create_sidecar()
+        self._matlab_file_cache = MatlabFileCache(self._inca_matlab_file, sidecar=self._sidecar)
+        self._components = {}
 
     @property
     def model(self) -> INCAModel:
@@ -46,7 +65,9 @@ class INCAResults:
         -------
         INCAModel
             The INCAModel object"""
-        return INCAModel(self._inca_matlab_file)
+        return self._get_component(
+            "model", lambda: INCAModel(self._inca_matlab_file, self._matlab_file_cache)
+        )
 
     @property
     def fitdata(self) -> INCAFitData:
@@ -57,7 +78,9 @@ class INCAResults:
         -------
         INCAFitData
             The INCAFitData object"""
-        return INCAFitData(self._inca_matlab_file)
+        return self._get_component(
+            "fitdata", lambda: INCAFitData(self._inca_matlab_file, self._matlab_file_cache)
+        )
 
     @property
     def simulation(self) -> INCASimulation:
@@ -69,7 +92,9 @@ class INCAResults:
         -------
         INCASimulation
             The INCASimulation object"""
-        return INCASimulation(self._inca_matlab_file)
+        return self._get_component(
+            "simulation", lambda: INCASimulation(self._inca_matlab_file, self._matlab_file_cache)
+        )
     
     @property
     def mc(self) -> INCAMonteCarloResults:
@@ -80,7 +105,40 @@ class INCAResults:
         INCAMonteCarloResults
             The INCAMonteCarloResults object
         """
-        return self._load_mc_results()
+        return self._get_component("mc", self._load_mc_results)
+
+    def clear_cache(self, remove_sidecar: bool = False) -> None:
+        """Discard the parsed .mat files and all memoized data frames. The files are parsed again
+        on the next access. Objects obtained from this INCAResults object before the call keep
+        their memoized data.
+
+        Parameters
+        ----------
+        remove_sidecar : bool, optional
+            If True, the on-disk sidecar cache is removed as well. Default is False, the sidecar
+            cache is then only discarded if the content of the .mat file has changed.
+        """
+        if self._sidecar is not None:
+            if remove_sidecar:
+                self._sidecar.invalidate()
+            self._sidecar = self._create_sidecar()
+        self._matlab_file_cache = MatlabFileCache(self._inca_matlab_file, sidecar=self._sidecar)
+        self._components = {}
+
+    def _create_sidecar(self):
+        """Create the on-disk cache requested by sidecar_cache, or return None."""
+        if not self.sidecar_cache:
+            return None
+        if isinstance(self.sidecar_cache, bool):
+            return SidecarCache(self._inca_matlab_file)
+        return SidecarCache(self._inca_matlab_file, self._coerce_pathlib(self.sidecar_cache))
+
+    def _get_component(self, name, factory):
+        """Return the memoized component (model, fitdata, simulation or mc) or create it using
+        the factory."""
+        if name not in self._components:
+            self._components[name] = factory()
+        return self._components[name]
 
     def _coerce_pathlib(self, path):
         """Convert a path to a pathlib.Path object if it is not already one. Required because we suspect
@@ -100,7 +158,7 @@ class INCAResults:
             return None
 
         if isinstance(self.load_mc_data, bool):
-            mcfile = self.inca_matlab_file.with_name(self._inca_matlab_file.stem + "_mc.mat")
+            mcfile = self._inca_matlab_file.with_name(self._inca_matlab_file.stem + "_mc.mat")
             parameter_names = self.fitdata.fitted_parameters['id'].tolist()
             return INCAMonteCarloResults(mcfile, parameter_names)
 
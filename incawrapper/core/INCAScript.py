@@ -1,6 +1,77 @@
-from typing import Literal
+from typing import Dict, Iterator, List, Literal, Optional
+import hashlib
 import pathlib
-from collections import OrderedDict
+import re
+from collections.abc import MutableMapping
+
+# matches the lines of the runner block that define the output files, see define_runner
+_OUTPUT_FILE_PATTERN = re.compile(r"^(filename|mc_filename) = '(.*)';$", re.MULTILINE)
+# matches the loading of data files, e.g. the data sidecar of create_inca_script_from_data
+_LOAD_PATTERN = re.compile(r"load\('([^']*)'\)")
+
+
+class ScriptBlocks(MutableMapping):
+    """Ordered mapping of block names to the matlab code of the blocks. Each block is stored as
+    a list of code fragments, such that adding code to a block does not copy the code that is
+    already in the block. The text of a block is joined when it is read and cached until the
+    block is modified.
+
+    The mapping behaves like a dictionary of strings, e.g. `blocks['runner'] = text` replaces
+    the code of a block.
+    """
+
+    def __init__(self, **blocks: str):
+        self._fragments: Dict[str, List[str]] = {}
+        self._text: Dict[str, str] = {}
+        # counter that is increased on every modification, used to invalidate cached scripts
+        self.version = 0
+        for name, text in blocks.items():
+            self[name] = text
+
+    def __getitem__(self, block_name: str) -> str:
+        text = self._text.get(block_name)
+        if text is None:
+            fragments = self._fragments[block_name]
+            if len(fragments) > 1:
+                # keep the joined text as the only fragment
+                self._fragments[block_name] = fragments = ["".join(fragments)]
+            text = self._text[block_name] = fragments[0]
+        return text
+
+    def __setitem__(self, block_name: str, text: str) -> None:
+        self._fragments[block_name] = [text]
+        self._text[block_name] = text
+        self.version += 1
+
+    def __delitem__(self, block_name: str) -> None:
+        del self._fragments[block_name]
+        self._text.pop(block_name, None)
+        self.version += 1
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fragments)
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def append(self, block_name: str, text: str) -> None:
+        """Add code to the end of a block.
+
+        Raises
+        ------
+        KeyError
+            If the block does not exist.
+        """
+        self._fragments[block_name].append(text)
+        self._text.pop(block_name, None)
+        self.version += 1
+
+    def fragments(self, block_name: str) -> List[str]:
+        """Return the code fragments of a block without joining them."""
+        return self._fragments[block_name]
 
 
 class INCAScript:
@@ -11,8 +82,8 @@ class INCAScript:
 
     Attributes
     ----------
-    blocks: OrderedDict
-        Dictionary that contains the blocks of the INCA script. The keys are the block names and the values are
+    blocks: ScriptBlocks
+        Ordered mapping that contains the blocks of the INCA script. The keys are the block names and the values are
         the matlab code as strings. Here is a list of the block names and their corresponding matlab code:
 
         * reactions: Here the reactions with their atom map are defined.
@@ -31,7 +102,7 @@ class INCAScript:
     """
 
     def __init__(self):
-        self.blocks = OrderedDict(
+        self.blocks = ScriptBlocks(
             reactions="% REACTION BLOCK\n",
             tracers="% TRACERS BLOCK\n",
             fluxes="% FLUXES BLOCK\n",
@@ -46,6 +117,8 @@ class INCAScript:
             ),
             runner="% RUNNER BLOCK\n",
         )
+        self._matlab_script: Optional[str] = None
+        self._matlab_script_version: Optional[int] = None
 
     def add_to_block(
         self,
@@ -84,7 +157,7 @@ class INCAScript:
             If the block name is not recognized.
         """
         try:
-            self.blocks[block_name] += matlab_script_block
+            self.blocks.append(block_name, matlab_script_block)
         except KeyError:
             raise KeyError(
                 f"Block name {block_name} not recognized. See type hints for possible block names."
@@ -93,18 +166,73 @@ class INCAScript:
     @property
     def matlab_script(self):
         """Property that returns the full matlab script (all block combined) as a
-        string."""
-        joint_blocks = "\n\n".join(["clear functions", *self.blocks.values()])
-        return joint_blocks
+        string. The string is cached until the blocks are modified."""
+        if self._matlab_script_version != self.blocks.version:
+            self._matlab_script = "\n\n".join(["clear functions", *self.blocks.values()])
+            self._matlab_script_version = self.blocks.version
+        return self._matlab_script
 
     def save_script(self, filename: pathlib.Path):
-        """Save the INCA script to a file."""
+        """Save the INCA script to a file. The code fragments of the blocks are written to the
+        file one at a time, without building the full script as one string."""
         with open(filename, "w") as f:
-            f.write(self.matlab_script)
+            f.write("clear functions")
+            for block_name in self.blocks:
+                f.write("\n\n")
+                f.writelines(self.blocks.fragments(block_name))
 
     def __str__(self):
         """Return the full matlab script as a string."""
         return self.matlab_script
 
+    def copy(self) -> "INCAScript":
+        """Return a copy of the script, which can be modified without modifying this script."""
+        script_copy = INCAScript()
+        script_copy.blocks = ScriptBlocks(**self.blocks)
+        return script_copy
+
+    @property
+    def output_files(self) -> Dict[str, pathlib.Path]:
+        """The files the script saves its results to, as defined by define_runner in the runner
+        block. The keys are the matlab variable names, "filename" for the results and
+        "mc_filename" for the Monte Carlo results."""
+        return {
+            name: pathlib.Path(path)
+            for name, path in _OUTPUT_FILE_PATTERN.findall(self.blocks["runner"])
+        }
+
+    def content_hash(self) -> str:
+        """Return a hash of the content of the script that is independent of where the results
+        are saved. The paths of the output files are replaced by placeholders, and data files
+        loaded by the script are represented by the hash of their content, thus two scripts
+        have the same hash if they run the same model on the same data with the same options.
+
+        Returns
+        -------
+        str
+            Hexadecimal sha256 hash.
+        """
+        script_hash = hashlib.sha256(b"clear functions")
+        for block_name in self.blocks:
+            script_hash.update(b"\n\n")
+            for fragment in self.blocks.fragments(block_name):
+                if block_name == "runner":
+                    fragment = _OUTPUT_FILE_PATTERN.sub(r"\1 = '<\1>';", fragment)
+                fragment = _LOAD_PATTERN.sub(_hash_loaded_file, fragment)
+                script_hash.update(fragment.encode())
+        return script_hash.hexdigest()
+
+
+def _hash_loaded_file(match: re.Match) -> str:
+    """Replace the path in a matlab load statement by the hash of the file content."""
+    path = pathlib.Path(match.group(1))
+    if not path.is_file():
+        return match.group(0)
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            file_hash.update(chunk)
+    return f"load(<{file_hash.hexdigest()}>)"
+
 
 __all__ = ["INCAScript"]
@@ -17,6 +17,7 @@ naming convention is as follows:
 * `m`: is the matlab variable that contains the model.
 
 """
+import numpy as np
 import pandas as pd
 import pandera as pa
 import pandera.typing as pat
@@ -25,9 +26,11 @@ import pathlib
 import incawrapper.utils.chemical_formula as chemical_formula
 from incawrapper.core.INCAScript import INCAScript
 from incawrapper.core.dataschemas import ReactionsSchema, TracerSchema, FluxMeasurementsSchema, MSMeasurementsSchema, PoolSizeMeasurementsSchema
+from incawrapper.core.script_data_sidecar import ScriptDataSidecar
+from incawrapper.core.validation import check_input, mark_validated, validate_input, validation_cache, trusted_input
 import warnings
 
-@pa.check_input(ReactionsSchema)
+@check_input(ReactionsSchema)
 def define_reactions(model_reactions: pd.DataFrame) -> str:
     """Write the matlab script block that to define the reactions in the model. The all reactions
     has to defined at once, so it is not possible to add reactions to the script block later on.
@@ -44,24 +47,15 @@ def define_reactions(model_reactions: pd.DataFrame) -> str:
         The matlab script block that defines the reactions in the model.
     """
 
-    reaction_func_calls = model_reactions.apply(
-        lambda row: instantiate_inca_class_call(
-            inca_class='reaction', 
-            S="'"+row["rxn_eqn"]+"'", 
-            id="'" + row["rxn_id"] + "'",
-        ), 
-        axis=1
+    # the reaction calls are created for all reactions at once, e.g. reaction('A -> B', 'id', 'R1')
+    reaction_func_calls = (
+        "reaction('" + model_reactions["rxn_eqn"].astype(str)
+        + "', 'id', '" + model_reactions["rxn_id"].astype(str) + "'),...\n"
     )
+    return "% Create reactions\nr = [...\n" + "".join(reaction_func_calls) + "];"
 
-    script = "% Create reactions\nr = [...\n"
-    for reaction in reaction_func_calls:
-        script += f"{reaction},...\n"
-    script += "];"
 
-    return script
-
-
-@pa.check_input(TracerSchema)
+@check_input(TracerSchema)
 def define_tracers(tracers: pd.DataFrame, experiment_id: str) -> str:
     """Writes a matlab script which defines the tracers used in one experiment. To define multiple 
     experiments this function has to be called multiple times. Most users will use this function 
@@ -154,7 +148,7 @@ def define_tracers(tracers: pd.DataFrame, experiment_id: str) -> str:
     return tmp_script
 
 
-@pa.check_input(FluxMeasurementsSchema)
+@check_input(FluxMeasurementsSchema)
 def define_flux_measurements(
     flux_measurements: pd.DataFrame, experiment_id: str
 ) -> str:
@@ -175,10 +169,6 @@ def define_flux_measurements(
         The matlab script block that defines the flux measurements used in one experiment.
     """
 
-    def create_flux(rxn_id: str, flux: float, flux_std_error: float) -> str:
-        """Parse a flux measurement into a string format readable by INCA."""
-        return f"data('{rxn_id}', 'val', {flux}, 'std', {flux_std_error})"
-
     fluxes_subset = flux_measurements[
         flux_measurements["experiment_id"] == experiment_id
     ]
@@ -193,13 +183,16 @@ def define_flux_measurements(
         + " = [...\n"
     )
 
-    for _, flux in fluxes_subset.iterrows():
-        tmp_script += create_flux(flux["rxn_id"], flux["flux"], flux["flux_std_error"])
-        tmp_script += ",...\n"
-    tmp_script += "];\n"
+    # one data call per flux measurement, e.g. data('R1', 'val', 10.0, 'std', 0.1)
+    flux_calls = (
+        "data('" + fluxes_subset["rxn_id"].astype(str)
+        + "', 'val', " + _format_values(fluxes_subset["flux"])
+        + ", 'std', " + _format_values(fluxes_subset["flux_std_error"]) + "),...\n"
+    )
+    tmp_script += "".join(flux_calls) + "];\n"
     return tmp_script
 
-pa.check_input(PoolSizeMeasurementsSchema)
+@check_input(PoolSizeMeasurementsSchema)
 def define_pool_measurements(
         pool_measurements: pd.DataFrame, experiment_id: str
 )-> str:
@@ -218,6 +211,12 @@ def define_pool_measurements(
     -------
     str
         The matlab script block that defines the pool measurements used in one experiment.
+
+    Raises
+    ------
+    pandera.errors.SchemaError
+        If the pool measurements do not match the PoolSizeMeasurementsSchema. Up to version 1.1.1
+        the pool measurements were not validated, thus data that was accepted before can raise.
     """
 
     pools_subset = pool_measurements[
@@ -234,18 +233,25 @@ def define_pool_measurements(
         + " = [...\n"
     )
 
-    for _, pool in pools_subset.iterrows():
-        tmp_script += instantiate_inca_class_call(
-            inca_class='data', 
-            S="'" + pool["met_id"] + "'", 
-            val=pool["pool_size"], 
-            std=pool["pool_size_std_error"]
-        )
-        tmp_script += ",...\n"
-    tmp_script += "];\n"
+    # one data call per pool measurement, e.g. data('A', 'val', 1.0, 'std', 0.1)
+    pool_calls = (
+        "data('" + pools_subset["met_id"].astype(str)
+        + "', 'val', " + _format_values(pools_subset["pool_size"])
+        + ", 'std', " + _format_values(pools_subset["pool_size_std_error"]) + "),...\n"
+    )
+    tmp_script += "".join(pool_calls) + "];\n"
     return tmp_script
 
 
+def _format_values(values: pd.Series) -> pd.Series:
+    """Format the values of a column for the matlab script, in the same way as formatting each
+    value with str(). Numeric columns are converted as a whole, columns with mixed types (e.g.
+    ints and floats) element by element, as the types would otherwise be unified."""
+    if values.dtype == object:
+        return values.map(str)
+    return values.astype(str)
+
+
 def modify_class_instance(
     class_name: str,
     sub_class_name: Union[str, None],
@@ -309,37 +315,18 @@ def modify_class_instance(
     return tmp_script
 
 
-def _fill_mass_isotope_gaps_in_group(ms_measurements):
-    """Fill gaps in mass_isotope column and add nan for intensity and intensity_std_error. 
-    Here a gap is defined as gaps in the mass_isotope column that are not consecutive 
-    intergers starting from 0. This does not consider the labelled_atom_ids. Missing 
-    values above the largest measured mass_isotope are handled by INCA.
-    
-    This function is meant to be used with pandas.DataFrame.groupby().apply().
-    
-    Parameters
-    ----------
-    ms_measurements : pandas.DataFrame
-        A sub-dataframe of ms_measurement data where all columns only have one unique
-        value except for intensity, intensity_std_error, and mass_isotope.
-    
-    Returns
-    -------
-    pandas.DataFrame
-        A dataframe with the same columns as the input dataframe but with the mass_isotope
-        column filled with consecutive integers starting from 0. The intensity and
-        intensity_std_error columns are filled with pd.NA for the missing values."""
+@check_input(MSMeasurementsSchema)
+def fill_all_mass_isotope_gaps(ms_measurements: pd.DataFrame) -> pd.DataFrame:
+    """Insert nan values for missing mass isotope measurements. Here a gap is defined as gaps in
+    the mass_isotope column that are not consecutive intergers starting from 0. This does not
+    consider the labelled_atom_ids. Missing values above the largest measured mass_isotope are
+    handled by INCA.
 
-    largest_mass_isotope = ms_measurements['mass_isotope'].max()
-    fill_columns = [name for name in ms_measurements.columns if name not in ['intensity', 'intensity_std_error', 'mass_isotope']]
-    ms_measurements = ms_measurements.set_index("mass_isotope").reindex(range(0, largest_mass_isotope + 1), fill_value=pd.NA)
-    ms_measurements[fill_columns] = ms_measurements[fill_columns].ffill().bfill()
-    return ms_measurements
+    The complete set of mass isotopes of every measured fragment (experiment, fragment, replicate
+    and time point) is built at once and the measurements are reindexed in a single operation.
+    The columns that describe the fragment, e.g. met_id and labelled_atom_ids, are the same for
+    all mass isotopes of a fragment and are taken from the first measurement of the fragment.
 
-@pa.check_input(MSMeasurementsSchema)
-def fill_all_mass_isotope_gaps(ms_measurements: pd.DataFrame) -> pd.DataFrame:
-    """Loops over the ms_measurements dataframe and insert nan values for missing mass isotope measurements.
-    
     Parameters
     ----------
     ms_measurements : pandas.DataFrame
@@ -351,16 +338,36 @@ def fill_all_mass_isotope_gaps(ms_measurements: pd.DataFrame) -> pd.DataFrame:
     pandas.DataFrame
         A dataframe with the same columns as the input dataframe but with gaps in the 
         mass_isotope column filled with consecutive integers starting from 0 and nan
-        in the intensity and intensity_std_error columns for the missing values.
+        in the intensity and intensity_std_error columns for the missing values. The rows
+        are sorted by experiment_id, ms_id, measurement_replicate, time and mass_isotope.
     """
-    groupby_cols = ["experiment_id", "ms_id", "measurement_replicate", 'time']
-    out = (ms_measurements
-        .groupby(groupby_cols)
-        .apply(_fill_mass_isotope_gaps_in_group)
-        .drop(columns=groupby_cols)
-        .reset_index()
+    groupby_cols = ["experiment_id", "ms_id", "measurement_replicate", "time"]
+    measurement_cols = ["intensity", "intensity_std_error"]
+    fill_cols = [
+        name for name in ms_measurements.columns
+        if name not in groupby_cols + measurement_cols + ["mass_isotope"]
+    ]
+
+    largest_mass_isotope = ms_measurements.groupby(groupby_cols)["mass_isotope"].max()
+    n_mass_isotopes = largest_mass_isotope.to_numpy(dtype=np.int64) + 1
+    group_starts = np.cumsum(n_mass_isotopes) - n_mass_isotopes
+    complete = largest_mass_isotope.index.repeat(n_mass_isotopes).to_frame(index=False)
+    complete["mass_isotope"] = np.arange(n_mass_isotopes.sum()) - np.repeat(group_starts, n_mass_isotopes)
+    complete_index = pd.MultiIndex.from_frame(complete)
+
+    measurements = (ms_measurements
+        .set_index(groupby_cols + ["mass_isotope"])[measurement_cols]
+        .reindex(complete_index)
     )
-    return out
+    fragments = ms_measurements.drop_duplicates(groupby_cols)[groupby_cols + fill_cols]
+    out = complete.merge(fragments, on=groupby_cols, how="left", sort=False)
+    for name in measurement_cols:
+        out[name] = measurements[name].to_numpy()
+
+    column_order = groupby_cols + ["mass_isotope"] + [
+        name for name in ms_measurements.columns if name not in groupby_cols + ["mass_isotope"]
+    ]
+    return out[column_order]
 
 
 def instantiate_inca_class_call(inca_class: str, S, **kwargs) -> str:
@@ -397,7 +404,7 @@ def instantiate_inca_class_call(inca_class: str, S, **kwargs) -> str:
     return f"{inca_class}({S}, {kwargs_str})"
 
 
-@pa.check_input(MSMeasurementsSchema)
+@check_input(MSMeasurementsSchema)
 def _define_ms_fragments(
     ms_measurements: pd.DataFrame, experiment_id: str
 ) -> str:
@@ -480,8 +487,21 @@ def matlab_column_vector(lst: List[float]) -> str:
     [1;2;3;4;5]"""
     return "[" + ";".join([str(i) for i in lst]) + "]"
 
-@pa.check_input(MSMeasurementsSchema)
-def _define_ms_measurements(ms_measurements: pd.DataFrame, experiment_id: str) -> str:
+
+def _column_matrix(columns: List[np.ndarray]) -> np.ndarray:
+    """Stack column vectors of possibly different length into a matrix, padded with NaN."""
+    matrix = np.full((max(len(column) for column in columns), len(columns)), np.nan)
+    for idx, column in enumerate(columns):
+        matrix[:len(column), idx] = column
+    return matrix
+
+
+@check_input(MSMeasurementsSchema)
+def _define_ms_measurements(
+    ms_measurements: pd.DataFrame,
+    experiment_id: str,
+    data_sidecar: Optional[ScriptDataSidecar] = None,
+) -> str:
     """Defines measurements of ms fragments. This is done by updating the msdata objects
     of the individuals ms fragements.
     
@@ -492,6 +512,9 @@ def _define_ms_measurements(ms_measurements: pd.DataFrame, experiment_id: str) -
         the MSMeasurementsSchema.
     experiment_id : str
         The id of the experiment for which to define ms measurements.
+    data_sidecar : ScriptDataSidecar, optional
+        If given, the intensities, standard errors and time points are stored in the sidecar
+        and the script refers to them instead of containing the numbers, by default None.
     
     Returns
     -------
@@ -516,18 +539,25 @@ def _define_ms_measurements(ms_measurements: pd.DataFrame, experiment_id: str) -
         experiment_id, ms_id, time and replicate number.
         """
 
-        # convert to matlab NaN
         df_new = df.copy()
-        df_new[['intensity', 'intensity_std_error']] = df[['intensity', 'intensity_std_error']].fillna('NaN')
+        if data_sidecar is None:
+            # convert to matlab NaN
+            df_new[['intensity', 'intensity_std_error']] = df[['intensity', 'intensity_std_error']].fillna('NaN')
 
         measurement_id_lst = []
+        idv_columns = []
+        idv_std_error_columns = []
         idv_str = "["
         idv_std_error_str = "["
         # Create a column vector for each timepoint/replicate
         for (replicate, time), grp_df in df_new.groupby(['measurement_replicate', 'time']):
             grp_df = grp_df.sort_values('mass_isotope', ascending=True)
-            idv_str += matlab_column_vector(grp_df['intensity']) + ","
-            idv_std_error_str += matlab_column_vector(grp_df['intensity_std_error']) + ","
+            if data_sidecar is None:
+                idv_str += matlab_column_vector(grp_df['intensity']) + ","
+                idv_std_error_str += matlab_column_vector(grp_df['intensity_std_error']) + ","
+            else:
+                idv_columns.append(grp_df['intensity'].to_numpy(dtype=float))
+                idv_std_error_columns.append(grp_df['intensity_std_error'].to_numpy(dtype=float))
 
             # create unique id for each measurement
             measurement_id_lst.append(
@@ -539,13 +569,17 @@ def _define_ms_measurements(ms_measurements: pd.DataFrame, experiment_id: str) -
                 "'"
             )
 
-        # remove last comma
-        idv_str = idv_str.rstrip(",") + "]"
-        idv_std_error_str = idv_std_error_str.rstrip(",") + "]"
+        if data_sidecar is None:
+            # remove last comma
+            idv_str = idv_str.rstrip(",") + "]"
+            idv_std_error_str = idv_std_error_str.rstrip(",") + "]"
+            time_str = "[" + ",".join(df_new['time'].unique().astype(str)) + "]"
+        else:
+            idv_str = data_sidecar.add(_column_matrix(idv_columns))
+            idv_std_error_str = data_sidecar.add(_column_matrix(idv_std_error_columns))
+            time_str = data_sidecar.add(df_new['time'].unique())
 
         idv_id = "{" + ",".join(measurement_id_lst) + "}"
-
-        time_str = "[" + ",".join(df_new['time'].unique().astype(str)) + "]"
         return (
             f"ms_{experiment_id}{{'{ms_id}'}}.idvs = " + 
             instantiate_inca_class_call(
@@ -573,7 +607,11 @@ def _define_ms_measurements(ms_measurements: pd.DataFrame, experiment_id: str) -
         tmp_script += "\n"
     return tmp_script
 
-def define_ms_data(ms_measurements: pd.DataFrame, experiment_id: str) -> str:
+def define_ms_data(
+    ms_measurements: pd.DataFrame,
+    experiment_id: str,
+    data_sidecar: Optional[ScriptDataSidecar] = None,
+) -> str:
     """Wrapper function that first fills the mass isopomer measurement gaps, then the msdata objects (fragments) 
     and finally defines the ms measurements. Most users will use this function implicitly when using the
     define_ms_data_from_csv function.
@@ -585,15 +623,22 @@ def define_ms_data(ms_measurements: pd.DataFrame, experiment_id: str) -> str:
         the MSMeasurementsSchema.
     experiment_id : str
         The id of the experiment for which to define ms measurements.
+    data_sidecar : ScriptDataSidecar, optional
+        If given, the numeric measurement data is stored in the sidecar instead of being
+        written as text in the script, by default None. The code that loads the sidecar file
+        has to be added to the script separately, see ScriptDataSidecar.load_statement.
     
     Returns
     -------
     str
         A string that defines all the ms fragments and measurements for one experiment.
     """
-    ms_measurements = fill_all_mass_isotope_gaps(ms_measurements)
-    tmp_script = _define_ms_fragments(ms_measurements, experiment_id)
-    tmp_script += _define_ms_measurements(ms_measurements, experiment_id)
+    with validation_cache():
+        ms_measurements = fill_all_mass_isotope_gaps(ms_measurements)
+        # the filled dataframe is built from the validated input, thus it is valid as well
+        mark_validated(ms_measurements, MSMeasurementsSchema)
+        tmp_script = _define_ms_fragments(ms_measurements, experiment_id)
+        tmp_script += _define_ms_measurements(ms_measurements, experiment_id, data_sidecar)
     return tmp_script
 
 def _inverse_dict(d):
@@ -641,7 +686,7 @@ def make_experiment_data_config(
 
     return experimental_data_config
 
-#@pa.check_input() # make a pandera schema experimental_data_config dictionary
+#@check_input() # make a pandera schema experimental_data_config dictionary
 def define_experiment(
     experiment_id: str, measurement_types: List
 ) -> str:
@@ -811,6 +856,26 @@ def define_runner(
         return estimation + continuation + simulation + output + saving + montecarlo
 
 
+def _partition_by_experiment(data: Optional[pd.DataFrame], schema: pa.DataFrameSchema):
+    """Validate a dataframe and split it into the rows of each experiment with a single groupby.
+    The rows of an experiment are registered as validated in the active validation cache.
+
+    Returns
+    -------
+    Callable[[str], pd.DataFrame]
+        Function that returns the rows of an experiment. For experiments without rows an empty
+        dataframe with the columns of the input is returned.
+    """
+    if data is None:
+        return lambda experiment_id: None
+    data = validate_input(data, schema)
+    partitions = dict(tuple(data.groupby("experiment_id", sort=False)))
+    empty = data.iloc[:0]
+    for partition in [*partitions.values(), empty]:
+        mark_validated(partition, schema)
+    return lambda experiment_id: partitions.get(experiment_id, empty)
+
+
 def create_inca_script_from_data(
    reactions_data: ReactionsSchema, 
    tracer_data: TracerSchema, 
@@ -818,6 +883,8 @@ def create_inca_script_from_data(
    ms_measurements: MSMeasurementsSchema = None, 
    pool_measurements = None,
    experiment_ids: Optional[Union[str,List]] = 'All',
+   validate: bool = True,
+   data_sidecar: Optional[Union[str, pathlib.Path]] = None,
 )->INCAScript:
     """Create an INCAScript object from dataframes with the data. The experiment configuration 
     is inferred from the data. The user can specify which experiments to include in the INCA script
@@ -837,6 +904,16 @@ def create_inca_script_from_data(
         Not yet implemented, by default None
     experiment_ids : Optional(Union[str,List[str]]), optional
         List of experiment ids to include in the INCA script, by default 'All'.
+    validate : bool, optional
+        Validate the dataframes against their schemas, by default True. Each dataframe is
+        validated once. Set to False to skip the validation of data that has already been
+        validated, e.g. in a pipeline that creates many scripts from the same data.
+    data_sidecar : Union[str, pathlib.Path], optional
+        Path of a .mat file to which the MS intensities, standard errors and time points are
+        written, by default None. The script loads the file instead of containing the numbers
+        as text, which reduces the size of the script and the time MATLAB spends parsing it.
+        The file is written by this function and must be available when the script is run.
+        If None, all data is written in the script.
     
     Returns
     -------
@@ -850,21 +927,37 @@ def create_inca_script_from_data(
         if isinstance(experiment_ids, str):
             exp_config = exp_config[experiment_ids]
 
-    inca_script = INCAScript()
-    inca_script.add_to_block('reactions', define_reactions(reactions_data))
-
-    # Specify data
-    for exp_id, measurement_types in exp_config.items():
-        inca_script.add_to_block("tracers", define_tracers(tracer_data, exp_id))
-        if "data_flx" in measurement_types:
-            inca_script.add_to_block("fluxes", define_flux_measurements(flux_measurements, exp_id))
-        if "data_ms" in measurement_types:
-            inca_script.add_to_block("ms_fragments", define_ms_data(ms_measurements, exp_id))
-        if "data_cxn" in measurement_types:
-            inca_script.add_to_block("pool_sizes", define_pool_measurements(pool_measurements, exp_id))
-        inca_script.add_to_block("experiments", define_experiment(exp_id, measurement_types))
+    with validation_cache() if validate else trusted_input():
+        inca_script = INCAScript()
+        inca_script.add_to_block('reactions', define_reactions(reactions_data))
+
+        # Split the data by experiment once, such that each writer only processes the rows of
+        # one experiment instead of filtering the full dataframes for every experiment.
+        tracers_by_exp = _partition_by_experiment(tracer_data, TracerSchema)
+        fluxes_by_exp = _partition_by_experiment(flux_measurements, FluxMeasurementsSchema)
+        ms_by_exp = _partition_by_experiment(ms_measurements, MSMeasurementsSchema)
+        pools_by_exp = _partition_by_experiment(pool_measurements, PoolSizeMeasurementsSchema)
+
+        sidecar = None
+        if data_sidecar is not None and any("data_ms" in types for types in exp_config.values()):
+            sidecar = ScriptDataSidecar(data_sidecar)
+            inca_script.add_to_block("ms_fragments", sidecar.load_statement())
+
+        # Specify data
+        for exp_id, measurement_types in exp_config.items():
+            inca_script.add_to_block("tracers", define_tracers(tracers_by_exp(exp_id), exp_id))
+            if "data_flx" in measurement_types:
+                inca_script.add_to_block("fluxes", define_flux_measurements(fluxes_by_exp(exp_id), exp_id))
+            if "data_ms" in measurement_types:
+                inca_script.add_to_block("ms_fragments", define_ms_data(ms_by_exp(exp_id), exp_id, sidecar))
+            if "data_cxn" in measurement_types:
+                inca_script.add_to_block("pool_sizes", define_pool_measurements(pools_by_exp(exp_id), exp_id))
+            inca_script.add_to_block("experiments", define_experiment(exp_id, measurement_types))
         
-    inca_script.add_to_block('model', define_model(exp_config.keys()))
+        inca_script.add_to_block('model', define_model(exp_config.keys()))
+
+    if sidecar is not None:
+        sidecar.save()
 
     return inca_script
 
@@ -1,38 +1,91 @@
 import pandas as pd
 import numpy as np
-from incawrapper.core import load_matlab_file
-from dataclasses import dataclass
+from incawrapper.core.matlab_file_cache import MatlabFileCache
+from incawrapper.core.INCAFitData import _as_records
+from dataclasses import dataclass, field
 import pathlib
-from typing import Literal, Dict, List
+from typing import Literal, Dict, List, Optional, Tuple
 
 
 @dataclass
 class INCASimulation:
     inca_matlab_file: pathlib.Path
+    matlab_file_cache: Optional[MatlabFileCache] = field(default=None, repr=False, compare=False)
 
     def __post_init__(self):
-        self.raw: Dict = load_matlab_file.load_matlab_file(self.inca_matlab_file)["s"]
+        if self.matlab_file_cache is None:
+            self.matlab_file_cache = MatlabFileCache(self.inca_matlab_file)
+
+    @property
+    def raw(self) -> Dict:
+        """Gets the raw parsed matlab structure that contains the simulation results."""
+        return self.matlab_file_cache["s"]
 
     @property
     def simulated_data(self) -> pd.DataFrame:
-        """Get the simulated MDVs."""
-        return self._parse_simulated_data()
+        """Get the simulated MDVs in long format, with one row per experiment, fragment, time
+        point and mass isotopomer. The columns are expt, id, time, type, mdv and mass_isotope. The
+        index is the position of the fragment in the raw simulation results."""
+        return self.matlab_file_cache.get_derived(
+            "simulation.simulated_data", self._parse_simulated_data
+        )
 
     def _parse_simulated_data(self) -> pd.DataFrame:
-        """Parse the simulated data from the raw INCA results."""
-        raw_df = pd.DataFrame.from_records(self.raw)[
-            ["expt", "id", "time", "type", "val"]
-        ]
-
-        # Determines if the simulation is steady state or not
-        if isinstance(raw_df["time"][0], np.ndarray):
-            # The timeseries mdvs are stored in a matrix in the val column
-            raw_df["val"] = raw_df["val"].map(lambda x: x.transpose())
-            raw_df = raw_df.explode(["time", "val"])
-
-        raw_df["mass_isotope"] = raw_df["val"].map(lambda x: np.arange(0, len(x)))
-        long_format = raw_df.explode(["val", "mass_isotope"]).rename(
-            columns={"val": "mdv"}
+        """Parse the simulated data from the raw INCA results. The MDV matrices of all fragments
+        are concatenated into a single array, and the other columns are created by repeating the
+        values of each fragment."""
+        fragments = _as_records(self.raw)
+        mdv_blocks = []
+        times = []
+        n_isotopomers = np.empty(len(fragments), dtype=np.int64)
+        n_times = np.empty(len(fragments), dtype=np.int64)
+        for idx, fragment in enumerate(fragments):
+            time = np.atleast_1d(np.asarray(fragment["time"], dtype=float))
+            # the mdvs of a time series are stored as a (mass isotopomer, time) matrix
+            mdvs = np.asarray(fragment["val"], dtype=float).reshape(-1, len(time))
+            mdv_blocks.append(mdvs.T.ravel())
+            times.append(time)
+            n_isotopomers[idx], n_times[idx] = mdvs.shape
+
+        rows_per_fragment = n_isotopomers * n_times
+        fragment_index = np.repeat(np.arange(len(fragments)), rows_per_fragment)
+        columns = {}
+        for name in ["expt", "id"]:
+            columns[name] = np.asarray([fragment[name] for fragment in fragments], dtype=object)[fragment_index]
+        columns["time"] = np.concatenate(
+            [np.repeat(time, n) for time, n in zip(times, n_isotopomers)]
+        ) if fragments else np.empty(0)
+        columns["type"] = np.asarray([fragment["type"] for fragment in fragments], dtype=object)[fragment_index]
+        columns["mdv"] = np.concatenate(mdv_blocks) if fragments else np.empty(0)
+        columns["mass_isotope"] = np.concatenate(
+            [np.tile(np.arange(n_iso), n_t) for n_iso, n_t in zip(n_isotopomers, n_times)]
+        ) if fragments else np.empty(0, dtype=np.int64)
+        return pd.DataFrame(columns, index=fragment_index)
+
+    @property
+    def simulated_data_array(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Get the simulated MDVs as a dense array with the dimensions experiment, fragment, time
+        and mass isotopomer. Entries that are not simulated, e.g. fragments that are not measured
+        in an experiment or mass isotopomers beyond the size of a fragment, are NaN.
+
+        Returns
+        -------
+        Tuple[np.ndarray, Dict[str, np.ndarray]]
+            The 4D array and the coordinates of each dimension, with the keys "expt", "id", "time"
+            and "mass_isotope".
+        """
+        return self.matlab_file_cache.get_derived(
+            "simulation.simulated_data_array", self._build_simulated_data_array
         )
 
-        return long_format
+    def _build_simulated_data_array(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        data = self.simulated_data
+        coords = {}
+        indices = []
+        for name in ["expt", "id", "time", "mass_isotope"]:
+            values, index = np.unique(np.asarray(data[name]), return_inverse=True)
+            coords[name] = values
+            indices.append(index)
+        array = np.full(tuple(len(values) for values in coords.values()), np.nan)
+        array[tuple(indices)] = data["mdv"].to_numpy()
+        return array, coords
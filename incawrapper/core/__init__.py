@@ -5,4 +5,10 @@ from .INCAResults import *
 from .INCAScript_writing import *
 from .INCAScript import *
 from .dataschemas import *
+from .validation import *
+from .script_data_sidecar import *
+from .result_cache import *
+from .matlab_engine_pool import *
+from .inca_backends import *
 from .run_inca import *
+from .multistart import *
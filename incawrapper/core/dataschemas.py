@@ -1,27 +1,84 @@
+import numpy as np
+import pandas as pd
 import pandera as pa
 from typing import Optional
+
+
+# isinstance as a numpy ufunc, it still calls isinstance once per element but avoids the python
+# function call of a lambda
+_isinstance = np.frompyfunc(isinstance, 2, 1)
+
+
+def _is_list(series: pd.Series) -> pd.Series:
+    """Check that every element of a series is a python list. The dtype of the column is checked
+    first: the elements of a pyarrow list column are lists unless they are missing, and columns
+    with other dtypes than object cannot contain lists. Only object columns are checked element
+    by element."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.ArrowDtype):
+        import pyarrow
+
+        is_list_type = (
+            pyarrow.types.is_list(dtype.pyarrow_dtype)
+            or pyarrow.types.is_large_list(dtype.pyarrow_dtype)
+            or pyarrow.types.is_fixed_size_list(dtype.pyarrow_dtype)
+        )
+        if is_list_type:
+            return series.notna()
+    if dtype != object:
+        return pd.Series(False, index=series.index)
+    return pd.Series(_isinstance(series.to_numpy(), list).astype(bool), index=series.index)
+
+
+def _matches_unique_values(series: pd.Series, pattern: str) -> pd.Series:
+    """Vectorized version of Check.str_matches for columns with few distinct values, e.g. ids
+    that are repeated for every measurement. The pattern is only matched against the unique
+    values, which are found by hashing."""
+    codes, uniques = pd.factorize(series)
+    matches = pd.Series(uniques, dtype=object).str.match(pattern, na=False).to_numpy(dtype=bool)
+    # missing values have the code -1, these are handled by the nullable check of the column
+    return pd.Series(np.append(matches, False)[codes], index=series.index)
+
+
 ContainListsCheck = pa.Check(
-    lambda x: isinstance(x, list),
-    element_wise=True,
+    _is_list,
     title='Contain lists',
     description="Check if all elements of the column are lists",
     error="The column must contain python lists",
 )
 
 ValidateArrowsCheck = pa.Check(
-    lambda x: any(s in x for s in ("->", "<->")),
-    element_wise=True,
+    # "<->" contains "->", thus one substring search covers both arrows
+    lambda series: series.str.contains("->", regex=False),
     title='Validate arrows',
     description="Check if all elements of the column are valid reaction arrows",
     error="The column must contain valid reaction arrows: ->, <->",
 )
 
+
+def _tracer_id_is_unique(df: pd.DataFrame) -> pd.Series:
+    """A tracer can consist of several labelling groups (rows), but all rows of a tracer id in an
+    experiment must describe the same compound and enrichment. The rows are grouped by hashing."""
+    n_compounds = df.groupby(["experiment_id", "tracer_id"])[["met_id", "enrichment"]].transform("nunique")
+    return n_compounds.le(1).all(axis=1)
+
+
+UniqueTracerIdCheck = pa.Check(
+    _tracer_id_is_unique,
+    title='Unique tracer ids',
+    description="Check that each tracer id refers to one metabolite and enrichment in each experiment",
+    error="A tracer_id is used for different metabolites or enrichments in the same experiment",
+)
+
 # experiment_id column are used in multiple schemas therefore it is defined here
 ExperimentIdColumn = pa.Column(
     pa.String, 
     required=True, 
     description="ID of the experiment. Must be a valid MATLAB variable name, legal characters are a-z, A-Z, 0-9, and the underscore character.",
-    checks=pa.Check.str_matches(r'[\w-]+$', error="The experiment_id must be a valid MATLAB variable name, legal characters are a-z, A-Z, 0-9, and the underscore character."),
+    checks=pa.Check(
+        lambda series: _matches_unique_values(series, r'[\w-]+$'),
+        error="The experiment_id must be a valid MATLAB variable name, legal characters are a-z, A-Z, 0-9, and the underscore character.",
+    ),
 )
 ReactionIDColumn = pa.Column(
     pa.String, required=True, description="The unique id of the reaction"
@@ -34,16 +91,15 @@ MetaboliteIdColumn = pa.Column(
 
 # Define the schema for the model reactions
 ReactionsSchema = pa.DataFrameSchema(
-    # TODO: Add validation for id uniqueness
     columns={
-        "rxn_id": ReactionIDColumn,
+        "rxn_id": pa.Column(pa.String, required=True, unique=True, description="The unique id of the reaction"),
         "rxn_eqn": pa.Column(pa.String, required=True, checks=ValidateArrowsCheck, description="The reaction equation with atom map. Allowed reaction arrows: ->, <->."),
     }
 )
 
 TracerSchema = pa.DataFrameSchema(
     # TODO: Add validation for reaction arrow
-    # TODO: Add validation for id uniqueness
+    checks=[UniqueTracerIdCheck],
     columns={
         "experiment_id": ExperimentIdColumn,
         "tracer_id": pa.Column(pa.String, required=True, description="The unique id of the tracer compound."),
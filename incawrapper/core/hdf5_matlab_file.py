@@ -0,0 +1,412 @@
+import pathlib
+import weakref
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, Optional, Union
+import numpy as np
+
+# MATLAB saves files larger than 2 GB in the v7.3 format, which is a HDF5 file. Reading these
+# files requires the h5py package. h5py is an optional dependency, the v5 .mat files written by
+# INCA by default are read with scipy.
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+
+LARGE_ARRAY_BYTES = 64 * 2**20
+"""Numeric arrays larger than this are returned as H5MatArray objects also when lazy=False."""
+
+
+class _H5FileHandle:
+    """Owner of an open HDF5 file that is shared by the proxies (H5MatArray and H5MatStruct)
+    read from it. The file is closed by `close()` of any of the proxies, or when the last proxy
+    has been garbage collected."""
+
+    def __init__(self, h5file):
+        self.file = h5file
+        self.n_proxies = 0
+        self._finalizer = weakref.finalize(self, h5file.close)
+
+    def close(self) -> None:
+        self._finalizer()
+
+
+class _H5Proxy:
+    """Methods to close the file of a proxy. The proxies can be used as context managers."""
+
+    def _register(self, handle: Optional[_H5FileHandle]) -> None:
+        self._handle = handle
+        if handle is not None:
+            handle.n_proxies += 1
+
+    def close(self) -> None:
+        """Close the .mat file. All proxies read from the same load_matlab_file call share the
+        file, thus they cannot be read anymore afterwards."""
+        if self._handle is not None:
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class H5MatArray(_H5Proxy):
+    """Numeric matlab array stored in a v7.3 .mat file. The data stays on disk and is only read
+    when the array is sliced or converted with `np.asarray`. The shape follows the matlab
+    convention (the HDF5 dataset is stored transposed), and singleton dimensions are squeezed like
+    `load_matlab_file` does for arrays in memory.
+
+    Basic indexing with integers and slices only reads the selected part of the dataset, e.g.
+    `K[1000:2000]` reads 1000 Monte Carlo samples. Use `iter_blocks` to process a large array block
+    by block, and `memmap` to memory map datasets that are stored contiguously.
+
+    The file stays open as long as the array (or another proxy read from the same file) exists.
+    Use `close()` or a with statement to close it explicitly, e.g. before the file is replaced.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        The HDF5 dataset holding the matlab array.
+    handle : _H5FileHandle, optional
+        The owner of the open file, which is kept open as long as the array exists.
+    """
+
+    def __init__(self, dataset, handle: Optional[_H5FileHandle] = None):
+        self._register(handle)
+        self._dataset = dataset
+        # matlab axes in matlab order, as indices of the HDF5 dataset axes. Singleton axes are
+        # squeezed.
+        self._axes = [axis for axis in reversed(range(dataset.ndim)) if dataset.shape[axis] != 1]
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(self._dataset.shape[axis] for axis in self._axes)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dataset.dtype
+
+    @property
+    def ndim(self) -> int:
+        return len(self._axes)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self) -> int:
+        return self.size * self.dtype.itemsize
+
+    @property
+    def chunks(self) -> Optional[tuple]:
+        """Chunk shape of the dataset in matlab order, or None if the dataset is contiguous."""
+        if self._dataset.chunks is None:
+            return None
+        return tuple(self._dataset.chunks[axis] for axis in self._axes)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return f"H5MatArray(shape={self.shape}, dtype={self.dtype})"
+
+    def __array__(self, dtype=None):
+        data = self._read((slice(None),) * self.ndim)
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) <= self.ndim and all(isinstance(k, (int, np.integer, slice)) for k in key):
+            key = key + (slice(None),) * (self.ndim - len(key))
+            if all(isinstance(k, slice) and k.step in (None, 1) for k in key if isinstance(k, slice)):
+                return self._read(key)
+        # advanced indexing is not supported by HDF5, the full array is read
+        return np.asarray(self)[key]
+
+    def _read(self, key: tuple) -> np.ndarray:
+        """Read a selection given in matlab axes (integers and slices with step 1)."""
+        selection = [0] * self._dataset.ndim
+        for axis, k in zip(self._axes, key):
+            selection[axis] = k
+        data = self._dataset[tuple(selection)]
+        # the remaining axes are in HDF5 order, which is the reversed matlab order
+        return np.asarray(data).T
+
+    def iter_blocks(self, block_size: int) -> Iterator[np.ndarray]:
+        """Iterate over blocks of rows (the first matlab axis), reading one block at a time.
+
+        Parameters
+        ----------
+        block_size : int
+            Number of rows per block.
+
+        Yields
+        ------
+        np.ndarray
+            Blocks of at most block_size rows.
+        """
+        for start in range(0, len(self), block_size):
+            yield self[start:start + block_size]
+
+    def memmap(self) -> np.ndarray:
+        """Memory map the dataset. Only possible for contiguous datasets without compression,
+        which is how MATLAB stores arrays that are not chunked.
+
+        Returns
+        -------
+        np.ndarray
+            Read-only numpy memmap in matlab order (a transposed view of the file data).
+
+        Raises
+        ------
+        ValueError
+            If the dataset is chunked or has not been allocated in the file.
+        """
+        offset = self._dataset.id.get_offset()
+        if self._dataset.chunks is not None or offset is None:
+            raise ValueError(
+                "Only contiguous datasets can be memory mapped, use slicing or iter_blocks instead"
+            )
+        mapped = np.memmap(
+            self._dataset.file.filename,
+            dtype=self.dtype,
+            mode="r",
+            offset=offset,
+            shape=self._dataset.shape,
+        )
+        return mapped.T.reshape(self.shape)
+
+
+class H5MatStruct(_H5Proxy, Mapping):
+    """Read-only mapping proxy around a matlab struct in a v7.3 .mat file. The fields are read
+    from the file when they are accessed, and object references are dereferenced on access. The
+    converted value is kept for later accesses. Like H5MatArray, the proxy keeps the file open
+    until it is closed or garbage collected.
+
+    Parameters
+    ----------
+    group : h5py.Group
+        The HDF5 group holding the struct or struct array.
+    index : int, optional
+        Position in the struct array (in matlab order). None for a single struct.
+    handle : _H5FileHandle, optional
+        The owner of the open file, which is kept open as long as the proxy exists.
+    """
+
+    def __init__(self, group, index: Optional[int] = None, handle: Optional[_H5FileHandle] = None):
+        self._register(handle)
+        self._group = group
+        self._index = index
+        self._fieldnames = _struct_fieldnames(group)
+        self._converted = {}
+
+    def __getitem__(self, key):
+        if key not in self._converted:
+            if key not in self._fieldnames:
+                raise KeyError(key)
+            node = self._group[key]
+            if self._index is not None:
+                node = self._group.file[_matlab_order(node[()])[self._index]]
+            self._converted[key] = _read_node(node, True, self._handle)
+        return self._converted[key]
+
+    def __iter__(self):
+        return iter(self._fieldnames)
+
+    def __len__(self):
+        return len(self._fieldnames)
+
+    def __repr__(self):
+        return f"H5MatStruct(fields={self._fieldnames})"
+
+    def to_dict(self) -> Dict:
+        """Read the struct and all nested structs into nested dictionaries."""
+        return {key: _to_dict(value) for key, value in self.items()}
+
+
+def _to_dict(value):
+    """Convert H5MatStruct proxies, also inside object arrays, to dictionaries."""
+    if isinstance(value, H5MatStruct):
+        return value.to_dict()
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        converted = np.empty(value.shape, dtype=object)
+        for idx, elem in np.ndenumerate(value):
+            converted[idx] = _to_dict(elem)
+        return converted
+    return value
+
+
+def is_hdf5_matlab_file(filename: Union[str, pathlib.Path]) -> bool:
+    """Check if a .mat file is saved in the v7.3 format, i.e. as a HDF5 file."""
+    from scipy.io.matlab import matfile_version
+
+    return matfile_version(str(filename))[0] == 2
+
+
+def load_hdf5_matlab_file(
+    filename: Union[str, pathlib.Path],
+    variable_names: Optional[Iterable[str]] = None,
+    lazy: bool = False,
+) -> Dict:
+    """Read a v7.3 .mat file into the same structures as load_matlab_file gives for v5 files.
+    Numeric arrays larger than LARGE_ARRAY_BYTES (and all numeric arrays if lazy is True) are
+    returned as H5MatArray objects, which read the data from the file on access. The file is kept
+    open as long as such proxies exist, or until `close()` is called on one of them. If no
+    proxies are returned, the file is closed before the function returns.
+
+    Parameters
+    ----------
+    filename : pathlib.Path or str
+        Path to the .mat file.
+    variable_names : Iterable[str], optional
+        Names of the top level matlab variables to read. If None (default), all are read.
+    lazy : bool, optional
+        If True, structs are returned as H5MatStruct proxies that read the fields on access.
+
+    Returns
+    -------
+    Dict
+        Dictionary with the top level matlab variables as keys.
+    """
+    if not H5PY_AVAILABLE:
+        raise ImportError(
+            f"{filename} is a MATLAB v7.3 file, reading it requires the h5py package. It can be "
+            "installed by running 'pip install incawrapper[hdf5]'."
+        )
+    handle = _H5FileHandle(h5py.File(filename, "r"))
+    try:
+        names = [name for name in handle.file if not name.startswith("#")]
+        if variable_names is not None:
+            names = [name for name in names if name in set(variable_names)]
+        data = {name: _read_node(handle.file[name], lazy, handle) for name in names}
+    except BaseException:
+        handle.close()
+        raise
+    if handle.n_proxies == 0:
+        handle.close()
+    return data
+
+
+def _matlab_class(node) -> str:
+    matlab_class = node.attrs.get("MATLAB_class", b"")
+    return matlab_class.decode() if isinstance(matlab_class, bytes) else str(matlab_class)
+
+
+def _matlab_order(data: np.ndarray) -> np.ndarray:
+    """Flatten data read from a dataset in matlab (column-major) order."""
+    return np.asarray(data).T.reshape(-1)
+
+
+def _squeezed_shape(shape: tuple) -> tuple:
+    return tuple(n for n in reversed(shape) if n != 1)
+
+
+def _struct_fieldnames(group) -> list:
+    """Field names in matlab order. MATLAB stores them as arrays of single characters."""
+    if "MATLAB_fields" in group.attrs:
+        return [
+            field.decode() if isinstance(field, bytes) else b"".join(field.tolist()).decode()
+            for field in group.attrs["MATLAB_fields"]
+        ]
+    return list(group.keys())
+
+
+def _is_struct_array(group) -> bool:
+    """Struct arrays store each field as a dataset of object references without a matlab class,
+    single structs store the field values directly."""
+    for name in _struct_fieldnames(group):
+        node = group[name]
+        is_reference = isinstance(node, h5py.Dataset) and node.dtype == h5py.ref_dtype
+        if is_reference and "MATLAB_class" not in node.attrs:
+            return True
+    return False
+
+
+def _squeeze(data: np.ndarray):
+    """Squeeze singleton dimensions like scipy.io.loadmat with squeeze_me=True."""
+    data = np.squeeze(data)
+    return data.item() if data.ndim == 0 else data
+
+
+def _read_node(node, lazy: bool, handle: _H5FileHandle):
+    """Read a HDF5 dataset or group of a v7.3 .mat file."""
+    matlab_class = _matlab_class(node)
+    if node.attrs.get("MATLAB_empty", 0):
+        return "" if matlab_class == "char" else np.empty(0)
+
+    if isinstance(node, h5py.Group):
+        if "MATLAB_sparse" in node.attrs:
+            return _read_sparse(node)
+        if not _is_struct_array(node):
+            if lazy:
+                return H5MatStruct(node, handle=handle)
+            return {
+                name: _read_node(node[name], lazy, handle)
+                for name in _struct_fieldnames(node)
+            }
+        return _read_struct_array(node, lazy, handle)
+
+    if matlab_class == "char":
+        return _read_char(node[()])
+    if matlab_class == "cell" or node.dtype == h5py.ref_dtype:
+        refs = node[()]
+        cells = np.empty(len(_matlab_order(refs)), dtype=object)
+        for idx, ref in enumerate(_matlab_order(refs)):
+            cells[idx] = _read_node(node.file[ref], lazy, handle)
+        return _squeeze(cells.reshape(refs.T.shape, order="F")) if cells.size else np.empty(0)
+    if matlab_class == "logical":
+        return _squeeze(node[()].T.astype(bool))
+
+    if node.dtype.names is not None and set(node.dtype.names) == {"real", "imag"}:
+        data = node[()]
+        return _squeeze((data["real"] + 1j * data["imag"]).T)
+    if (lazy and node.size > 1) or node.size * node.dtype.itemsize > LARGE_ARRAY_BYTES:
+        return H5MatArray(node, handle)
+    return _squeeze(node[()].T)
+
+
+def _read_char(data: np.ndarray) -> Union[str, np.ndarray]:
+    """Convert the uint16 code points of a matlab char array to strings, one per row."""
+    rows = np.atleast_2d(data.T)
+    strings = ["".join(map(chr, row.tolist())) for row in rows]
+    return strings[0] if len(strings) == 1 else np.array(strings)
+
+
+def _read_sparse(group):
+    from scipy.sparse import csc_matrix
+
+    n_rows = int(group.attrs["MATLAB_sparse"])
+    jc = group["jc"][()]
+    data = group["data"][()] if "data" in group else np.ones(len(group["ir"]))
+    return csc_matrix((data, group["ir"][()], jc), shape=(n_rows, len(jc) - 1))
+
+
+def _read_struct_array(group, lazy: bool, handle: _H5FileHandle):
+    """Read a struct array as an object array of dictionaries (or H5MatStruct proxies)."""
+    fieldnames = _struct_fieldnames(group)
+    ref_shape = group[fieldnames[0]].shape
+    shape = _squeezed_shape(ref_shape)
+    size = int(np.prod(ref_shape))
+
+    if lazy:
+        elements = np.empty(size, dtype=object)
+        for idx in range(size):
+            elements[idx] = H5MatStruct(group, idx, handle)
+        return elements.reshape(shape, order="F") if shape else elements[0]
+
+    columns = {}
+    for name in fieldnames:
+        refs = _matlab_order(group[name][()])
+        columns[name] = [_read_node(group.file[ref], lazy, handle) for ref in refs]
+
+    if not shape:
+        return {name: column[0] for name, column in columns.items()}
+
+    elements = np.empty(size, dtype=object)
+    for idx in range(size):
+        elements[idx] = {name: column[idx] for name, column in columns.items()}
+    return elements.reshape(shape, order="F")
@@ -0,0 +1,379 @@
+"""Backends that execute a saved INCA script.
+
+`run_inca`, `run_inca_async` and `run_inca_batch` save the INCA script to the execution directory
+and hand it to a backend that runs it:
+
+- `EngineINCABackend` runs the script in a MATLAB engine (matlabengine package), optionally
+  using a `MatlabEnginePool`. This is the default backend.
+- `SubprocessINCABackend` runs the script in a separate `matlab -batch` process. Every run is
+  isolated in its own process, which can be given OS-level resource limits.
+- `FakeINCABackend` does not run MATLAB, but copies canned .mat results to the output files of
+  the script. It makes it possible to test and benchmark the whole pipeline from writing the
+  script to parsing the results on machines without MATLAB.
+"""
+import asyncio
+import contextlib
+import os
+import pathlib
+import shutil
+import subprocess
+import time
+from typing import Callable, Mapping, Optional, Sequence, Tuple, Union
+from incawrapper.core.INCAScript import INCAScript
+from incawrapper.core.matlab_engine_pool import MatlabEnginePool
+
+PathLike = Union[str, pathlib.Path]
+
+
+class INCABackend:
+    """Interface for executing INCA scripts. A backend runs a script that has been saved to
+    `script_file`, the execution directory is the directory of the script file. The run must
+    write the output files of the script (see INCAScript.output_files) and raise an exception
+    if the script fails.
+    """
+
+    def run(
+        self, inca_script: INCAScript, script_file: pathlib.Path, INCA_base_directory: pathlib.Path
+    ) -> None:
+        """Run a saved INCA script.
+
+        Parameters
+        ----------
+        inca_script : INCAScript
+            The script, which has been saved to script_file.
+        script_file : pathlib.Path
+            The saved script.
+        INCA_base_directory : pathlib.Path
+            The path to the INCA base directory, i.e. the directory that contains the INCA
+            executable.
+        """
+        raise NotImplementedError
+
+    async def run_async(
+        self,
+        inca_script: INCAScript,
+        script_file: pathlib.Path,
+        INCA_base_directory: pathlib.Path,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.5,
+    ) -> None:
+        """Run a saved INCA script without blocking the event loop, see run. By default the run
+        is done in a thread, backends that can cancel a run override this.
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            If the script did not finish within the timeout.
+        """
+        await asyncio.wait_for(
+            asyncio.to_thread(self.run, inca_script, script_file, INCA_base_directory), timeout
+        )
+
+
+class EngineINCABackend(INCABackend):
+    """Backend that runs the scripts in MATLAB engines.
+
+    Parameters
+    ----------
+    engine_pool : MatlabEnginePool, optional
+        The engines to run the scripts in, by default None. If None, a new MATLAB engine is
+        started for every script and shut down afterwards.
+    """
+
+    def __init__(self, engine_pool: Optional[MatlabEnginePool] = None):
+        self.engine_pool = engine_pool
+
+    @contextlib.contextmanager
+    def _pool(self, INCA_base_directory: pathlib.Path):
+        if self.engine_pool is not None:
+            yield self.engine_pool
+            return
+        print("Starting MATLAB engine...")
+        pool = MatlabEnginePool(INCA_base_directory)
+        try:
+            yield pool
+        finally:
+            pool.close()
+
+    def run(
+        self, inca_script: INCAScript, script_file: pathlib.Path, INCA_base_directory: pathlib.Path
+    ) -> None:
+        with self._pool(INCA_base_directory) as pool, pool.acquire() as eng:
+            eng.cd(str(script_file.parent.resolve()), nargout=0)
+            getattr(eng, script_file.stem)(nargout=0)
+
+    async def run_async(
+        self,
+        inca_script: INCAScript,
+        script_file: pathlib.Path,
+        INCA_base_directory: pathlib.Path,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.5,
+    ) -> None:
+        """Run the script with the background execution of the MATLAB engine. If the coroutine
+        is cancelled or the timeout is reached, the MATLAB execution is cancelled as well and the
+        engine is shut down. Acquiring and releasing the engine blocks, thus it is done in a
+        thread."""
+        pool = self.engine_pool or MatlabEnginePool(INCA_base_directory)
+        stack = contextlib.ExitStack()
+        try:
+            try:
+                eng = await _acquire_engine(stack, pool)
+                eng.cd(str(script_file.parent.resolve()), nargout=0)
+                future = getattr(eng, script_file.stem)(nargout=0, background=True)
+                await _wait_for_engine_future(future, timeout, poll_interval)
+            except BaseException as error:
+                # the pool shuts down the engine when it receives the exception
+                if not await asyncio.to_thread(stack.__exit__, type(error), error, error.__traceback__):
+                    raise
+            else:
+                # returning the engine to the pool resets it
+                await asyncio.to_thread(stack.close)
+        finally:
+            if self.engine_pool is None:
+                await asyncio.to_thread(pool.close)
+
+
+async def _acquire_engine(stack: contextlib.ExitStack, pool: MatlabEnginePool):
+    """Acquire an engine of the pool and register its release in the exit stack. Starting an
+    engine or waiting for a free engine blocks, thus it is done in a thread. If the coroutine is
+    cancelled while waiting, the engine is returned to the pool as soon as it is acquired."""
+    acquire = pool.acquire()
+    acquiring = asyncio.ensure_future(asyncio.to_thread(acquire.__enter__))
+    try:
+        eng = await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        def release(task):
+            if task.exception() is None:
+                acquire.__exit__(None, None, None)
+        acquiring.add_done_callback(release)
+        raise
+    stack.push(acquire.__exit__)
+    return eng
+
+
+async def _wait_for_engine_future(future, timeout: Optional[float], poll_interval: float):
+    """Wait for a future of the MATLAB engine without blocking the event loop. The future is
+    cancelled if the waiting coroutine is cancelled or the timeout is reached."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while not future.done():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise asyncio.TimeoutError(f"INCA did not finish within {timeout} seconds")
+            await asyncio.sleep(poll_interval)
+    except BaseException:
+        # the exception also makes the engine pool shut down the engine
+        future.cancel()
+        raise
+    return future.result()
+
+
+class SubprocessINCABackend(INCABackend):
+    """Backend that runs every script in its own MATLAB process started with `matlab -batch`.
+    The output of MATLAB is written to a log file next to the script, e.g. inca_script.log. Runs
+    are isolated from each other, thus many scripts can be run in parallel, e.g. with
+    run_inca_batch, and a crashing script does not affect the other runs. Starting MATLAB and
+    INCA for every script takes some time, use EngineINCABackend with a MatlabEnginePool for
+    many short runs.
+
+    Parameters
+    ----------
+    matlab_executable : PathLike, optional
+        The MATLAB executable, by default "matlab" (found on the PATH).
+    extra_args : Sequence[str], optional
+        Additional command line arguments passed to MATLAB before -batch, e.g.
+        ["-singleCompThread"].
+    timeout : float, optional
+        Maximum number of seconds a script is allowed to run, by default None (no limit). The
+        MATLAB process is killed when the timeout is reached.
+    env : Mapping[str, str], optional
+        Environment variables of the MATLAB process, by default the environment of python.
+    resource_limits : Mapping[int, Tuple[int, int]], optional
+        Resource limits of the MATLAB process as (soft, hard) limits for resources of the
+        resource module, e.g. {resource.RLIMIT_AS: (8 * 2**30, 8 * 2**30)} to limit the memory
+        to 8 GB. The limits are set by starting MATLAB through the prlimit command of util-linux,
+        thus they are only supported on Linux. By default None (no limits).
+
+    Examples
+    --------
+    >>> backend = SubprocessINCABackend("/usr/local/MATLAB/R2023a/bin/matlab", timeout=3600)
+    >>> run_inca(script, "path/to/INCA", backend=backend)
+    """
+
+    def __init__(
+        self,
+        matlab_executable: PathLike = "matlab",
+        extra_args: Sequence[str] = (),
+        timeout: Optional[float] = None,
+        env: Optional[Mapping[str, str]] = None,
+        resource_limits: Optional[Mapping[int, Tuple[int, int]]] = None,
+    ):
+        self.matlab_executable = str(matlab_executable)
+        self.extra_args = list(extra_args)
+        self.timeout = timeout
+        self.env = dict(env) if env is not None else None
+        self.resource_limits = dict(resource_limits or {})
+        self._prlimit_args = _prlimit_args(self.resource_limits) if self.resource_limits else []
+
+    def command(self, script_file: pathlib.Path, INCA_base_directory: pathlib.Path):
+        """Return the command line that runs the script."""
+        code = (
+            f"cd({_matlab_string(INCA_base_directory.resolve())}); startup; setpath; "
+            f"cd({_matlab_string(script_file.parent.resolve())}); {script_file.stem}"
+        )
+        return [*self._prlimit_args, self.matlab_executable, *self.extra_args, "-batch", code]
+
+    def _popen_kwargs(self, script_file: pathlib.Path) -> dict:
+        return {"cwd": script_file.parent, "env": self.env}
+
+    def _check_returncode(self, returncode: int, log_file: pathlib.Path) -> None:
+        if returncode != 0:
+            log_tail = log_file.read_text(errors="replace")[-2000:]
+            raise RuntimeError(
+                f"MATLAB exited with code {returncode}, see {log_file}. End of the log:\n{log_tail}"
+            )
+
+    def run(
+        self, inca_script: INCAScript, script_file: pathlib.Path, INCA_base_directory: pathlib.Path
+    ) -> None:
+        log_file = script_file.with_suffix(".log")
+        with open(log_file, "wb") as log:
+            process = subprocess.run(
+                self.command(script_file, INCA_base_directory),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                timeout=self.timeout,
+                **self._popen_kwargs(script_file),
+            )
+        self._check_returncode(process.returncode, log_file)
+
+    async def run_async(
+        self,
+        inca_script: INCAScript,
+        script_file: pathlib.Path,
+        INCA_base_directory: pathlib.Path,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.5,
+    ) -> None:
+        """Run the script in a MATLAB process started by the event loop. The timeout defaults to
+        the timeout of the backend. If the coroutine is cancelled or the timeout is reached, the
+        MATLAB process is killed."""
+        log_file = script_file.with_suffix(".log")
+        with open(log_file, "wb") as log:
+            process = await asyncio.create_subprocess_exec(
+                *self.command(script_file, INCA_base_directory),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                **self._popen_kwargs(script_file),
+            )
+            try:
+                await asyncio.wait_for(process.wait(), timeout if timeout is not None else self.timeout)
+            except BaseException:
+                if process.returncode is None:
+                    process.kill()
+                    await asyncio.shield(process.wait())
+                raise
+        self._check_returncode(process.returncode, log_file)
+
+
+def _prlimit_args(resource_limits: Mapping[int, Tuple[int, int]]) -> list:
+    """Return the prlimit command that sets the resource limits of the command after it. The
+    limits are not set with preexec_fn of subprocess, which is not safe in threads."""
+    prlimit = shutil.which("prlimit")
+    if os.name != "posix" or prlimit is None:
+        raise ValueError("Resource limits require the prlimit command of util-linux")
+    import resource
+
+    options = {
+        getattr(resource, f"RLIMIT_{name.upper()}"): name
+        for name in ["as", "core", "cpu", "data", "fsize", "memlock", "nofile", "nproc", "rss", "stack"]
+        if hasattr(resource, f"RLIMIT_{name.upper()}")
+    }
+    args = [prlimit]
+    for limit, values in resource_limits.items():
+        if limit not in options:
+            raise ValueError(f"Resource limit {limit} is not supported, use one of {sorted(options)}")
+        soft, hard = ("unlimited" if value == resource.RLIM_INFINITY else str(value) for value in values)
+        args.append(f"--{options[limit]}={soft}:{hard}")
+    return [*args, "--"]
+
+
+def _matlab_string(value) -> str:
+    """Return a value as a quoted MATLAB char array."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+CannedResults = Union[PathLike, Mapping[str, PathLike]]
+
+
+class FakeINCABackend(INCABackend):
+    """Backend that does not run INCA, but copies canned results to the output files of the
+    scripts. Use it to test or benchmark the pipeline of writing scripts, running them and
+    parsing the results on machines without MATLAB.
+
+    Parameters
+    ----------
+    results : CannedResults or Callable[[INCAScript], CannedResults]
+        The canned results: a .mat file that is copied to every output file of the script, or a
+        mapping from the names of the output files (see INCAScript.output_files, e.g. "filename"
+        and "mc_filename") to .mat files. A function that returns the canned results of a script
+        can be given to script the results of every run, the function may raise an exception to
+        simulate a failing run.
+    duration : float, optional
+        Seconds each run takes, by default 0.0.
+
+    Attributes
+    ----------
+    runs : List[pathlib.Path]
+        The script files that have been run.
+
+    Examples
+    --------
+    >>> backend = FakeINCABackend("simple_model_quikstart.mat")
+    >>> run_inca(script, "path/to/INCA", backend=backend)
+    >>> INCAResults(script.output_files["filename"]).fitdata.get_goodness_of_fit()
+    """
+
+    def __init__(
+        self,
+        results: Union[CannedResults, Callable[[INCAScript], CannedResults]],
+        duration: float = 0.0,
+    ):
+        self.results = results
+        self.duration = duration
+        self.runs = []
+
+    def _copy_results(self, inca_script: INCAScript, script_file: pathlib.Path) -> None:
+        self.runs.append(script_file)
+        results = self.results(inca_script) if callable(self.results) else self.results
+        for name, output_file in inca_script.output_files.items():
+            if isinstance(results, Mapping):
+                if name not in results:
+                    raise KeyError(f"No canned result for the output file '{name}' of the script")
+                canned_file = results[name]
+            else:
+                canned_file = results
+            if not output_file.is_absolute():
+                output_file = script_file.parent / output_file
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(canned_file, output_file)
+
+    def run(
+        self, inca_script: INCAScript, script_file: pathlib.Path, INCA_base_directory: pathlib.Path
+    ) -> None:
+        time.sleep(self.duration)
+        self._copy_results(inca_script, script_file)
+
+    async def run_async(
+        self,
+        inca_script: INCAScript,
+        script_file: pathlib.Path,
+        INCA_base_directory: pathlib.Path,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.5,
+    ) -> None:
+        await asyncio.wait_for(asyncio.sleep(self.duration), timeout)
+        self._copy_results(inca_script, script_file)
+
+
+__all__ = ["INCABackend", "EngineINCABackend", "SubprocessINCABackend", "FakeINCABackend"]
@@ -1,7 +1,107 @@
 import numpy as np
+from collections.abc import Mapping
 from scipy.io import loadmat, matlab
+from incawrapper.core import hdf5_matlab_file
+from typing import Dict, Iterable, Optional
 
-def load_matlab_file(filename):
+
+class LazyMatStruct(Mapping):
+    """Read-only mapping proxy around a matlab struct. The fields of the struct are only
+    converted to python objects when they are accessed, and the converted value is kept for
+    later accesses. Nested structs are returned as LazyMatStruct objects as well, thus large
+    parts of a struct that are never touched are never converted.
+
+    Parameters
+    ----------
+    matobj : scipy.io.matlab.mat_struct
+        The matlab struct loaded by scipy.io.loadmat.
+    """
+
+    def __init__(self, matobj: matlab.mat_struct):
+        self._matobj = matobj
+        self._converted = {}
+
+    def __getitem__(self, key):
+        if key not in self._converted:
+            if key not in self._matobj._fieldnames:
+                raise KeyError(key)
+            self._converted[key] = _convert_lazily(self._matobj.__dict__[key])
+        return self._converted[key]
+
+    def __iter__(self):
+        return iter(self._matobj._fieldnames)
+
+    def __len__(self):
+        return len(self._matobj._fieldnames)
+
+    def __repr__(self):
+        return f"LazyMatStruct(fields={self._matobj._fieldnames})"
+
+    def to_dict(self) -> Dict:
+        """Convert the struct and all nested structs to nested dictionaries.
+
+        Returns
+        -------
+        Dict
+            The same output as load_matlab_file with lazy=False gives for the struct.
+        """
+        return _todict(self._matobj)
+
+
+def _convert_lazily(elem):
+    """Wrap matlab structs in LazyMatStruct proxies, also inside cell arrays. Numeric arrays are
+    returned as they are."""
+    if isinstance(elem, matlab.mat_struct):
+        return LazyMatStruct(elem)
+    if isinstance(elem, np.ndarray) and elem.dtype == object:
+        wrapped = np.empty(elem.shape, dtype=object)
+        for idx, sub_elem in np.ndenumerate(elem):
+            wrapped[idx] = _convert_lazily(sub_elem)
+        return wrapped
+    return elem
+
+
+def _todict(matobj):
+    """
+    A recursive function which constructs from matobjects nested dictionaries
+    """
+    d = {}
+    for strg in matobj._fieldnames:
+        elem = matobj.__dict__[strg]
+        if isinstance(elem, matlab.mat_struct):
+            d[strg] = _todict(elem)
+        elif isinstance(elem, np.ndarray):
+            d[strg] = _toarray(elem)
+        else:
+            d[strg] = elem
+    return d
+
+
+def _toarray(ndarray):
+    """
+    A recursive function which constructs ndarray from cellarrays
+    (which are loaded as numpy ndarrays), recursing into the elements
+    if they contain matobjects.
+    """
+    if ndarray.dtype != "float64":
+        elem_list = []
+        for sub_elem in ndarray:
+            if isinstance(sub_elem, matlab.mat_struct):
+                elem_list.append(_todict(sub_elem))
+            elif isinstance(sub_elem, np.ndarray):
+                elem_list.append(_toarray(sub_elem))
+            else:
+                elem_list.append(sub_elem)
+        return np.array(elem_list)
+    else:
+        return ndarray
+
+
+def load_matlab_file(
+    filename,
+    variable_names: Optional[Iterable[str]] = None,
+    lazy: bool = False,
+):
     """
     This function should be called instead of direct scipy.io.loadmat
     as it cures the problem of not properly recovering python dictionaries
@@ -10,6 +110,30 @@ def load_matlab_file(filename):
 
     Thanks to Jeff Lin for this solution
     From: https://stackoverflow.com/questions/48970785/complex-matlab-struct-mat-file-read-by-python
+
+    Parameters
+    ----------
+    filename : pathlib.Path or str
+        Path to the .mat file.
+    variable_names : Iterable[str], optional
+        Names of the top level matlab variables to read, e.g. ["f"]. The other variables in the
+        file are skipped without being parsed. If None (default), all variables are read.
+    lazy : bool, optional
+        If True, structs are returned as LazyMatStruct proxies, which only convert a field
+        when it is accessed. If False (default), all structs are converted to nested
+        dictionaries upfront.
+
+    Notes
+    -----
+    Files saved by MATLAB in the v7.3 format (HDF5) are read with h5py, see
+    `hdf5_matlab_file.load_hdf5_matlab_file`. Large numeric arrays in these files, e.g. the Monte
+    Carlo samples, are returned as H5MatArray objects that read the data from disk on access. The
+    file is kept open until these objects are garbage collected or closed with `close()`.
+
+    Returns
+    -------
+    Dict
+        Dictionary with the top level matlab variables as keys.
     """
 
     def _check_vars(d):
@@ -18,51 +142,38 @@ def load_matlab_file(filename):
         todict is called to change them to nested dictionaries
         """
         for key in d:
-            if isinstance(d[key], matlab.mat_struct):
+            if lazy:
+                d[key] = _convert_lazily(d[key])
+            elif isinstance(d[key], matlab.mat_struct):
                 d[key] = _todict(d[key])
             elif isinstance(d[key], np.ndarray):
                 d[key] = _toarray(d[key])
         return d
 
-    def _todict(matobj):
-        """
-        A recursive function which constructs from matobjects nested dictionaries
-        """
-        d = {}
-        for strg in matobj._fieldnames:
-            elem = matobj.__dict__[strg]
-            if isinstance(elem, matlab.mat_struct):
-                d[strg] = _todict(elem)
-            elif isinstance(elem, np.ndarray):
-                d[strg] = _toarray(elem)
-            else:
-                d[strg] = elem
-        return d
-
-    def _toarray(ndarray):
-        """
-        A recursive function which constructs ndarray from cellarrays
-        (which are loaded as numpy ndarrays), recursing into the elements
-        if they contain matobjects.
-        """
-        if ndarray.dtype != "float64":
-            elem_list = []
-            for sub_elem in ndarray:
-                if isinstance(sub_elem, matlab.mat_struct):
-                    elem_list.append(_todict(sub_elem))
-                elif isinstance(sub_elem, np.ndarray):
-                    elem_list.append(_toarray(sub_elem))
-                else:
-                    elem_list.append(sub_elem)
-            return np.array(elem_list)
-        else:
-            return ndarray
+    if variable_names is not None:
+        variable_names = list(variable_names)
 
     # if the file is not found, load_matlab_file will raise an OSError. We catch this error and
-    # raise a FileNotFoundError instead, which is more informative.   
+    # raise a FileNotFoundError instead, which is more informative.
     try:
-        data = loadmat(filename, struct_as_record=False, squeeze_me=True, appendmat=False)
+        is_hdf5 = hdf5_matlab_file.is_hdf5_matlab_file(filename)
     except OSError:
         raise FileNotFoundError(f"Could not find the file {filename}")
-        
+    if is_hdf5:
+        # v7.3 files cannot be read by scipy
+        return hdf5_matlab_file.load_hdf5_matlab_file(
+            filename, variable_names=variable_names, lazy=lazy
+        )
+
+    try:
+        data = loadmat(
+            filename,
+            struct_as_record=False,
+            squeeze_me=True,
+            appendmat=False,
+            variable_names=variable_names,
+        )
+    except OSError:
+        raise FileNotFoundError(f"Could not find the file {filename}")
+
     return _check_vars(data)
@@ -0,0 +1,156 @@
+import contextlib
+import pathlib
+import queue
+import threading
+from typing import Any, Iterator, List, Optional, Union
+
+
+class EngineBackend:
+    """Interface for starting MATLAB engines. The MatlabEnginePool starts its engines through a
+    backend, such that the pool can be used with a different engine implementation, e.g. a fake
+    engine in tests on machines without MATLAB.
+
+    An engine must provide the methods of matlab.engine.MatlabEngine used by incawrapper:
+    `cd(path, nargout=0)`, `eval(code, nargout=0)`, `quit()` and calling the INCA functions
+    `startup` and `setpath` and the script as attributes, e.g. `engine.startup(nargout=0)`.
+    """
+
+    def start_engine(self) -> Any:
+        """Start a new engine."""
+        raise NotImplementedError
+
+
+class MatlabEngineBackend(EngineBackend):
+    """Backend that starts engines with the MATLAB engine API for python (matlabengine package)."""
+
+    def start_engine(self) -> Any:
+        try:
+            import matlab.engine
+        except ImportError:
+            raise ImportError(
+                "The matlabengine package is not installed. This is required to run INCA "
+                "from python."
+            )
+        return matlab.engine.start_matlab()
+
+
+class MatlabEnginePool:
+    """Pool of MATLAB engines with INCA loaded. Starting MATLAB and setting up the INCA path
+    takes tens of seconds, the pool does this once per engine and reuses the engines for all
+    scripts run with the pool. Between two scripts, the functions cached by MATLAB are cleared
+    with `clear functions`. An engine in which a script has failed is shut down and replaced by
+    a new engine when needed.
+
+    The engines are started when they are first needed. The pool is thread safe, at most `size`
+    scripts are run at the same time. Use the pool as a context manager or call `close()` to
+    shut down the engines.
+
+    Parameters
+    ----------
+    INCA_base_directory : pathlib.Path
+        The path to the INCA base directory, i.e. the directory that contains the INCA executable.
+    size : int, optional
+        The maximum number of engines. Default is 1.
+    backend : EngineBackend, optional
+        The backend used to start engines. Default is MatlabEngineBackend.
+
+    Examples
+    --------
+    >>> with MatlabEnginePool("path/to/INCA") as pool:
+    ...     for script in scripts:
+    ...         run_inca(script, "path/to/INCA", engine_pool=pool)
+    """
+
+    def __init__(
+        self,
+        INCA_base_directory: Union[str, pathlib.Path],
+        size: int = 1,
+        backend: Optional[EngineBackend] = None,
+    ):
+        if size < 1:
+            raise ValueError("The size of the engine pool must be at least 1")
+        self.INCA_base_directory = pathlib.Path(INCA_base_directory)
+        self.size = size
+        self.backend = backend if backend is not None else MatlabEngineBackend()
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._engines: List[Any] = []
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self) -> "MatlabEnginePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def n_engines(self) -> int:
+        """The number of running engines."""
+        return len(self._engines)
+
+    def _start_engine(self) -> Any:
+        engine = self.backend.start_engine()
+        try:
+            engine.cd(str(self.INCA_base_directory.resolve()), nargout=0)
+            engine.startup(nargout=0)
+            engine.setpath(nargout=0)
+        except BaseException:
+            engine.quit()
+            raise
+        with self._lock:
+            self._engines.append(engine)
+        return engine
+
+    def _discard(self, engine: Any) -> None:
+        with self._lock:
+            self._engines.remove(engine)
+        try:
+            engine.quit()
+        except Exception:
+            pass
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Context manager that provides an engine with INCA loaded. The engine is returned to
+        the pool when the context exits, or shut down if an exception was raised.
+
+        Yields
+        ------
+        engine
+            The MATLAB engine.
+        """
+        if self._closed:
+            raise RuntimeError("The engine pool is closed")
+        self._slots.acquire()
+        try:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                engine = self._start_engine()
+            try:
+                yield engine
+                # reset the engine for the next job
+                engine.eval("clear functions", nargout=0)
+            except BaseException:
+                self._discard(engine)
+                raise
+            if self._closed:
+                self._discard(engine)
+            else:
+                self._idle.put(engine)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """Shut down all engines of the pool."""
+        self._closed = True
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(engine)
+
+
+__all__ = ["EngineBackend", "MatlabEngineBackend", "MatlabEnginePool"]
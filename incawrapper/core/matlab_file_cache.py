@@ -0,0 +1,86 @@
+import pathlib
+from typing import Any, Callable, Hashable, Optional, Union
+from incawrapper.core import load_matlab_file
+from incawrapper.core.sidecar_cache import MISSING, SidecarCache
+
+
+class MatlabFileCache:
+    """Parse-once store for the content of an INCA .mat file. Each top level variable (e.g. "f",
+    "m" or "s") is read from the file on its first access and kept in memory, the other variables
+    in the file are not parsed. Data derived from the parsed variables (e.g. the data frames
+    exposed by INCAFitData) can be memoized in the same store, such that they are only computed
+    once.
+
+    The cache is shared by the INCAModel, INCAFitData and INCASimulation objects created by
+    INCAResults, which ensures that the .mat file is only parsed once. It is not intended to be
+    used directly.
+
+    Parameters
+    ----------
+    inca_matlab_file : pathlib.Path or str
+        Path to the .mat file produced by INCA.
+    lazy : bool, optional
+        If True, structs are loaded as LazyMatStruct proxies that convert the fields on access,
+        see `load_matlab_file`. Default is False.
+    sidecar : SidecarCache, optional
+        On-disk cache of the derived data. If given, derived data is read from the sidecar cache
+        before the builder is called, and newly built data is written to it. Default is None.
+    """
+
+    def __init__(
+        self,
+        inca_matlab_file: Union[str, pathlib.Path],
+        lazy: bool = False,
+        sidecar: Optional[SidecarCache] = None,
+    ):
+        self.inca_matlab_file = pathlib.Path(inca_matlab_file)
+        self.lazy = lazy
+        self.sidecar = sidecar
+        self._variables = {}
+        self._derived = {}
+
+    def __getitem__(self, variable_name: str) -> Any:
+        """Return a top level matlab variable, e.g. "f", "m" or "s". Only the requested variable
+        is read from the file."""
+        if variable_name not in self._variables:
+            loaded = load_matlab_file.load_matlab_file(
+                self.inca_matlab_file, variable_names=[variable_name], lazy=self.lazy
+            )
+            if variable_name not in loaded:
+                raise KeyError(
+                    f"The variable '{variable_name}' is not found in {self.inca_matlab_file}"
+                )
+            self._variables[variable_name] = loaded[variable_name]
+        return self._variables[variable_name]
+
+    def get_derived(self, key: Hashable, builder: Callable[[], Any]) -> Any:
+        """Return memoized data derived from the parsed file. If the key has not been computed
+        yet, it is read from the sidecar cache, or else the builder is called and the result is
+        stored under the key (and in the sidecar cache).
+
+        Parameters
+        ----------
+        key : Hashable
+            Unique key of the derived data, e.g. "fitdata.fitted_parameters".
+        builder : Callable
+            Function without arguments that computes the derived data.
+
+        Returns
+        -------
+        Any
+            The memoized result of the builder.
+        """
+        if key not in self._derived:
+            value = MISSING if self.sidecar is None else self.sidecar.load(key)
+            if value is MISSING:
+                value = builder()
+                if self.sidecar is not None:
+                    self.sidecar.save(key, value)
+            self._derived[key] = value
+        return self._derived[key]
+
+    def clear(self) -> None:
+        """Discard the parsed variables and all derived data. The file will be parsed again on
+        the next access."""
+        self._variables = {}
+        self._derived = {}
@@ -0,0 +1,260 @@
+import pathlib
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from scipy.io.matlab import MatReadError
+from incawrapper.core import hdf5_matlab_file, load_matlab_file
+from incawrapper.core.monte_carlo_statistics import MonteCarloSummary
+
+
+@dataclass
+class MonteCarloProgress:
+    """Snapshot of a running Monte Carlo sampling, returned by MonteCarloDumpReader.
+
+    Attributes
+    ----------
+    n_iterations : int
+        Number of finished iterations found in the dump file.
+    n_samples : int
+        Number of samples read so far.
+    new_samples : np.ndarray
+        The samples of the iterations that were new in this update.
+    summary : MonteCarloSummary
+        Streaming summary of all samples read so far.
+    running_ci : pd.DataFrame
+        Percentile confidence intervals of the samples read so far, index ["lb", "ub"].
+    ci : pd.DataFrame
+        The confidence intervals written to the dump file by INCA, index ["lb", "ub"].
+    """
+
+    n_iterations: int
+    n_samples: int
+    new_samples: np.ndarray
+    summary: MonteCarloSummary
+    running_ci: pd.DataFrame
+    ci: pd.DataFrame
+
+
+class MonteCarloDumpReader:
+    """Incremental reader of the dump file that INCA writes while the Monte Carlo sampling is
+    running. Each call of `poll` checks if the file has changed, reads the `k` and `ci0` variables
+    and adds the samples of the iterations that have not been seen before to an in-memory buffer
+    and a streaming summary. Use `follow` to monitor the sampling and e.g. stop it once the
+    confidence intervals have converged.
+
+    Dump files in the v7.3 format are read incrementally, i.e. only the new iterations of `k` are
+    read from the file. Dump files in the older v5 format cannot be read partially and are read in
+    full on every change, thus the reading time grows with the number of iterations. These full
+    reads are rate limited by min_reread_interval.
+
+    Parameters
+    ----------
+    dumpfile : pathlib.Path or str
+        Path to the dump file written by INCA.
+    parameter_names : List[str]
+        The names of the fitted parameters, in the order used by INCA.
+    alpha : float, optional
+        Significance level of the running confidence intervals. Default is 0.05.
+    dtype : np.dtype or str, optional
+        The dtype of the sample buffer, e.g. np.float32. Default is None (float64).
+    min_reread_interval : float, optional
+        Minimum seconds between two full reads of a v5 dump file, changes within this interval
+        are read by a later poll. If None (default), the interval is ten times the duration of
+        the last full read, which limits the time spent reading the file to about a tenth of the
+        monitoring time.
+    """
+
+    def __init__(
+        self,
+        dumpfile: Union[str, pathlib.Path],
+        parameter_names: List[str],
+        alpha: float = 0.05,
+        dtype=None,
+        min_reread_interval: Optional[float] = None,
+    ):
+        self.dumpfile = pathlib.Path(dumpfile)
+        self.parameter_names = list(parameter_names)
+        self.alpha = alpha
+        self.dtype = dtype
+        self.min_reread_interval = min_reread_interval
+        self._next_full_read = -np.inf
+        self._reset()
+
+    def _reset(self) -> None:
+        self.n_iterations = 0
+        self.summary = MonteCarloSummary(self.parameter_names)
+        self._blocks = []
+        self._samples_array = None
+        self._last_stat = None
+
+    @property
+    def samples_array(self) -> np.ndarray:
+        """All samples read so far, with shape (n_samples, n_parameters), in the same order as
+        INCAMonteCarloResults.samples_array of the dump file."""
+        if self._samples_array is None:
+            if self._blocks:
+                self._samples_array = np.concatenate(self._blocks)
+                self._blocks = [self._samples_array]
+            else:
+                self._samples_array = np.empty((0, len(self.parameter_names)), dtype=self.dtype or float)
+        return self._samples_array
+
+    @property
+    def samples(self) -> pd.DataFrame:
+        """All samples read so far as a data frame with the parameter names as columns."""
+        return pd.DataFrame(self.samples_array, columns=self.parameter_names, copy=False)
+
+    def poll(self) -> Optional[MonteCarloProgress]:
+        """Read the dump file if it has changed since the last call.
+
+        Returns
+        -------
+        MonteCarloProgress or None
+            The progress if new iterations were found, otherwise None. None is also returned if
+            the file does not exist yet or is being written.
+        """
+        try:
+            stat = self.dumpfile.stat()
+        except FileNotFoundError:
+            return None
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        if file_state == self._last_stat:
+            return None
+
+        try:
+            if hdf5_matlab_file.is_hdf5_matlab_file(self.dumpfile):
+                n_iterations, new_samples, ci0 = self._read_hdf5_dump()
+            else:
+                if time.monotonic() < self._next_full_read:
+                    return None
+                n_iterations, new_samples, ci0 = self._read_dump()
+        except (OSError, KeyError, ValueError, MatReadError):
+            # the file is incomplete while MATLAB is writing it, it is read on the next call
+            return None
+        self._last_stat = file_state
+        if n_iterations == self.n_iterations:
+            return None
+
+        new_samples = np.asarray(new_samples, dtype=self.dtype)
+        self.n_iterations = n_iterations
+        self.summary.update(new_samples)
+        self._blocks.append(new_samples)
+        self._samples_array = None
+        return MonteCarloProgress(
+            n_iterations=self.n_iterations,
+            n_samples=self.summary.count,
+            new_samples=new_samples,
+            summary=self.summary,
+            running_ci=self.summary.confidence_intervals(self.alpha),
+            ci=pd.DataFrame(ci0, columns=self.parameter_names, index=["lb", "ub"]),
+        )
+
+    def _first_new_iteration(self, n_iterations: int) -> int:
+        """Return the index of the first iteration that has not been read."""
+        if n_iterations < self.n_iterations:
+            # the dump file belongs to a new Monte Carlo run
+            self._reset()
+        return self.n_iterations
+
+    def _read_hdf5_dump(self) -> Tuple[int, np.ndarray, np.ndarray]:
+        """Read the new iterations from a v7.3 dump file, without reading the old ones."""
+        dump = load_matlab_file.load_matlab_file(self.dumpfile, variable_names=["k", "ci0"], lazy=True)
+        k, ci0 = dump["k"], dump["ci0"]
+        try:
+            if k.ndim == 2:
+                # only one iteration has finished, see INCAMonteCarloResults
+                start = self._first_new_iteration(1)
+                return 1, k[start:], np.asarray(ci0)
+            start = self._first_new_iteration(k.shape[0])
+            return k.shape[0], k[start:].reshape(-1, k.shape[-1]), np.asarray(ci0)
+        finally:
+            k.close()
+
+    def _read_dump(self) -> Tuple[int, np.ndarray, np.ndarray]:
+        """Read a v5 dump file in full and return its new iterations."""
+        start_time = time.monotonic()
+        dump = load_matlab_file.load_matlab_file(self.dumpfile, variable_names=["k", "ci0"])
+        k = np.asarray(dump["k"])
+        ci0 = dump["ci0"]
+        duration = time.monotonic() - start_time
+        min_interval = 10 * duration if self.min_reread_interval is None else self.min_reread_interval
+        self._next_full_read = start_time + duration + min_interval
+        if k.ndim == 2:
+            # only one iteration has finished, see INCAMonteCarloResults
+            k = k[np.newaxis]
+        start = self._first_new_iteration(k.shape[0])
+        return k.shape[0], k[start:].reshape(-1, k.shape[-1]), ci0
+
+    def follow(
+        self,
+        poll_interval: float = 5.0,
+        timeout: Optional[float] = None,
+        callback: Optional[Callable[[MonteCarloProgress], None]] = None,
+    ) -> Iterator[MonteCarloProgress]:
+        """Poll the dump file until the timeout has passed and yield the progress every time new
+        iterations are found. The loop can be stopped at any time by breaking out of it.
+
+        Parameters
+        ----------
+        poll_interval : float, optional
+            Seconds between the checks of the dump file. Default is 5.
+        timeout : float, optional
+            Seconds after which the monitoring stops. If None (default), it runs until the
+            caller stops iterating.
+        callback : Callable, optional
+            Function that is called with every progress before it is yielded.
+
+        Yields
+        ------
+        MonteCarloProgress
+            The progress after each update of the dump file.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            progress = self.poll()
+            if progress is not None:
+                if callback is not None:
+                    callback(progress)
+                yield progress
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                return
+            time.sleep(poll_interval)
+
+
+def follow_monte_carlo_dump(
+    dumpfile: Union[str, pathlib.Path],
+    parameter_names: List[str],
+    poll_interval: float = 5.0,
+    timeout: Optional[float] = None,
+    callback: Optional[Callable[[MonteCarloProgress], None]] = None,
+    alpha: float = 0.05,
+) -> Iterator[MonteCarloProgress]:
+    """Monitor the dump file of a running INCA Monte Carlo sampling, see MonteCarloDumpReader.
+
+    Parameters
+    ----------
+    dumpfile : pathlib.Path or str
+        Path to the dump file written by INCA.
+    parameter_names : List[str]
+        The names of the fitted parameters, e.g. `INCAResults(...).fitdata.fitted_parameters["id"]`.
+    poll_interval : float, optional
+        Seconds between the checks of the dump file. Default is 5.
+    timeout : float, optional
+        Seconds after which the monitoring stops. Default is None (no timeout).
+    callback : Callable, optional
+        Function that is called with every progress.
+    alpha : float, optional
+        Significance level of the running confidence intervals. Default is 0.05.
+
+    Yields
+    ------
+    MonteCarloProgress
+        The progress after each update of the dump file.
+    """
+    reader = MonteCarloDumpReader(dumpfile, parameter_names, alpha=alpha)
+    yield from reader.follow(poll_interval=poll_interval, timeout=timeout, callback=callback)
+
+
+__all__ = ["MonteCarloDumpReader", "MonteCarloProgress", "follow_monte_carlo_dump"]
@@ -0,0 +1,313 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class SampleMoments:
+    """Running mean and covariance of multivariate samples. The samples are added block by block,
+    and the moments of two objects can be merged, e.g. to combine several Monte Carlo files. The
+    blocks are combined with the pairwise update of Chan et al., which is the block version of
+    Welford's algorithm and does not suffer from the cancellation of the naive sum of squares.
+    Samples with a NaN value in any parameter are ignored, like in QuantileSketch.
+
+    Parameters
+    ----------
+    n_parameters : int
+        Number of columns of the samples.
+    """
+
+    n_parameters: int
+    count: int = 0
+    mean: np.ndarray = field(default=None, repr=False)
+    comoment: np.ndarray = field(default=None, repr=False)
+    """Sum of the outer products of the deviations from the mean."""
+
+    def __post_init__(self):
+        if self.mean is None:
+            self.mean = np.zeros(self.n_parameters)
+        if self.comoment is None:
+            self.comoment = np.zeros((self.n_parameters, self.n_parameters))
+
+    def update(self, block: np.ndarray) -> "SampleMoments":
+        """Add a block of samples with shape (n_samples, n_parameters). Samples with NaN
+        values are ignored.
+
+        Returns
+        -------
+        SampleMoments
+            The updated object itself.
+        """
+        block = np.asarray(block, dtype=float)
+        block = block[~np.isnan(block).any(axis=1)]
+        if len(block) == 0:
+            return self
+        block_mean = block.mean(axis=0)
+        deviations = block - block_mean
+        self._combine(len(block), block_mean, deviations.T @ deviations)
+        return self
+
+    def merge(self, other: "SampleMoments") -> "SampleMoments":
+        """Return the moments of the samples of both objects."""
+        merged = SampleMoments(self.n_parameters, self.count, self.mean.copy(), self.comoment.copy())
+        merged._combine(other.count, other.mean, other.comoment)
+        return merged
+
+    def _combine(self, count: int, mean: np.ndarray, comoment: np.ndarray) -> None:
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.comoment = self.comoment + comoment + np.outer(delta, delta) * (self.count * count / total)
+        self.count = total
+
+    @property
+    def covariance(self) -> np.ndarray:
+        """Sample covariance matrix (with n - 1 in the denominator)."""
+        if self.count < 2:
+            return np.full_like(self.comoment, np.nan)
+        return self.comoment / (self.count - 1)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Sample variance of each parameter (with n - 1 in the denominator)."""
+        return np.diag(self.covariance).copy()
+
+
+@dataclass
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy guarantees, following the DDSketch
+    algorithm (Masson et al., 2019). Values are counted in logarithmically spaced buckets, thus a
+    quantile is returned with a relative error of at most relative_accuracy, while the memory
+    grows with the logarithm of the range of the values and not with the number of values.
+    Values with an absolute value below min_value are counted as zero, and NaN values are
+    ignored, like in SampleMoments.
+
+    Parameters
+    ----------
+    relative_accuracy : float, optional
+        Maximum relative error of the quantiles. Default is 0.01.
+    min_value : float, optional
+        Smallest absolute value that is distinguished from zero. Default is 1e-12.
+    """
+
+    relative_accuracy: float = 0.01
+    min_value: float = 1e-12
+    count: int = 0
+    zero_count: int = 0
+    positive: Dict[int, int] = field(default_factory=dict, repr=False)
+    negative: Dict[int, int] = field(default_factory=dict, repr=False)
+    min: float = math.inf
+    max: float = -math.inf
+
+    def __post_init__(self):
+        self._gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+    def update(self, values: Iterable[float]) -> "QuantileSketch":
+        """Add values to the sketch. NaN values are ignored.
+
+        Returns
+        -------
+        QuantileSketch
+            The updated object itself.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        magnitudes = np.abs(values)
+        is_zero = magnitudes < self.min_value
+        self.zero_count += int(is_zero.sum())
+        for store, selection in ((self.positive, values > 0), (self.negative, values < 0)):
+            selection &= ~is_zero
+            if not selection.any():
+                continue
+            keys = np.ceil(np.log(magnitudes[selection]) / self._log_gamma).astype(np.int64)
+            unique_keys, counts = np.unique(keys, return_counts=True)
+            for key, count in zip(unique_keys.tolist(), counts.tolist()):
+                store[key] = store.get(key, 0) + count
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Return a sketch of the values of both sketches. The sketches must have the same
+        relative accuracy and the same min_value."""
+        if not math.isclose(self.relative_accuracy, other.relative_accuracy):
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        if not math.isclose(self.min_value, other.min_value):
+            raise ValueError("Only sketches with the same min_value can be merged")
+        merged = QuantileSketch(
+            self.relative_accuracy,
+            self.min_value,
+            self.count + other.count,
+            self.zero_count + other.zero_count,
+            dict(self.positive),
+            dict(self.negative),
+            min(self.min, other.min),
+            max(self.max, other.max),
+        )
+        for store, other_store in ((merged.positive, other.positive), (merged.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        return merged
+
+    def quantile(self, q: float) -> float:
+        """Return the estimated q-quantile (0 <= q <= 1) of the added values."""
+        if self.count == 0:
+            return np.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(-self._bucket_value(key), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self._bucket_value(key), self.max)
+        return self.max
+
+    def _bucket_value(self, key: int) -> float:
+        return 2 * self._gamma**key / (self._gamma + 1)
+
+
+@dataclass
+class MonteCarloSummary:
+    """Streaming summary of Monte Carlo samples: mean, variance, covariance and quantiles of
+    each parameter. The samples are added block by block through `update`, thus the memory use is
+    independent of the number of samples. Summaries of several Monte Carlo files with the same
+    parameters can be combined with `merge`. Samples with a NaN value in any parameter are
+    ignored by all statistics, thus count is the number of complete samples.
+
+    Parameters
+    ----------
+    parameter_names : List[str]
+        Names of the parameters, i.e. the columns of the sample blocks.
+    relative_accuracy : float, optional
+        Relative accuracy of the quantile sketches. Default is 0.01.
+    """
+
+    parameter_names: List[str]
+    relative_accuracy: float = 0.01
+    moments: Optional[SampleMoments] = field(default=None, repr=False)
+    sketches: Optional[List[QuantileSketch]] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.parameter_names = list(self.parameter_names)
+        if self.moments is None:
+            self.moments = SampleMoments(len(self.parameter_names))
+        if self.sketches is None:
+            self.sketches = [QuantileSketch(self.relative_accuracy) for _ in self.parameter_names]
+
+    @property
+    def count(self) -> int:
+        """Number of samples added to the summary, without the samples with NaN values."""
+        return self.moments.count
+
+    def update(self, block: np.ndarray) -> "MonteCarloSummary":
+        """Add a block of samples with shape (n_samples, n_parameters). Samples with NaN
+        values are ignored.
+
+        Returns
+        -------
+        MonteCarloSummary
+            The updated object itself.
+        """
+        block = np.asarray(block, dtype=float)
+        if block.ndim != 2 or block.shape[1] != len(self.parameter_names):
+            raise ValueError(
+                f"Expected a block with {len(self.parameter_names)} columns, got shape {block.shape}"
+            )
+        # drop incomplete samples here, such that the sketches count the same samples as the moments
+        block = block[~np.isnan(block).any(axis=1)]
+        self.moments.update(block)
+        for sketch, column in zip(self.sketches, block.T):
+            sketch.update(column)
+        return self
+
+    def merge(self, other: "MonteCarloSummary") -> "MonteCarloSummary":
+        """Return the summary of the samples of both summaries."""
+        if self.parameter_names != other.parameter_names:
+            raise ValueError("Only summaries of the same parameters can be merged")
+        return MonteCarloSummary(
+            self.parameter_names,
+            self.relative_accuracy,
+            self.moments.merge(other.moments),
+            [sketch.merge(other_sketch) for sketch, other_sketch in zip(self.sketches, other.sketches)],
+        )
+
+    @property
+    def mean(self) -> pd.Series:
+        """Mean of each parameter."""
+        return pd.Series(self.moments.mean, index=self.parameter_names, name="mean")
+
+    @property
+    def variance(self) -> pd.Series:
+        """Sample variance of each parameter."""
+        return pd.Series(self.moments.variance, index=self.parameter_names, name="variance")
+
+    @property
+    def std(self) -> pd.Series:
+        """Sample standard deviation of each parameter."""
+        return pd.Series(np.sqrt(self.moments.variance), index=self.parameter_names, name="std")
+
+    @property
+    def covariance(self) -> pd.DataFrame:
+        """Sample covariance matrix of the parameters."""
+        return pd.DataFrame(
+            self.moments.covariance, index=self.parameter_names, columns=self.parameter_names
+        )
+
+    def quantiles(self, q: Sequence[float]) -> pd.DataFrame:
+        """Estimate quantiles of each parameter.
+
+        Parameters
+        ----------
+        q : Sequence[float]
+            The quantiles to estimate, between 0 and 1.
+
+        Returns
+        -------
+        pd.DataFrame
+            Data frame with the quantiles as index and the parameters as columns.
+        """
+        return pd.DataFrame(
+            [[sketch.quantile(quantile) for sketch in self.sketches] for quantile in q],
+            index=pd.Index(q, name="quantile"),
+            columns=self.parameter_names,
+        )
+
+    def confidence_intervals(self, alpha: float = 0.05) -> pd.DataFrame:
+        """Percentile confidence intervals of the parameters.
+
+        Parameters
+        ----------
+        alpha : float, optional
+            Significance level, the interval covers the (1 - alpha) central part of the samples.
+            Default is 0.05.
+
+        Returns
+        -------
+        pd.DataFrame
+            Data frame with the index ["lb", "ub"] and the parameters as columns, like
+            INCAMonteCarloResults.ci.
+        """
+        ci = self.quantiles([alpha / 2, 1 - alpha / 2])
+        ci.index = ["lb", "ub"]
+        return ci
+
+
+__all__ = ["SampleMoments", "QuantileSketch", "MonteCarloSummary"]
@@ -0,0 +1,219 @@
+import pathlib
+import re
+import shutil
+from typing import List, Optional, Sequence, Union
+from warnings import warn
+import numpy as np
+import pandas as pd
+from incawrapper.core.INCAScript import INCAScript
+from incawrapper.core.INCAFitData import INCAFitData
+from incawrapper.core.matlab_file_cache import MatlabFileCache
+from incawrapper.core.matlab_engine_pool import MatlabEnginePool
+from incawrapper.core.inca_backends import INCABackend
+from incawrapper.core.result_cache import RunResultCache
+from incawrapper.core.run_inca import run_inca_batch
+
+_FILENAME_PATTERN = re.compile(r"^filename = '.*';$", re.MULTILINE)
+
+
+def shard_fit_starts(
+    inca_script: INCAScript,
+    fit_starts: int,
+    n_shards: int,
+    seed: int = 0,
+) -> List[INCAScript]:
+    """Split the restarts of a flux estimation into several scripts that can be run in parallel.
+    Each shard runs its own part of the fit_starts restarts with its own seed of the MATLAB
+    random number generator, such that the shards start from different initial guesses. The
+    shards save their results next to the output file of the script, e.g. `output_start0.mat`.
+
+    Parameters
+    ----------
+    inca_script : INCAScript
+        The script to split. The runner block must be defined with define_runner with
+        run_estimate=True and run_montecarlo=False.
+    fit_starts : int
+        The total number of restarts of the estimation.
+    n_shards : int
+        The number of scripts. At most fit_starts scripts are created.
+    seed : int, optional
+        Seed from which the seeds of the shards are derived, by default 0.
+
+    Returns
+    -------
+    List[INCAScript]
+        The scripts of the shards.
+
+    Raises
+    ------
+    ValueError
+        If the script does not save an estimate without Monte Carlo results.
+    """
+    if fit_starts < 1 or n_shards < 1:
+        raise ValueError("fit_starts and n_shards must be at least 1")
+    output_files = inca_script.output_files
+    if "filename" not in output_files or "f = estimate(m);" not in inca_script.blocks["runner"]:
+        raise ValueError("The script must run an estimate and save it, see define_runner.")
+    if "mc_filename" in output_files:
+        raise ValueError("Monte Carlo analysis cannot be split in shards, use run_montecarlo=False.")
+
+    output_file = output_files["filename"]
+    n_shards = min(n_shards, fit_starts)
+    budgets = np.full(n_shards, fit_starts // n_shards)
+    budgets[: fit_starts % n_shards] += 1
+    shard_seeds = [
+        int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(n_shards)
+    ]
+
+    shards = []
+    for idx, (n_starts, shard_seed) in enumerate(zip(budgets, shard_seeds)):
+        shard = inca_script.copy()
+        shard.add_to_block("options", f"m.options.fit_starts = {n_starts};\nrng({shard_seed});\n")
+        shard_output_file = output_file.with_name(f"{output_file.stem}_start{idx}.mat")
+        shard.blocks["runner"] = _FILENAME_PATTERN.sub(
+            lambda _: f"filename = '{shard_output_file}';", shard.blocks["runner"]
+        )
+        shards.append(shard)
+    return shards
+
+
+def merge_fits(
+    result_files: Sequence[Union[str, pathlib.Path]],
+    output_file: Optional[Union[str, pathlib.Path]] = None,
+) -> INCAFitData:
+    """Merge the estimates of several runs of the same model, e.g. the shards created by
+    shard_fit_starts. The fit with the minimal chi2 is selected, and the vals column of its
+    fitted parameters is replaced by the values of the restarts of all runs.
+
+    Parameters
+    ----------
+    result_files : Sequence[Union[str, pathlib.Path]]
+        The .mat files with the estimates.
+    output_file : Union[str, pathlib.Path], optional
+        If given, the .mat file of the best fit is copied to this file. By default None.
+
+    Returns
+    -------
+    INCAFitData
+        The best fit with the merged vals column. The merged fitted parameters are only held in
+        memory, the .mat file contains the vals of the best fit.
+
+    Raises
+    ------
+    ValueError
+        If the runs have different parameters.
+    """
+    if len(result_files) == 0:
+        raise ValueError("At least one result file is required")
+    fits = [INCAFitData(pathlib.Path(result_file)) for result_file in result_files]
+    best = int(np.argmin([float(fit.chi2) for fit in fits]))
+    parameters = fits[best].fitted_parameters.copy()
+    for result_file, fit in zip(result_files, fits):
+        if fit.fitted_parameters["id"].tolist() != parameters["id"].tolist():
+            raise ValueError(f"The parameters of {result_file} differ from the best fit")
+    parameters["vals"] = pd.Series(
+        [
+            np.concatenate([_restart_values(fit.fitted_parameters["vals"].iat[row]) for fit in fits])
+            for row in range(len(parameters))
+        ],
+        index=parameters.index,
+        dtype=object,
+    )
+
+    best_file = pathlib.Path(result_files[best])
+    if output_file is not None:
+        best_file = pathlib.Path(output_file)
+        shutil.copyfile(result_files[best], best_file)
+    matlab_file_cache = MatlabFileCache(best_file)
+    matlab_file_cache.get_derived("fitdata.fitted_parameters", lambda: parameters)
+    return INCAFitData(best_file, matlab_file_cache)
+
+
+def _restart_values(vals) -> np.ndarray:
+    """Return the values of the restarts of a parameter as a vector. A parameter without
+    values is parsed as NaN."""
+    if np.ndim(vals) == 0 and pd.isna(vals):
+        return np.empty(0)
+    return np.atleast_1d(np.asarray(vals, dtype=float))
+
+
+def run_inca_multistart(
+    inca_script: INCAScript,
+    INCA_base_directory: pathlib.Path,
+    fit_starts: int,
+    n_shards: int,
+    n_workers: Optional[int] = None,
+    seed: int = 0,
+    engine_pool: Optional[MatlabEnginePool] = None,
+    result_cache: Optional[Union[pathlib.Path, str, RunResultCache]] = None,
+    inca_version: Optional[str] = None,
+    backend: Optional[INCABackend] = None,
+) -> INCAFitData:
+    """Run a flux estimation with many restarts in parallel. The restarts are split into
+    n_shards scripts with shard_fit_starts, the scripts are run with run_inca_batch and the
+    estimates are merged with merge_fits. The best fit is saved to the output file of the
+    script.
+
+    The restarts of an estimation are independent, thus the wall time of an estimation with
+    many restarts decreases with the number of workers, e.g. the number of available MATLAB
+    licenses or cores.
+
+    Parameters
+    ----------
+    inca_script : INCAScript
+        The script to run, see shard_fit_starts.
+    INCA_base_directory : pathlib.Path
+        The path to the INCA base directory, i.e. the directory that contains the INCA executable.
+    fit_starts : int
+        The total number of restarts of the estimation.
+    n_shards : int
+        The number of scripts the restarts are split into.
+    n_workers : int, optional
+        The number of scripts run at the same time, by default n_shards.
+    seed : int, optional
+        Seed from which the seeds of the shards are derived, by default 0.
+    engine_pool, result_cache, inca_version, backend
+        See run_inca_batch. backend cannot be combined with engine_pool.
+
+    Returns
+    -------
+    INCAFitData
+        The best fit with the values of all restarts in the vals column of fitted_parameters.
+
+    Raises
+    ------
+    ValueError
+        If both backend and engine_pool are given, or if the script cannot be split, see
+        shard_fit_starts.
+    RuntimeError
+        If all shards failed. If only some shards failed, a warning is issued and the fits of
+        the other shards are merged.
+    """
+    if backend is not None and engine_pool is not None:
+        raise ValueError(
+            "backend cannot be combined with engine_pool, the engine pool is only used by the "
+            "default backend. Use EngineINCABackend(engine_pool) as backend instead."
+        )
+    # only the argument that is set is passed on, the other one keeps its default
+    engines = {"backend": backend} if backend is not None else {"engine_pool": engine_pool}
+    shards = shard_fit_starts(inca_script, fit_starts, n_shards, seed)
+    results = run_inca_batch(
+        shards,
+        INCA_base_directory,
+        n_workers=n_workers or len(shards),
+        result_cache=result_cache,
+        inca_version=inca_version,
+        **engines,
+    )
+    failed = [idx for idx, result in enumerate(results) if not result.succeeded]
+    if len(failed) == len(results):
+        raise RuntimeError("All shards of the estimation failed") from results[0].error
+    if failed:
+        warn(f"The shards {failed} of the estimation failed, their restarts are not included.")
+    return merge_fits(
+        [result.output_files["filename"] for result in results if result.succeeded],
+        output_file=inca_script.output_files["filename"],
+    )
+
+
+__all__ = ["shard_fit_starts", "merge_fits", "run_inca_multistart"]
@@ -0,0 +1,114 @@
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+from typing import Dict, Optional, Union
+from incawrapper.core.INCAScript import INCAScript
+
+_MANIFEST = "manifest.json"
+
+
+class RunResultCache:
+    """Cache of the result files of INCA runs, keyed by the content hash of the INCA script (see
+    INCAScript.content_hash) and the INCA version. A script that has already been run with the
+    same INCA version does not have to be run again, the cached result files are copied to the
+    output files of the script instead.
+
+    Each entry is a subdirectory with the result files and a manifest. The manifest is written
+    after the result files, thus an entry without manifest, e.g. from an interrupted run, is not
+    used.
+
+    Parameters
+    ----------
+    directory : pathlib.Path or str
+        The cache directory, it is created if it does not exist.
+    inca_version : str
+        The INCA version that the results are computed with. Results of different INCA versions
+        are kept apart.
+    """
+
+    def __init__(self, directory: Union[str, pathlib.Path], inca_version: str):
+        self.directory = pathlib.Path(directory)
+        self.inca_version = str(inca_version)
+
+    def entry_directory(self, inca_script: INCAScript) -> pathlib.Path:
+        """Return the cache directory of a script."""
+        version = "".join(c if c.isalnum() or c in "._-" else "_" for c in self.inca_version)
+        return self.directory / f"{inca_script.content_hash()}-{version}"
+
+    def lookup(self, inca_script: INCAScript) -> Optional[Dict[str, pathlib.Path]]:
+        """Return the cached result files of a script, or None if the script has no complete
+        entry in the cache. The keys are the names of the output files in the script, see
+        INCAScript.output_files."""
+        entry = self.entry_directory(inca_script)
+        try:
+            manifest = json.loads((entry / _MANIFEST).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        files = {name: entry / filename for name, filename in manifest["files"].items()}
+        if not all(path.is_file() for path in files.values()):
+            return None
+        return files
+
+    def restore(self, inca_script: INCAScript) -> bool:
+        """Copy the cached result files of a script to the output files of the script.
+
+        Returns
+        -------
+        bool
+            True if the script had a complete entry in the cache, otherwise False.
+        """
+        cached_files = self.lookup(inca_script)
+        output_files = inca_script.output_files
+        if cached_files is None or set(cached_files) != set(output_files):
+            return False
+        for name, cached_file in cached_files.items():
+            _atomic_copy(cached_file, output_files[name])
+        return True
+
+    def store(self, inca_script: INCAScript) -> Optional[pathlib.Path]:
+        """Copy the output files of a script that has been run into the cache. Nothing is
+        stored if the script has no output files or if one of them does not exist, e.g. because
+        the run failed.
+
+        Returns
+        -------
+        pathlib.Path or None
+            The entry directory, or None if nothing was stored.
+        """
+        output_files = inca_script.output_files
+        if not output_files or not all(path.is_file() for path in output_files.values()):
+            return None
+        entry = self.entry_directory(inca_script)
+        entry.mkdir(parents=True, exist_ok=True)
+        for name, output_file in output_files.items():
+            _atomic_copy(output_file, entry / f"{name}.mat")
+        manifest = {
+            "inca_version": self.inca_version,
+            "files": {name: f"{name}.mat" for name in output_files},
+        }
+        _atomic_write_text(entry / _MANIFEST, json.dumps(manifest, indent=2))
+        return entry
+
+
+def _atomic_copy(source: pathlib.Path, destination: pathlib.Path) -> None:
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=destination.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, destination)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _atomic_write_text(destination: pathlib.Path, text: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=destination.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, destination)
+
+
+__all__ = ["RunResultCache"]
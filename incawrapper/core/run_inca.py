@@ -1,17 +1,22 @@
+import contextlib
+import importlib.util
 import pathlib
 import time
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Union
 from incawrapper.core.INCAScript import INCAScript
+from incawrapper.core.result_cache import RunResultCache
+from incawrapper.core.matlab_engine_pool import EngineBackend, MatlabEnginePool
+from incawrapper.core.inca_backends import EngineINCABackend, INCABackend
 from warnings import warn
 
-# The run_inca module requires the matlabengine package. This package 
-# requires a matlab installation. The following try-except block will
+# The default backend of the run_inca module requires the matlabengine package.
+# This package requires a matlab installation. The following check
 # allows users to use the incawrapper package without matlab installed.
-try:
-    import matlab.engine
-    MATLAB_AVAILABLE = True
-except ImportError:
-    MATLAB_AVAILABLE = False
+MATLAB_AVAILABLE = importlib.util.find_spec("matlab") is not None
+if not MATLAB_AVAILABLE:
     warn(
         "Could not import run_inca module. This is not a problem if you "
         "do not want to run INCA scripts from python. However, if you "
@@ -25,6 +30,10 @@ def run_inca(
     inca_script: INCAScript,
     INCA_base_directory: pathlib.Path,
     execution_directory: pathlib.Path = None,
+    result_cache: Optional[Union[pathlib.Path, str, RunResultCache]] = None,
+    inca_version: Optional[str] = None,
+    engine_pool: Optional[MatlabEnginePool] = None,
+    backend: Optional[INCABackend] = None,
 ) -> None:
     """Run INCA with a given INCA script in either a temporary directory or a specified directory.
     
@@ -37,54 +46,299 @@ def run_inca(
     exercution_directory : pathlib.Path, optional
         The path to the directory where the INCA script will be run. If None, the script will be run in a temporary directory, by default None.
         If a directory is specified, the INCA script along with other output files (e.g. montecarlo dump.mat) will be saved in the directory.
+    result_cache : Union[pathlib.Path, str, RunResultCache], optional
+        Directory of a cache of results, by default None (no cache). If a script with the same
+        content (see INCAScript.content_hash) has been run before with the same INCA version, the
+        cached results are copied to the output files of the script and INCA is not started.
+        Otherwise INCA is run and the results are added to the cache.
+    inca_version : str, optional
+        The INCA version used to key the result cache. By default the name of the INCA base
+        directory is used, e.g. "INCAv2.2".
+    engine_pool : MatlabEnginePool, optional
+        Pool of MATLAB engines with INCA loaded, by default None. If given, the script is run
+        in an engine of the pool instead of a new MATLAB engine, which saves the start of MATLAB
+        and INCA for every script. The INCA base directory of the pool is used.
+    backend : INCABackend, optional
+        The backend that executes the script, by default None (a MATLAB engine, see
+        EngineINCABackend). Use SubprocessINCABackend to run the script in a `matlab -batch`
+        process, or FakeINCABackend to use canned results without MATLAB. Cannot be combined
+        with engine_pool, use EngineINCABackend(engine_pool) to run in the engines of a pool.
     
     Returns
     -------
-    None"""
-
-    if MATLAB_AVAILABLE:
-        # Check if the INCA base directory is a pathlib.Path object
-        if type(INCA_base_directory) is not pathlib.Path:
-            INCA_base_directory = pathlib.Path(INCA_base_directory)
-
-        if execution_directory is None:
-            # Run the INCA script in a temporary directory
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_dir = pathlib.Path(temp_dir)
-                _exercute_inca(inca_script, INCA_base_directory, temp_dir)
-        else:
-            # Check if the exercution directory is a pathlib.Path object
-            if type(execution_directory) is not pathlib.Path:
-                execution_directory = pathlib.Path(execution_directory)
-            
-            # Run the INCA script in the specified directory
-            _exercute_inca(inca_script, INCA_base_directory, execution_directory)
-    else:
+    None
+
+    Raises
+    ------
+    ValueError
+        If both backend and engine_pool are given."""
+
+    _check_backend_arguments(backend, engine_pool)
+    # Check if the INCA base directory is a pathlib.Path object
+    if type(INCA_base_directory) is not pathlib.Path:
+        INCA_base_directory = pathlib.Path(INCA_base_directory)
+
+    if result_cache is not None and not isinstance(result_cache, RunResultCache):
+        result_cache = RunResultCache(
+            result_cache, inca_version or INCA_base_directory.resolve().name
+        )
+    if result_cache is not None and result_cache.restore(inca_script):
+        print(f"Results restored from cache {result_cache.entry_directory(inca_script)}.")
+        return
+
+    backend = _default_backend(backend, engine_pool)
+    with _execution_directory(execution_directory) as dir:
+        script_file = dir / "inca_script.m"
+        inca_script.save_script(script_file)
+        print(f"INCA script saved to {script_file}.")
+
+        start_time = time.time()
+        backend.run(inca_script, script_file, INCA_base_directory)
+        print("--- %s seconds -" % (time.time() - start_time))
+
+    if result_cache is not None:
+        result_cache.store(inca_script)
+
+
+def _check_backend_arguments(
+    backend: Optional[INCABackend],
+    engine_pool: Optional[MatlabEnginePool],
+    engine_backend: Optional[EngineBackend] = None,
+) -> None:
+    """Raise a ValueError for arguments that would be ignored: the engine pool and the engine
+    backend are only used by the default backend, and the engine backend only starts the engines
+    of a new pool."""
+    if backend is not None and (engine_pool is not None or engine_backend is not None):
+        raise ValueError(
+            "backend cannot be combined with engine_pool or engine_backend, these are only used "
+            "by the default backend. Use EngineINCABackend(engine_pool) as backend instead."
+        )
+    if engine_pool is not None and engine_backend is not None:
+        raise ValueError(
+            "engine_backend is only used to start the engines of a new pool, it cannot be "
+            "combined with engine_pool. Pass the backend to MatlabEnginePool instead."
+        )
+
+
+def _default_backend(
+    backend: Optional[INCABackend], engine_pool: Optional[MatlabEnginePool]
+) -> INCABackend:
+    """Return the backend to run a script with, by default a MATLAB engine."""
+    if backend is not None:
+        return backend
+    if engine_pool is None and not MATLAB_AVAILABLE:
         raise ImportError(
             "The matlabengine package is not installed. This is required to run INCA "
-            "from python."
+            "from python. Use SubprocessINCABackend to run INCA without the matlabengine package."
         )
+    return EngineINCABackend(engine_pool)
+
+
+@contextlib.contextmanager
+def _execution_directory(execution_directory: Optional[pathlib.Path]) -> Iterator[pathlib.Path]:
+    """Provide the directory to run a script in, a temporary directory if None is given."""
+    if execution_directory is None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield pathlib.Path(temp_dir)
+    else:
+        yield pathlib.Path(execution_directory)
+
+
+async def run_inca_async(
+    inca_script: INCAScript,
+    INCA_base_directory: pathlib.Path,
+    execution_directory: pathlib.Path = None,
+    result_cache: Optional[Union[pathlib.Path, str, RunResultCache]] = None,
+    inca_version: Optional[str] = None,
+    engine_pool: Optional[MatlabEnginePool] = None,
+    timeout: Optional[float] = None,
+    poll_interval: float = 0.5,
+    backend: Optional[INCABackend] = None,
+) -> None:
+    """Asynchronous version of run_inca for use with asyncio. The coroutine waits for the script
+    without blocking the event loop. With the default backend, the script is started with the
+    background execution of the MATLAB engine. If the coroutine is cancelled or the timeout is
+    reached, the MATLAB execution is cancelled as well and the engine is shut down.
+
+    Parameters
+    ----------
+    inca_script : INCAScript
+        The INCA script to run.
+    INCA_base_directory : pathlib.Path
+        The path to the INCA base directory, i.e. the directory that contains the INCA executable.
+    execution_directory : pathlib.Path, optional
+        The directory where the INCA script is run, by default None (a temporary directory).
+    result_cache : Union[pathlib.Path, str, RunResultCache], optional
+        Directory of a cache of results, see run_inca. By default None (no cache).
+    inca_version : str, optional
+        The INCA version used to key the result cache, see run_inca.
+    engine_pool : MatlabEnginePool, optional
+        Pool of MATLAB engines to run the script in, by default None. If None, a new engine is
+        started for the script. Waiting for an engine of the pool does not block the event loop.
+    timeout : float, optional
+        Maximum number of seconds the script is allowed to run, by default None (no limit).
+    poll_interval : float, optional
+        Seconds between checks of whether the script has finished, by default 0.5.
+    backend : INCABackend, optional
+        The backend that executes the script, see run_inca. Cannot be combined with
+        engine_pool.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    asyncio.TimeoutError
+        If the script did not finish within the timeout.
+    ValueError
+        If both backend and engine_pool are given.
+    """
+    _check_backend_arguments(backend, engine_pool)
+    if type(INCA_base_directory) is not pathlib.Path:
+        INCA_base_directory = pathlib.Path(INCA_base_directory)
+
+    if result_cache is not None and not isinstance(result_cache, RunResultCache):
+        result_cache = RunResultCache(
+            result_cache, inca_version or INCA_base_directory.resolve().name
+        )
+    if result_cache is not None and result_cache.restore(inca_script):
+        print(f"Results restored from cache {result_cache.entry_directory(inca_script)}.")
+        return
+
+    backend = _default_backend(backend, engine_pool)
+    with _execution_directory(execution_directory) as dir:
+        script_file = dir / "inca_script.m"
+        inca_script.save_script(script_file)
+        await backend.run_async(inca_script, script_file, INCA_base_directory, timeout, poll_interval)
+
+    if result_cache is not None:
+        result_cache.store(inca_script)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of running one script with run_inca_batch.
+
+    Attributes
+    ----------
+    inca_script : INCAScript
+        The script that was run.
+    output_files : Dict[str, pathlib.Path]
+        The output files of the script, see INCAScript.output_files.
+    error : BaseException or None
+        The exception raised while running the script, None if the run succeeded.
+    duration : float
+        The wall time of the run in seconds, including the time waiting for an engine.
+    """
+
+    inca_script: INCAScript
+    output_files: Dict[str, pathlib.Path]
+    error: Optional[BaseException] = None
+    duration: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        """True if the script was run without errors."""
+        return self.error is None
+
+
+def run_inca_batch(
+    inca_scripts: Sequence[INCAScript],
+    INCA_base_directory: pathlib.Path,
+    n_workers: int = 1,
+    engine_pool: Optional[MatlabEnginePool] = None,
+    result_cache: Optional[Union[pathlib.Path, str, RunResultCache]] = None,
+    inca_version: Optional[str] = None,
+    engine_backend: Optional[EngineBackend] = None,
+    backend: Optional[INCABackend] = None,
+) -> List[BatchResult]:
+    """Run many INCA scripts concurrently. Each worker thread runs one script at a time in its
+    own temporary execution directory, by default in its own MATLAB engine. A failing script does not stop
+    the other scripts, the errors are returned in the results.
+
+    Parameters
+    ----------
+    inca_scripts : Sequence[INCAScript]
+        The scripts to run. The scripts must save their results to different output files.
+    INCA_base_directory : pathlib.Path
+        The path to the INCA base directory, i.e. the directory that contains the INCA executable.
+    n_workers : int, optional
+        The number of scripts run at the same time, by default 1. Each worker uses one MATLAB
+        engine, thus limit this to the number of available MATLAB licenses.
+    engine_pool : MatlabEnginePool, optional
+        The engines to run the scripts in, by default None. If None, a pool with n_workers
+        engines is created and closed when all scripts are done. The number of scripts run at
+        the same time is limited by the size of the pool as well.
+    result_cache : Union[pathlib.Path, str, RunResultCache], optional
+        Directory of a cache of results, see run_inca. By default None (no cache).
+    inca_version : str, optional
+        The INCA version used to key the result cache, see run_inca.
+    engine_backend : EngineBackend, optional
+        The backend used to start the engines of the pool that is created if engine_pool is
+        None. Default is MatlabEngineBackend. Cannot be combined with engine_pool.
+    backend : INCABackend, optional
+        The backend that executes the scripts, see run_inca. By default None (the MATLAB
+        engines of the engine pool). Cannot be combined with engine_pool or engine_backend.
+
+    Returns
+    -------
+    List[BatchResult]
+        The result of each script, in the same order as inca_scripts.
+
+    Raises
+    ------
+    ValueError
+        If two scripts save their results to the same file, or if backend, engine_pool and
+        engine_backend are combined.
+    """
+    if n_workers < 1:
+        raise ValueError("n_workers must be at least 1")
+    _check_backend_arguments(backend, engine_pool, engine_backend)
+    output_files = [inca_script.output_files for inca_script in inca_scripts]
+    seen = {}
+    for idx, files in enumerate(output_files):
+        for path in files.values():
+            path = path.resolve()
+            if path in seen:
+                raise ValueError(
+                    f"Scripts {seen[path]} and {idx} both save their results to {path}. Use "
+                    "different output files in define_runner."
+                )
+            seen[path] = idx
+
+    if type(INCA_base_directory) is not pathlib.Path:
+        INCA_base_directory = pathlib.Path(INCA_base_directory)
+    if result_cache is not None and not isinstance(result_cache, RunResultCache):
+        result_cache = RunResultCache(
+            result_cache, inca_version or INCA_base_directory.resolve().name
+        )
+
+    own_pool = backend is None and engine_pool is None
+    if backend is None:
+        engine_pool = engine_pool or MatlabEnginePool(
+            INCA_base_directory, size=n_workers, backend=engine_backend
+        )
+        backend = EngineINCABackend(engine_pool)
+
+    def run(idx: int, backend: INCABackend) -> BatchResult:
+        start_time = time.time()
+        try:
+            run_inca(
+                inca_scripts[idx], INCA_base_directory, result_cache=result_cache, backend=backend
+            )
+            error = None
+        except Exception as e:
+            error = e
+        return BatchResult(inca_scripts[idx], output_files[idx], error, time.time() - start_time)
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(run, idx, backend) for idx in range(len(inca_scripts))]
+            return [future.result() for future in futures]
+    finally:
+        if own_pool:
+            engine_pool.close()
+
 
-def _exercute_inca(inca_script: INCAScript, INCA_base_directory:pathlib.Path, dir: pathlib.Path):
-    """Run INCA with a given INCA script in a specified directory. This function is not intended to be called directly, 
-    but rather through the run_inca function."""
-
-    # Write the INCA script to a file
-    script_filename = "inca_script.m"
-    inca_script.save_script(dir / script_filename)
-    print(f"INCA script saved to {dir / script_filename}.")
-
-    # Run the INCA script
-    start_time = time.time()
-    print("Starting MATLAB engine...")
-    eng = matlab.engine.start_matlab()
-    eng.cd(str(INCA_base_directory.resolve()), nargout=0)
-    eng.startup(nargout=0)
-    eng.setpath(nargout=0)
-    eng.cd(str(dir.resolve()), nargout=0)
-    _f = getattr(eng, str(script_filename.replace(".m", "")))
-    _f(nargout=0)
-    eng.quit()
-    print("--- %s seconds -" % (time.time() - start_time))
-
-__all__ = ["run_inca"]
\ No newline at end of file
+__all__ = ["run_inca", "run_inca_async", "run_inca_batch", "BatchResult"]
\ No newline at end of file
@@ -0,0 +1,64 @@
+import pathlib
+from typing import List, Union
+import numpy as np
+import scipy.io
+
+
+class ScriptDataSidecar:
+    """Collects the numeric data of an INCA script, e.g. the MS measurements, and writes it to a
+    .mat file next to the script instead of writing the numbers as text in the script. The
+    script loads the file once and refers to the arrays by their index. This makes the script
+    smaller and saves MATLAB from parsing the numbers, which matters for datasets with many
+    fragments, replicates and time points.
+
+    Parameters
+    ----------
+    filename : pathlib.Path or str
+        The .mat file the data is written to. The absolute path is written in the script.
+    variable_name : str, optional
+        Name of the matlab variable the data is loaded into. Default is "incawrapper_data".
+
+    Examples
+    --------
+    >>> sidecar = ScriptDataSidecar("data.mat")
+    >>> script = sidecar.load_statement() + "x = " + sidecar.add(np.array([1.0, 2.0])) + ";\\n"
+    >>> sidecar.save()
+    """
+
+    def __init__(self, filename: Union[str, pathlib.Path], variable_name: str = "incawrapper_data"):
+        self.filename = pathlib.Path(filename)
+        self.variable_name = variable_name
+        self._arrays: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._arrays)
+
+    def add(self, values) -> str:
+        """Store an array and return the matlab expression that refers to it in the loaded data.
+
+        Parameters
+        ----------
+        values : array_like
+            Numeric values, 1D arrays are stored as row vectors.
+
+        Returns
+        -------
+        str
+            Matlab expression, e.g. `incawrapper_data.values{3}`.
+        """
+        self._arrays.append(np.asarray(values, dtype=float))
+        return f"{self.variable_name}.values{{{len(self._arrays)}}}"
+
+    def load_statement(self) -> str:
+        """Return the matlab code that loads the data file."""
+        return f"{self.variable_name} = load('{self.filename.resolve()}');\n"
+
+    def save(self) -> None:
+        """Write the stored arrays to the .mat file as one cell array."""
+        values = np.empty(len(self._arrays), dtype=object)
+        for idx, array in enumerate(self._arrays):
+            values[idx] = array
+        scipy.io.savemat(self.filename, {"values": values}, oned_as="row")
+
+
+__all__ = ["ScriptDataSidecar"]
@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from typing import Any, Hashable, Optional, Union
+import numpy as np
+import pandas as pd
+
+# The sidecar cache stores data frames as parquet files, which requires the pyarrow package.
+# pyarrow is an optional dependency, the rest of incawrapper works without it.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+MISSING = object()
+"""Returned by SidecarCache.load if the key is not cached."""
+
+_MANIFEST_VERSION = 2
+_JSON_COLUMNS_KEY = b"incawrapper.json_columns"
+_OBJECT_COLUMNS_KEY = b"incawrapper.object_columns"
+_SOURCE_HASH_KEY = b"incawrapper.source_sha256"
+
+
+class SidecarCache:
+    """Columnar on-disk cache for data parsed from an INCA .mat file. Data frames are stored as
+    parquet files and scalar values as json files, all in a directory next to the .mat file (by
+    default `<name>.mat.incawrapper_cache`). Later INCAResults objects created for the same file
+    read the cached data instead of parsing the .mat file.
+
+    The manifest records the size, modification time and sha256 hash of the .mat file. The cache
+    is valid when size and modification time are unchanged. If the modification time has changed,
+    the hash is computed, and the cache is only discarded if the content of the file has changed.
+    The validation is done once per SidecarCache object.
+
+    Every entry is written to its own file together with the hash of the .mat file it was derived
+    from, and entries with another hash are ignored. Thus several processes can fill the same
+    cache at the same time without a lock, no entry is lost and no entry of an old version of the
+    .mat file is used.
+
+    Columns that Arrow cannot represent, e.g. columns mixing strings and arrays, are stored as
+    string columns with one json encoded value per row. Reading the cache never executes code.
+
+    Parameters
+    ----------
+    inca_matlab_file : pathlib.Path or str
+        Path to the .mat file produced by INCA.
+    cache_directory : pathlib.Path or str, optional
+        Directory in which the cache is stored. Default is `<inca_matlab_file>.incawrapper_cache`
+        next to the .mat file.
+    """
+
+    def __init__(
+        self,
+        inca_matlab_file: Union[str, pathlib.Path],
+        cache_directory: Optional[Union[str, pathlib.Path]] = None,
+    ):
+        if not PYARROW_AVAILABLE:
+            raise ImportError(
+                "The sidecar cache requires the pyarrow package. It can be installed by running "
+                "'pip install incawrapper[cache]'."
+            )
+        self.inca_matlab_file = pathlib.Path(inca_matlab_file)
+        if cache_directory is None:
+            cache_directory = self.inca_matlab_file.with_name(
+                self.inca_matlab_file.name + ".incawrapper_cache"
+            )
+        self.cache_directory = pathlib.Path(cache_directory)
+        self._manifest = None
+
+    @property
+    def manifest_file(self) -> pathlib.Path:
+        return self.cache_directory / "manifest.json"
+
+    def load(self, key: Hashable) -> Any:
+        """Return the cached value of the key or MISSING if the key is not cached.
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the derived data, e.g. "fitdata.fitted_parameters".
+
+        Returns
+        -------
+        Any
+            The cached data frame or scalar value, or MISSING.
+        """
+        source_hash = self._get_manifest()["source"]["sha256"]
+        parquet_file, entry_file = self._entry_files(key)
+        if parquet_file.exists():
+            try:
+                df, df_source_hash = _read_data_frame(parquet_file)
+            except (OSError, ValueError, pa.ArrowException):
+                # the parquet file has been removed or is corrupt, the data is parsed again
+                df_source_hash = None
+            if df_source_hash == source_hash:
+                return df
+        try:
+            entry = json.loads(entry_file.read_text())
+        except (OSError, ValueError):
+            return MISSING
+        if entry.get("sha256") != source_hash or entry.get("kind") != "json":
+            return MISSING
+        return _decode_json_value(entry["value"])
+
+    def save(self, key: Hashable, value: Any) -> None:
+        """Store the value under the key. Data frames are written to a parquet file, numeric and
+        string scalars (and 1D numeric arrays) to a json file. Values that cannot be stored are
+        marked as unsupported, such that they are not attempted again.
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the derived data, e.g. "fitdata.fitted_parameters".
+        value : Any
+            The derived data.
+        """
+        source_hash = self._get_manifest()["source"]["sha256"]
+        parquet_file, entry_file = self._entry_files(key)
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        if isinstance(value, pd.DataFrame):
+            try:
+                _write_data_frame(value, parquet_file, source_hash)
+                return
+            except (pa.ArrowException, TypeError, ValueError):
+                entry = {"kind": "unsupported"}
+        else:
+            encoded = _encode_json_value(value)
+            entry = {"kind": "unsupported"} if encoded is MISSING else {"kind": "json", "value": encoded}
+        entry["sha256"] = source_hash
+        _atomic_write(entry_file, json.dumps(entry).encode())
+
+    def _entry_files(self, key: Hashable):
+        """Return the parquet file and the json file of an entry."""
+        key = str(key)
+        return self.cache_directory / f"{key}.parquet", self.cache_directory / f"{key}.entry.json"
+
+    def invalidate(self) -> None:
+        """Remove all cached data. The cache directory itself is kept."""
+        if self.cache_directory.exists():
+            for pattern in ["*.parquet", "*.entry.json", "manifest.json"]:
+                for path in self.cache_directory.glob(pattern):
+                    # another process may have removed the file already
+                    path.unlink(missing_ok=True)
+        self._manifest = None
+
+    def _get_manifest(self) -> dict:
+        """Return the manifest, read and validated against the .mat file on the first call."""
+        if self._manifest is not None:
+            return self._manifest
+
+        stat = self.inca_matlab_file.stat()
+        manifest = None
+        if self.manifest_file.exists():
+            try:
+                manifest = json.loads(self.manifest_file.read_text())
+            except ValueError:
+                manifest = None
+        if manifest is not None and manifest.get("version") != _MANIFEST_VERSION:
+            manifest = None
+
+        if manifest is not None:
+            source = manifest["source"]
+            if source["size"] != stat.st_size:
+                manifest = None
+            elif source["mtime_ns"] != stat.st_mtime_ns:
+                if source["sha256"] == _hash_file(self.inca_matlab_file):
+                    # the file has been touched or copied, but its content is unchanged
+                    source["mtime_ns"] = stat.st_mtime_ns
+                    self._write_manifest(manifest)
+                else:
+                    manifest = None
+
+        if manifest is None:
+            self.invalidate()
+            manifest = {
+                "version": _MANIFEST_VERSION,
+                "source": {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": _hash_file(self.inca_matlab_file),
+                },
+            }
+            self._write_manifest(manifest)
+        self._manifest = manifest
+        return manifest
+
+    def _write_manifest(self, manifest: dict) -> None:
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        _atomic_write(self.manifest_file, json.dumps(manifest, indent=1).encode())
+
+
+def _hash_file(path: pathlib.Path) -> str:
+    """Compute the sha256 hash of a file in chunks."""
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _atomic_write(path: pathlib.Path, data: bytes) -> None:
+    """Write to a temporary file and move it in place, such that concurrent readers never see a
+    partially written file."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_data_frame(df: pd.DataFrame, path: pathlib.Path, source_hash: str) -> None:
+    """Write a data frame to a parquet file. Object columns that Arrow cannot convert are json
+    encoded value by value, see _encode_object. The names of the json encoded and object columns
+    and the hash of the .mat file are stored in the schema metadata, such that _read_data_frame
+    restores the original dtypes and can check that the data belongs to the .mat file."""
+    df = df.copy(deep=False)
+    object_columns = [str(col) for col in df.columns if df[col].dtype == object]
+    json_columns = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except pa.ArrowException:
+            df[col] = [json.dumps(_encode_object(value)) for value in df[col]]
+            json_columns.append(str(col))
+
+    table = pa.Table.from_pandas(df)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            _JSON_COLUMNS_KEY: json.dumps(json_columns).encode(),
+            _OBJECT_COLUMNS_KEY: json.dumps(object_columns).encode(),
+            _SOURCE_HASH_KEY: source_hash.encode(),
+        }
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+    _atomic_write(path, sink.getvalue().to_pybytes())
+
+
+def _read_data_frame(path: pathlib.Path):
+    """Read a data frame written by _write_data_frame.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, str]
+        The data frame and the hash of the .mat file it was derived from.
+    """
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    json_columns = json.loads(metadata.get(_JSON_COLUMNS_KEY, b"[]"))
+    object_columns = json.loads(metadata.get(_OBJECT_COLUMNS_KEY, b"[]"))
+    df = table.to_pandas()
+    for col in df.columns:
+        if str(col) in json_columns:
+            df[col] = pd.Series(
+                [_decode_object(json.loads(value)) for value in df[col]], index=df.index, dtype=object
+            )
+        elif str(col) in object_columns and df[col].dtype != object:
+            df[col] = df[col].astype(object)
+    return df, metadata.get(_SOURCE_HASH_KEY, b"").decode()
+
+
+def _encode_object(value: Any) -> Any:
+    """Encode a value of an object column as json compatible data. None, bools, numbers and
+    strings are kept, numpy arrays and scalars, dictionaries and lists are tagged such that
+    _decode_object restores their types.
+
+    Raises
+    ------
+    TypeError
+        If the value contains other types, e.g. complex numbers.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            data = [_encode_object(elem) for elem in value.ravel()]
+        elif value.dtype.kind in "biufU":
+            data = value.ravel().tolist()
+        else:
+            raise TypeError(f"Arrays of dtype {value.dtype} cannot be cached")
+        return {"ndarray": data, "dtype": value.dtype.str, "shape": list(value.shape)}
+    if isinstance(value, np.generic) and value.dtype.kind in "biufU":
+        return {"scalar": value.item(), "dtype": value.dtype.str}
+    if isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        return {"dict": {k: _encode_object(v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return {"list": [_encode_object(elem) for elem in value]}
+    raise TypeError(f"Values of type {type(value).__name__} cannot be cached")
+
+
+def _decode_object(encoded: Any) -> Any:
+    """Decode a value encoded by _encode_object."""
+    if not isinstance(encoded, dict):
+        return encoded
+    if "ndarray" in encoded:
+        dtype = np.dtype(encoded["dtype"])
+        if dtype == object:
+            data = np.empty(len(encoded["ndarray"]), dtype=object)
+            for idx, elem in enumerate(encoded["ndarray"]):
+                data[idx] = _decode_object(elem)
+        else:
+            data = np.array(encoded["ndarray"], dtype=dtype)
+        return data.reshape(encoded["shape"])
+    if "scalar" in encoded:
+        return np.dtype(encoded["dtype"]).type(encoded["scalar"])
+    if "dict" in encoded:
+        return {k: _decode_object(v) for k, v in encoded["dict"].items()}
+    return [_decode_object(elem) for elem in encoded["list"]]
+
+
+def _encode_json_value(value: Any) -> Any:
+    """Encode scalars, lists of strings and 1D numeric arrays for the manifest. Returns MISSING
+    for values that cannot be encoded."""
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic) and np.issubdtype(value.dtype, np.number):
+        return {"scalar": value.item(), "dtype": value.dtype.str}
+    if isinstance(value, np.ndarray) and value.ndim == 1 and np.issubdtype(value.dtype, np.number):
+        return {"array": value.tolist(), "dtype": value.dtype.str}
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return {"list": value}
+    return MISSING
+
+
+def _decode_json_value(encoded: Any) -> Any:
+    """Decode a value encoded by _encode_json_value."""
+    if not isinstance(encoded, dict):
+        return encoded
+    if "scalar" in encoded:
+        return np.dtype(encoded["dtype"]).type(encoded["scalar"])
+    if "array" in encoded:
+        return np.array(encoded["array"], dtype=encoded["dtype"])
+    return list(encoded["list"])
@@ -0,0 +1,135 @@
+"""Validation of the input dataframes of the script writers.
+
+The script writers validate their input with the pandera schemas in dataschemas. When a script is
+created with `create_inca_script_from_data`, the same data is passed to several writers for every
+experiment. To avoid validating the same dataframe again and again, validations are remembered
+within a `validation_cache()` context: a dataframe that has been validated against a schema is
+not validated again against the same schema. Pipelines that validate their data upstream can
+skip the validation altogether with `trusted_input()`.
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+from typing import Callable, Dict, Iterator, Optional, Tuple
+import pandas as pd
+import pandera as pa
+
+_validation_cache: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar(
+    "incawrapper_validation_cache", default=None
+)
+_trusted: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "incawrapper_trusted_input", default=False
+)
+
+
+@contextlib.contextmanager
+def validation_cache() -> Iterator[None]:
+    """Remember the validated dataframes within the context, such that each dataframe is only
+    validated once against each schema. The validated dataframes are kept alive until the
+    context exits. Nested contexts share the cache of the outermost context.
+
+    The dataframes must not be modified in place within the context, the cache recognizes a
+    dataframe by its identity and only checks that its shape and columns are unchanged.
+
+    Examples
+    --------
+    >>> with validation_cache():
+    ...     script = define_ms_data(ms_measurements, "exp1")
+    ...     script += define_ms_data(ms_measurements, "exp2")  # not validated again
+    """
+    if _validation_cache.get() is not None:
+        yield
+        return
+    token = _validation_cache.set({})
+    try:
+        yield
+    finally:
+        _validation_cache.reset(token)
+
+
+@contextlib.contextmanager
+def trusted_input() -> Iterator[None]:
+    """Skip the schema validation of the script writers within the context. Use this only for
+    data that has already been validated, e.g. by `dataschemas.MSMeasurementsSchema.validate`,
+    as invalid data will result in an invalid INCA script or an obscure error. Notice that the
+    writers then use the data as is, thus the dtypes must already be coerced by the schema.
+    """
+    token = _trusted.set(True)
+    try:
+        yield
+    finally:
+        _trusted.reset(token)
+
+
+def _fingerprint(obj) -> Tuple:
+    if isinstance(obj, pd.DataFrame):
+        return (obj.shape, tuple(obj.columns), tuple(obj.dtypes))
+    return ()
+
+
+def _cache_key(obj, schema: pa.DataFrameSchema) -> Tuple[int, int]:
+    return (id(obj), id(schema))
+
+
+def mark_validated(obj, schema: pa.DataFrameSchema) -> None:
+    """Register a dataframe as valid for the schema in the active validation cache, e.g. a
+    subset of the rows of a validated dataframe. Does nothing outside a validation_cache()
+    context."""
+    cache = _validation_cache.get()
+    if cache is not None:
+        cache[_cache_key(obj, schema)] = (obj, _fingerprint(obj), obj)
+
+
+def validate_input(obj, schema: pa.DataFrameSchema):
+    """Validate a dataframe against a schema, using the active validation cache and trusted mode.
+
+    Returns
+    -------
+    pd.DataFrame
+        The validated dataframe, with the dtypes coerced by the schema.
+    """
+    if _trusted.get():
+        return obj
+    cache = _validation_cache.get()
+    if cache is None:
+        return schema.validate(obj)
+
+    key = _cache_key(obj, schema)
+    cached = cache.get(key)
+    if cached is not None and cached[1] == _fingerprint(obj):
+        return cached[2]
+    validated = schema.validate(obj)
+    # the input is kept in the cache such that its id is not reused by a new object
+    cache[key] = (obj, _fingerprint(obj), validated)
+    mark_validated(validated, schema)
+    return validated
+
+
+def check_input(schema: pa.DataFrameSchema) -> Callable:
+    """Decorator that validates the first argument of the function against the schema, like
+    pandera.check_input, but uses the validation cache and trusted mode of this module.
+
+    Parameters
+    ----------
+    schema : pa.DataFrameSchema
+        The schema used to validate the first argument.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        obj_name = next(iter(inspect.signature(func).parameters))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if args:
+                args = (validate_input(args[0], schema), *args[1:])
+            else:
+                kwargs[obj_name] = validate_input(kwargs[obj_name], schema)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+__all__ = ["validation_cache", "trusted_input"]
@@ -0,0 +1,59 @@
+'''Benchmark of the wall time of a sharded multi-start estimation with run_inca_multistart.
+INCA is replaced by FakeINCABackend, which sleeps a fixed time per restart of its shard and
+copies the quickstart results of the simple model. The benchmark thus measures how the wall time
+scales with the number of shards and workers, and includes the generation of the scripts and
+the parsing and merging of the results, but not the time MATLAB needs to start.
+
+Run the script from the root of the repository:
+
+    python manual_tests/benchmark_multistart.py
+'''
+import contextlib
+import io
+import pathlib
+import re
+import tempfile
+import time
+from incawrapper.core.INCAScript import INCAScript
+from incawrapper.core.INCAScript_writing import define_options, define_runner
+from incawrapper.core.inca_backends import FakeINCABackend
+from incawrapper.core.multistart import run_inca_multistart
+
+FIT_STARTS = 1000
+SECONDS_PER_START = 0.002
+N_SHARDS = [1, 2, 4, 8, 16]
+RESULTS_FILE = (
+    pathlib.Path(__file__).parent.parent
+    / "docs" / "examples" / "Literature data" / "simple model" / "simple_model_quikstart.mat"
+)
+
+
+def _fake_estimate(inca_script: INCAScript) -> pathlib.Path:
+    """Sleep for the restarts of the shard and return the canned results."""
+    n_starts = int(re.search(r"fit_starts = (\d+);", inca_script.blocks["options"]).group(1))
+    time.sleep(n_starts * SECONDS_PER_START)
+    return RESULTS_FILE
+
+
+def main():
+    print(f"{'shards':>8}{'wall time [s]':>16}{'speedup':>10}{'restarts':>10}")
+    serial_time = None
+    for n_shards in N_SHARDS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inca_script = INCAScript()
+            inca_script.add_to_block("options", define_options(fit_starts=FIT_STARTS))
+            inca_script.add_to_block("runner", define_runner(pathlib.Path(tmp_dir) / "output.mat"))
+
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # silence the progress of run_inca
+                fitdata = run_inca_multistart(
+                    inca_script, tmp_dir, FIT_STARTS, n_shards, backend=FakeINCABackend(_fake_estimate)
+                )
+            wall_time = time.perf_counter() - start_time
+            n_restarts = len(fitdata.fitted_parameters["vals"].iat[0])
+        serial_time = serial_time or wall_time
+        print(f"{n_shards:>8}{wall_time:>16.2f}{serial_time / wall_time:>9.1f}x{n_restarts:>10}")
+
+
+if __name__ == "__main__":
+    main()
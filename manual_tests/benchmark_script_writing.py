@@ -0,0 +1,178 @@
+'''Benchmark of the script block writers for a genome-scale sized model. The benchmark compares
+the previous row-by-row writers (DataFrame.apply and iterrows with string concatenation) with
+the vectorized writers in INCAScript_writing, and checks that both give the same script text.
+It also compares the previous per-fragment groupby/apply version of fill_all_mass_isotope_gaps
+with the single reindex version on an INST sized MS dataset.
+
+The pandera validation of the inputs is done by both versions and is included in the timings.
+Run the script from the root of the repository:
+
+    python manual_tests/benchmark_script_writing.py
+'''
+import time
+import numpy as np
+import pandas as pd
+from incawrapper.core import INCAScript_writing
+
+N_REACTIONS = 5000
+N_FLUX_MEASUREMENTS = 2000
+N_POOL_MEASUREMENTS = 2000
+N_MS_FRAGMENTS = 500
+N_TIME_POINTS = 6
+N_REPEATS = 5
+
+
+def _legacy_define_reactions(model_reactions):
+    reaction_func_calls = model_reactions.apply(
+        lambda row: INCAScript_writing.instantiate_inca_class_call(
+            inca_class='reaction',
+            S="'" + row["rxn_eqn"] + "'",
+            id="'" + row["rxn_id"] + "'",
+        ),
+        axis=1
+    )
+    script = "% Create reactions\nr = [...\n"
+    for reaction in reaction_func_calls:
+        script += f"{reaction},...\n"
+    script += "];"
+    return script
+
+
+def _legacy_define_flux_measurements(flux_measurements, experiment_id):
+    fluxes_subset = flux_measurements[flux_measurements["experiment_id"] == experiment_id]
+    tmp_script = f"\n% define flux measurements for experiment {experiment_id}\n" + f"f_{experiment_id}" + " = [...\n"
+    for _, flux in fluxes_subset.iterrows():
+        tmp_script += f"data('{flux['rxn_id']}', 'val', {flux['flux']}, 'std', {flux['flux_std_error']})"
+        tmp_script += ",...\n"
+    tmp_script += "];\n"
+    return tmp_script
+
+
+def _legacy_define_pool_measurements(pool_measurements, experiment_id):
+    pools_subset = pool_measurements[pool_measurements["experiment_id"] == experiment_id]
+    tmp_script = f"\n% define pool measurements for experiment {experiment_id}\n" + f"p_{experiment_id}" + " = [...\n"
+    for _, pool in pools_subset.iterrows():
+        tmp_script += INCAScript_writing.instantiate_inca_class_call(
+            inca_class='data',
+            S="'" + pool["met_id"] + "'",
+            val=pool["pool_size"],
+            std=pool["pool_size_std_error"]
+        )
+        tmp_script += ",...\n"
+    tmp_script += "];\n"
+    return tmp_script
+
+
+def _legacy_fill_mass_isotope_gaps_in_group(ms_measurements):
+    largest_mass_isotope = ms_measurements['mass_isotope'].max()
+    fill_columns = [
+        name for name in ms_measurements.columns if name not in ['intensity', 'intensity_std_error', 'mass_isotope']
+    ]
+    ms_measurements = ms_measurements.set_index("mass_isotope").reindex(
+        range(0, largest_mass_isotope + 1), fill_value=pd.NA
+    )
+    ms_measurements[fill_columns] = ms_measurements[fill_columns].ffill().bfill()
+    return ms_measurements
+
+
+def _legacy_fill_all_mass_isotope_gaps(ms_measurements):
+    ms_measurements = INCAScript_writing.MSMeasurementsSchema.validate(ms_measurements)
+    groupby_cols = ["experiment_id", "ms_id", "measurement_replicate", 'time']
+    return (ms_measurements
+        .groupby(groupby_cols)
+        .apply(_legacy_fill_mass_isotope_gaps_in_group)
+        .drop(columns=groupby_cols)
+        .reset_index()
+    )
+
+
+def _synthetic_ms_data():
+    rng = np.random.default_rng(0)
+    rows = []
+    for fragment in range(N_MS_FRAGMENTS):
+        for time_point in range(N_TIME_POINTS):
+            # measure a random subset of the mass isotopes M0-M6 to create gaps
+            n_measured = rng.integers(2, 7)
+            for mass_isotope in np.sort(rng.choice(7, n_measured, replace=False)):
+                rows.append({
+                    "experiment_id": "exp1",
+                    "met_id": f"M{fragment}",
+                    "ms_id": f"M{fragment}_1",
+                    "labelled_atom_ids": [1, 2, 3, 4, 5, 6],
+                    "measurement_replicate": 1,
+                    "unlabelled_atoms": "H10O6",
+                    "mass_isotope": int(mass_isotope),
+                    "intensity": rng.uniform(),
+                    "intensity_std_error": 0.01,
+                    "time": float(time_point),
+                })
+    return pd.DataFrame(rows)
+
+
+def _synthetic_data():
+    rng = np.random.default_rng(0)
+    reactions = pd.DataFrame({
+        "rxn_id": [f"R{i}" for i in range(N_REACTIONS)],
+        "rxn_eqn": [f"M{i} (C1:a C2:b) -> M{i + 1} (C1:a C2:b)" for i in range(N_REACTIONS)],
+    })
+    fluxes = pd.DataFrame({
+        "experiment_id": "exp1",
+        "rxn_id": [f"R{i}" for i in range(N_FLUX_MEASUREMENTS)],
+        "flux": rng.normal(10, 2, N_FLUX_MEASUREMENTS),
+        "flux_std_error": rng.uniform(0.1, 1, N_FLUX_MEASUREMENTS),
+    })
+    pools = pd.DataFrame({
+        "experiment_id": "exp1",
+        "met_id": [f"M{i}" for i in range(N_POOL_MEASUREMENTS)],
+        "pool_size": rng.uniform(1, 5, N_POOL_MEASUREMENTS),
+        "pool_size_std_error": rng.uniform(0.1, 1, N_POOL_MEASUREMENTS),
+    })
+    return reactions, fluxes, pools, _synthetic_ms_data()
+
+
+def _time(func, *args):
+    start = time.perf_counter()
+    for _ in range(N_REPEATS):
+        result = func(*args)
+    return (time.perf_counter() - start) / N_REPEATS, result
+
+
+def main():
+    reactions, fluxes, pools, ms_measurements = _synthetic_data()
+    cases = [
+        ("define_reactions", _legacy_define_reactions, INCAScript_writing.define_reactions, (reactions,)),
+        (
+            "define_flux_measurements",
+            _legacy_define_flux_measurements,
+            INCAScript_writing.define_flux_measurements,
+            (fluxes, "exp1"),
+        ),
+        (
+            "define_pool_measurements",
+            _legacy_define_pool_measurements,
+            INCAScript_writing.define_pool_measurements,
+            (pools, "exp1"),
+        ),
+        (
+            "fill_all_mass_isotope_gaps",
+            _legacy_fill_all_mass_isotope_gaps,
+            INCAScript_writing.fill_all_mass_isotope_gaps,
+            (ms_measurements,),
+        ),
+    ]
+    print(f"{'writer':<30}{'legacy [ms]':>14}{'vectorized [ms]':>18}{'speedup':>10}")
+    for name, legacy, vectorized, args in cases:
+        legacy_time, legacy_script = _time(legacy, *args)
+        vectorized_time, vectorized_script = _time(vectorized, *args)
+        if isinstance(legacy_script, pd.DataFrame):
+            pd.testing.assert_frame_equal(legacy_script, vectorized_script)
+        else:
+            assert legacy_script == vectorized_script, f"{name} gives a different script"
+        print(
+            f"{name:<30}{legacy_time * 1e3:>14.1f}{vectorized_time * 1e3:>18.1f}"
+            f"{legacy_time / vectorized_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
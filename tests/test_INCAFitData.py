@@ -17,6 +17,64 @@ def test_parses_fitted_parameters(inca_results_simple_model_filename):
     assert data.fitted_parameters.shape[0] == 7
 
 
+def test_measurements_and_fit_detailed_columns(inca_results_simple_model_filename):
+    """
+    Tests that the residuals are parsed to float columns and object columns with the values of
+    the results file
+    """
+    import numpy as np
+    fitdata = INCAFitData(inca_results_simple_model_filename)
+    detailed = fitdata.measurements_and_fit_detailed
+    assert detailed.shape == (5, 11)
+    for column in ["type", "expt", "id", "peak", "base"]:
+        assert detailed[column].dtype == object
+    for column in ["time", "data", "std", "fit", "weighted residual"]:
+        assert detailed[column].dtype == float
+    # measurements without peaks keep the empty matlab array
+    for residual, peak in zip(
+        [res for mnt in np.atleast_1d(fitdata.raw["mnt"]) for res in np.atleast_1d(mnt["res"])],
+        detailed["peak"],
+    ):
+        assert type(peak) is type(residual["peak"])
+        assert np.array_equal(peak, residual["peak"])
 
 
+def test_measurements_and_fit_detailed_lazy(inca_results_simple_model_filename):
+    """
+    Tests that the residuals are parsed from lazily loaded structs
+    """
+    from incawrapper.core.matlab_file_cache import MatlabFileCache
+    eager = INCAFitData(inca_results_simple_model_filename).measurements_and_fit_detailed
+    lazy = INCAFitData(
+        inca_results_simple_model_filename,
+        MatlabFileCache(inca_results_simple_model_filename, lazy=True),
+    ).measurements_and_fit_detailed
+    pd.testing.assert_frame_equal(eager.drop(columns="base"), lazy.drop(columns="base"))
 
+
+
+def test_covariance_and_correlation_matrix(inca_results_simple_model_filename):
+    """
+    Tests that the covariance and correlation matrices are assembled from the parameter vectors
+    """
+    import numpy as np
+    data = INCAFitData(inca_results_simple_model_filename)
+    parameters = data.fitted_parameters
+    cov = data.covariance_matrix
+    assert cov is data.covariance_matrix
+    assert cov.shape == (7, 7)
+    assert list(cov.index) == list(cov.columns) == parameters["id"].tolist()
+    assert cov.to_numpy().flags.c_contiguous
+    np.testing.assert_array_equal(cov.loc["R2 net"], parameters.set_index("id").loc["R2 net", "cov"])
+    np.testing.assert_allclose(np.diag(data.correlation_matrix), 1)
+
+
+def test_fitted_parameters_dtypes(inca_results_simple_model_filename):
+    """
+    Tests that the numeric columns of the fitted parameters have numeric dtypes
+    """
+    parameters = INCAFitData(inca_results_simple_model_filename).fitted_parameters
+    for column in ["val", "std", "lb", "ub", "alf"]:
+        assert parameters[column].dtype == float
+    assert parameters["free"].dtype == "int64"
+    assert parameters["cov"].dtype == object
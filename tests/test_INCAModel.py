@@ -54,3 +54,32 @@ def test_convert_reactions_to_net_exch_format():
     converted = _convert_reactions_to_net_exch_format(input_data)
 
     assert pd.testing.assert_frame_equal(converted, expected_output) is None
+
+
+def test_convert_reactions_to_net_exch_format_vector_values():
+    """Tests that the conversion is applied element wise when the values are vectors"""
+    import numpy as np
+    input_data = pd.DataFrame.from_dict(
+        {
+            'rxn': ['B', 'A', 'B'],
+            'dir': ['b', 'f', 'f'],
+            'val': [np.array([1, 4]), np.array([3, 3]), np.array([2, 2])]
+        }
+    )
+    converted = _convert_reactions_to_net_exch_format(input_data)
+    assert converted['rxn_id'].tolist() == ['A', 'B net', 'B exch']
+    np.testing.assert_array_equal(np.stack(converted['flux']), [[3, 3], [1, -2], [1, 2]])
+
+
+def test_convert_samples_to_net_exch_format(inca_results_simple_model_filename):
+    """Tests that all samples are converted like the single set of rates"""
+    import numpy as np
+    model = INCAModel(inca_results_simple_model_filename)
+    rates = model.rates
+    samples = pd.DataFrame(
+        np.random.default_rng(0).random((5, len(rates))), columns=rates['id']
+    )
+    converted = model.convert_samples_to_net_exch_format(samples)
+    expected = _convert_reactions_to_net_exch_format(rates.assign(val=samples.iloc[2].to_numpy()))
+    assert converted.columns.tolist() == expected['rxn_id'].tolist()
+    np.testing.assert_allclose(converted.iloc[2].to_numpy(), expected['flux'].to_numpy(dtype=float))
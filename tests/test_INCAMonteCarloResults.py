@@ -1,7 +1,8 @@
 import pytest
 import pathlib
 import os 
-from incawrapper.core.INCAMonteCarloResults import INCAMonteCarloResults
+import numpy as np
+from incawrapper.core.INCAMonteCarloResults import INCAMonteCarloResults, _stack_iterations
 
 current_dir = str(pathlib.Path(__file__).parent.absolute())
 
@@ -34,4 +35,105 @@ def test_FileNotFound():
 
     with pytest.raises(FileNotFoundError):
         INCAMonteCarloResults(mcfile, ["A", "B", "C", "D", "E", "F", "G"])
-        
\ No newline at end of file
+        
+
+def test_dump_file_samples_match_iteration_order():
+    """Tests that the samples of a dump file are stacked by iteration and then by sample."""
+    mcfile = pathlib.Path("tests/test_data/dump.mat")
+    names = ["A", "B", "C", "D", "E", "F", "G"]
+    mcres = INCAMonteCarloResults(mcfile, names)
+    k = mcres.mc["k"].reshape(-1, *mcres.mc["k"].shape[-2:])
+    for idx, name in enumerate(names):
+        np.testing.assert_array_equal(mcres.samples[name].to_numpy(), k[:, :, idx].flatten())
+    assert mcres.samples_array.dtype == np.float64
+
+
+def test_finished_file_samples_are_not_copied():
+    """Tests that the samples of a finished file are a view of the loaded matrix, and that
+    the float32 mode converts them."""
+    mcfile = pathlib.Path("tests/test_data/simple_model_mc_tutorial_mc.mat")
+    names = ["A", "B", "C", "D", "E", "F", "G"]
+    mcres = INCAMonteCarloResults(mcfile, names)
+    assert np.shares_memory(mcres.samples_array, mcres.mc["K"])
+    assert mcres.samples is mcres.samples
+
+    mcres32 = INCAMonteCarloResults(mcfile, names, dtype=np.float32)
+    assert mcres32.samples_array.dtype == np.float32
+    assert (mcres32.samples.dtypes == np.float32).all()
+    np.testing.assert_allclose(mcres32.samples_array, mcres.samples_array, rtol=1e-6)
+
+
+def test_stack_iterations():
+    """Tests that the iterations of a dump file are stacked with a single copy."""
+    k = np.asfortranarray(np.random.default_rng(0).random((3, 4, 5)))
+    stacked = _stack_iterations(k)
+    np.testing.assert_array_equal(stacked, np.ascontiguousarray(k).reshape(-1, 5))
+    np.testing.assert_array_equal(_stack_iterations(k, np.float32), k.reshape(-1, 5).astype(np.float32))
+    assert np.shares_memory(_stack_iterations(k[:1]), k)
+
+
+def test_streaming_summary_matches_samples():
+    """Tests that the streaming summary gives the same statistics as the full sample matrix."""
+    mcfile = pathlib.Path("tests/test_data/simple_model_mc_tutorial_mc.mat")
+    mcres = INCAMonteCarloResults(mcfile, ["A", "B", "C", "D", "E", "F", "G"])
+    summary = mcres.summary(block_size=64)
+    samples = mcres.samples
+    assert summary.count == 500
+    np.testing.assert_allclose(summary.mean, samples.mean())
+    np.testing.assert_allclose(summary.variance, samples.var(), rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(summary.covariance, samples.cov(), rtol=1e-9, atol=1e-12)
+    ci = summary.confidence_intervals(alpha=0.1)
+    expected = samples.quantile([0.05, 0.95], interpolation="lower")
+    np.testing.assert_allclose(ci.to_numpy(), expected.to_numpy(), rtol=0.011, atol=1e-9)
+
+
+def test_streaming_summaries_can_be_merged():
+    """Tests that merging the summaries of two halves gives the summary of all samples."""
+    from incawrapper.core.monte_carlo_statistics import MonteCarloSummary
+
+    names = ["x", "y"]
+    samples = np.random.default_rng(1).normal([-3.0, 50.0], [1.0, 5.0], size=(2000, 2))
+    merged = MonteCarloSummary(names).update(samples[:700]).merge(
+        MonteCarloSummary(names).update(samples[700:])
+    )
+    np.testing.assert_allclose(merged.mean, samples.mean(axis=0))
+    np.testing.assert_allclose(merged.covariance, np.cov(samples.T))
+    median = merged.quantiles([0.5])
+    np.testing.assert_allclose(median.to_numpy()[0], np.quantile(samples, 0.5, axis=0), rtol=0.02)
+
+
+def test_samples_can_be_replaced():
+    """Tests that assigning samples or samples_array replaces the samples used by the other
+    attributes."""
+    names = ["A", "B", "C", "D", "E", "F", "G"]
+    mcres = INCAMonteCarloResults(pathlib.Path("tests/test_data/simple_model_mc_tutorial_mc.mat"), names)
+    burned_in = mcres.samples.iloc[50:].reset_index(drop=True)
+    mcres.samples = burned_in
+    assert mcres.samples is burned_in
+    np.testing.assert_array_equal(mcres.samples_array, burned_in.to_numpy())
+    np.testing.assert_allclose(mcres.summary().mean, burned_in.mean())
+
+    mcres.samples_array = mcres.samples_array[:10]
+    assert mcres.samples.shape == (10, 7)
+    assert list(mcres.samples.columns) == names
+    with pytest.raises(ValueError, match="7 columns"):
+        mcres.samples_array = np.zeros((10, 3))
+
+
+def test_streaming_summary_ignores_samples_with_nan():
+    """Tests that the moments and the quantiles both ignore the samples with NaN values, and that
+    only sketches with the same settings are merged."""
+    from incawrapper.core.monte_carlo_statistics import MonteCarloSummary, QuantileSketch
+
+    samples = np.random.default_rng(2).normal(size=(100, 2))
+    with_nan = samples.copy()
+    with_nan[[3, 40], 0] = np.nan
+    summary = MonteCarloSummary(["x", "y"]).update(with_nan)
+    complete = np.delete(samples, [3, 40], axis=0)
+    assert summary.count == 98
+    assert all(sketch.count == 98 for sketch in summary.sketches)
+    np.testing.assert_allclose(summary.mean, complete.mean(axis=0))
+    np.testing.assert_allclose(summary.covariance, np.cov(complete.T))
+
+    with pytest.raises(ValueError, match="min_value"):
+        QuantileSketch(min_value=1e-12).merge(QuantileSketch(min_value=1e-6))
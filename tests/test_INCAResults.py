@@ -51,4 +51,104 @@ def test_load_mc_data_given_filename():
     mcfile = pathlib.Path(current_dir / "test_data" / "simple_model_mc_tutorial_mc.mat")
     res = INCAResults(output_file, load_mc_data=mcfile)
     assert res.mc.samples.shape == (500, 7)
-    assert res.mc.ci.shape == (2, 7)
\ No newline at end of file
+    assert res.mc.ci.shape == (2, 7)
+
+def test_matlab_file_is_parsed_once(inca_results_simple_model, monkeypatch):
+    """Tests that each variable of the .mat file is only parsed once, even though the model,
+    fitdata and simulation are accessed multiple times."""
+    from incawrapper.core import load_matlab_file
+    calls = []
+    original_loader = load_matlab_file.load_matlab_file
+
+    def counting_loader(*args, **kwargs):
+        calls.append(tuple(kwargs["variable_names"]))
+        return original_loader(*args, **kwargs)
+
+    monkeypatch.setattr(load_matlab_file, "load_matlab_file", counting_loader)
+    inca_results_simple_model.fitdata.get_goodness_of_fit()
+    inca_results_simple_model.fitdata.fitted_parameters
+    inca_results_simple_model.model.metabolite_ids
+    inca_results_simple_model.simulation.raw
+    assert sorted(calls) == [("f",), ("m",), ("s",)]
+
+
+def test_derived_data_frames_are_memoized(inca_results_simple_model):
+    """Tests that the data frames are only computed once per INCAResults object."""
+    fitdata = inca_results_simple_model.fitdata
+    assert fitdata is inca_results_simple_model.fitdata
+    assert fitdata.fitted_parameters is fitdata.fitted_parameters
+    assert inca_results_simple_model.model.states is inca_results_simple_model.model.states
+
+
+def test_clear_cache(inca_results_simple_model):
+    """Tests that clear_cache discards the memoized objects."""
+    fitted_parameters = inca_results_simple_model.fitdata.fitted_parameters
+    inca_results_simple_model.clear_cache()
+    assert inca_results_simple_model.fitdata.fitted_parameters is not fitted_parameters
+    reparsed = inca_results_simple_model.fitdata.fitted_parameters
+    assert reparsed[["id", "val"]].equals(fitted_parameters[["id", "val"]])
+
+
+def _access_all_data_frames(res):
+    return {
+        "fitted_parameters": res.fitdata.fitted_parameters,
+        "overview": res.fitdata.measurements_and_fit_overview,
+        "detailed": res.fitdata.measurements_and_fit_detailed,
+        "rates": res.model.rates,
+        "states": res.model.states,
+        "simulated_data": res.simulation.simulated_data,
+    }
+
+
+def test_sidecar_cache_is_read_instead_of_mat_file(
+    inca_results_simple_model_filename, tmp_path, monkeypatch
+):
+    """Tests that a second INCAResults object reads the sidecar cache instead of the .mat file,
+    and that the cached data frames equal the parsed ones."""
+    pytest.importorskip("pyarrow")
+    import shutil
+    from incawrapper.core import load_matlab_file
+
+    mat_file = tmp_path / "simple_model.mat"
+    shutil.copy(inca_results_simple_model_filename, mat_file)
+    first = INCAResults(mat_file, sidecar_cache=True)
+    parsed = _access_all_data_frames(first)
+    chi2 = first.fitdata.chi2
+    first.model.metabolite_ids
+    assert (tmp_path / "simple_model.mat.incawrapper_cache" / "manifest.json").exists()
+
+    def failing_loader(*args, **kwargs):
+        raise AssertionError("the .mat file should not be parsed")
+
+    monkeypatch.setattr(load_matlab_file, "load_matlab_file", failing_loader)
+    res = INCAResults(mat_file, sidecar_cache=True)
+    cached = _access_all_data_frames(res)
+    assert res.fitdata.chi2 == chi2
+    assert res.model.metabolite_ids == ["A", "B", "C", "D", "E", "F"]
+    for name, df in parsed.items():
+        assert list(cached[name].columns) == list(df.columns), name
+        assert (cached[name].dtypes == df.dtypes).all(), name
+        assert cached[name].astype(str).equals(df.astype(str)), name
+
+
+def test_sidecar_cache_is_invalidated_when_file_changes(
+    inca_results_simple_model_filename, tmp_path
+):
+    """Tests that the sidecar cache is discarded when the content of the .mat file changes, but not
+    when only the modification time changes."""
+    pytest.importorskip("pyarrow")
+    import shutil
+    mat_file = tmp_path / "results.mat"
+    cache_dir = tmp_path / "cache"
+    shutil.copy(inca_results_simple_model_filename, mat_file)
+    INCAResults(mat_file, sidecar_cache=cache_dir).fitdata.fitted_parameters
+    assert (cache_dir / "fitdata.fitted_parameters.parquet").exists()
+
+    os.utime(mat_file, ns=(0, 0))
+    INCAResults(mat_file, sidecar_cache=cache_dir).fitdata.chi2
+    assert (cache_dir / "fitdata.fitted_parameters.parquet").exists()
+
+    shutil.copy(current_dir / "test_data" / "simple_model_output.mat", mat_file)
+    res = INCAResults(mat_file, sidecar_cache=cache_dir)
+    assert res.fitdata.chi2 == INCAResults(mat_file).fitdata.chi2
+    assert not (cache_dir / "fitdata.fitted_parameters.parquet").exists()
@@ -84,4 +84,46 @@ def test_INCAScript_add_to_block_keyerror():
     block name is provided"""
     inca_script = INCAScript()
     with pytest.raises(KeyError):
-        inca_script.add_to_block("not a block", "string added to block")
\ No newline at end of file
+        inca_script.add_to_block("not a block", "string added to block")
+
+def test_INCAScript_matlab_script_is_updated():
+    """Test that the cached matlab script is rebuilt when a block is modified, both through
+    add_to_block and by assigning to the blocks."""
+    inca_script = INCAScript()
+    inca_script.add_to_block("options", "first\n")
+    assert "first\n" in inca_script.matlab_script
+    inca_script.add_to_block("options", "second\n")
+    assert "first\nsecond\n" in inca_script.matlab_script
+    inca_script.blocks["options"] = inca_script.blocks["options"].replace("first", "third")
+    assert inca_script.blocks["options"] == "% OPTIONS BLOCK\nthird\nsecond\n"
+    assert "third\nsecond\n" in str(inca_script)
+
+
+def test_INCAScript_save_script(tmp_path):
+    """Test that the streamed script file is identical to the matlab_script property."""
+    inca_script = INCAScript()
+    for i in range(3):
+        inca_script.add_to_block("reactions", f"reaction {i}\n")
+        inca_script.add_to_block("runner", f"runner {i}\n")
+    inca_script.save_script(tmp_path / "script.m")
+    assert (tmp_path / "script.m").read_text() == inca_script.matlab_script
+
+
+def test_INCAScript_content_hash(tmp_path):
+    """Test that the content hash does not depend on the output files, but on the content of
+    the script and of the data files loaded by the script."""
+    from incawrapper.core.INCAScript_writing import define_runner
+
+    def make_script(output_file, data):
+        (tmp_path / f"{data}.mat").write_text(data)
+        inca_script = INCAScript()
+        inca_script.add_to_block("ms_fragments", f"incawrapper_data = load('{tmp_path / f'{data}.mat'}');\n")
+        inca_script.add_to_block("runner", define_runner(tmp_path / output_file, run_montecarlo=True))
+        return inca_script
+
+    inca_script = make_script("a.mat", "data")
+    assert inca_script.output_files == {"filename": tmp_path / "a.mat", "mc_filename": tmp_path / "a_mc.mat"}
+    assert inca_script.content_hash() == make_script("b.mat", "data").content_hash()
+    assert inca_script.content_hash() != make_script("a.mat", "other data").content_hash()
+    inca_script.add_to_block("options", "o = option('fit_starts', 5);\n")
+    assert inca_script.content_hash() != make_script("a.mat", "data").content_hash()
@@ -1,3 +1,6 @@
+import numpy as np
+import pandas as pd
+import scipy.io
 import pandera as pa
 from incawrapper.core.INCAScript_writing import (
     define_experiment,
@@ -10,7 +13,10 @@ from incawrapper.core.INCAScript_writing import (
     make_experiment_data_config,
     define_model,
     fill_all_mass_isotope_gaps,
+    define_ms_data,
+    create_inca_script_from_data,
 )
+from incawrapper.core.script_data_sidecar import ScriptDataSidecar
 import pytest
 
 
@@ -120,6 +126,21 @@ def test_fill_all_mass_isotope_gaps(ms_measurements_test):
     )
 
 
+def test_fill_all_mass_isotope_gaps_multiple_timepoints(ms_measurements_multiple_timepoints_test):
+    """Checks that each time point is filled separately, that the rows are sorted by time and
+    mass_isotope, and that the fragment columns are copied to the inserted rows."""
+
+    out = fill_all_mass_isotope_gaps(
+        ms_measurements_multiple_timepoints_test.sort_values("time", ascending=False)
+    )
+    assert out["time"].tolist() == [0.0] * 5 + [5.0] * 5
+    assert out["mass_isotope"].tolist() == [0, 1, 2, 3, 4] * 2
+    assert out["intensity"].isna().tolist() == [False, True, False, False, False, True, False, False, False, False]
+    assert (out["met_id"] == "A").all()
+    assert all(atoms == [1, 2, 3, 4] for atoms in out["labelled_atom_ids"])
+    assert out.columns.tolist()[:5] == ["experiment_id", "ms_id", "measurement_replicate", "time", "mass_isotope"]
+
+
 def test_define_pool_measurements(pool_measurements_test):
     expected = """\n% define pool measurements for experiment exp1
 p_exp1 = [...
@@ -127,4 +148,61 @@ data('A', 'val', 1.0, 'std', 0.1),...
 data('B', 'val', 2.0, 'std', 0.2),...
 data('C', 'val', 3.0, 'std', 0.3),...
 ];\n"""
-    assert define_pool_measurements(pool_measurements_test, "exp1") == expected
\ No newline at end of file
+    assert define_pool_measurements(pool_measurements_test, "exp1") == expected
+
+
+def test_pool_measurements_are_validated(pool_measurements_test):
+    """The pool measurements are validated like the other inputs, the pool sizes are coerced to
+    float and invalid values raise a SchemaError."""
+    pool_measurements_test["pool_size"] = pool_measurements_test["pool_size"].astype(int)
+    assert "data('A', 'val', 1.0, 'std', 0.1)" in define_pool_measurements(pool_measurements_test, "exp1")
+
+    pool_measurements_test["pool_size"] = "large"
+    with pytest.raises(pa.errors.SchemaError):
+        define_pool_measurements(pool_measurements_test, "exp1")
+
+def test_create_inca_script_from_data_multiple_experiments(
+    reaction_test, tracer_df_test, flux_measurements_test, ms_measurements_test
+):
+    """Checks that the data of each experiment is written in the blocks of that experiment,
+    also when the rows of the experiments are interleaved in the input."""
+    tracers = pd.concat([tracer_df_test, tracer_df_test.assign(experiment_id="exp2")], ignore_index=True)
+    ms_measurements = ms_measurements_test.iloc[[0, 4, 1, 5, 2, 6, 3, 7]]
+
+    script = create_inca_script_from_data(reaction_test, tracers, flux_measurements_test, ms_measurements)
+
+    assert script.blocks["ms_fragments"].endswith(
+        define_ms_data(ms_measurements_test, "exp1") + define_ms_data(ms_measurements_test, "exp2")
+    )
+    assert "t_exp2 = tracer" in script.blocks["tracers"]
+    assert "f_exp1" in script.blocks["fluxes"]
+    assert "f_exp2" not in script.blocks["fluxes"]  # exp2 does not have flux measurements
+
+
+def test_define_ms_data_with_data_sidecar(ms_measurements_multiple_timepoints_test, tmp_path):
+    """Checks that the ms measurements are written to the sidecar file with the same values as
+    in the text version of the script, and that the script refers to them."""
+    sidecar = ScriptDataSidecar(tmp_path / "data.mat")
+    script = define_ms_data(ms_measurements_multiple_timepoints_test, "exp1", sidecar)
+    sidecar.save()
+
+    assert script.endswith(
+        "ms_exp1{'A1'}.idvs = idv(incawrapper_data.values{1}, 'id', {'exp1_A1_0_0_1','exp1_A1_5_0_1'}, "
+        "'std', incawrapper_data.values{2}, 'time', incawrapper_data.values{3})\n"
+    )
+    values = scipy.io.loadmat(tmp_path / "data.mat")["values"][0]
+    np.testing.assert_array_equal(
+        values[0], [[0.1, np.nan], [np.nan, 0.3], [0.1, 0.3], [0.4, 0.2], [0.4, 0.2]]
+    )
+    np.testing.assert_array_equal(values[1][:, 0], [0.01, np.nan, 0.01, 0.02, 0.02])
+    np.testing.assert_array_equal(values[2], [[0.0, 5.0]])
+
+
+def test_create_inca_script_from_data_with_data_sidecar(
+    reaction_test, tracer_df_test, ms_measurements_test, tmp_path
+):
+    script = create_inca_script_from_data(
+        reaction_test, tracer_df_test, ms_measurements=ms_measurements_test, data_sidecar=tmp_path / "data.mat"
+    )
+    assert f"incawrapper_data = load('{(tmp_path / 'data.mat').resolve()}');" in script.blocks["ms_fragments"]
+    assert len(scipy.io.loadmat(tmp_path / "data.mat")["values"][0]) == 6
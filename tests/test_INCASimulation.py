@@ -0,0 +1,49 @@
+import pathlib
+import numpy as np
+from incawrapper.core.INCASimulation import INCASimulation
+
+current_dir = pathlib.Path(__file__).parent.absolute()
+inst_file = (
+    current_dir.parent / "docs" / "examples" / "Literature data" / "simple model" / "simple_model_inst_fitting.mat"
+)
+
+
+def test_simulated_data_single_fragment(inca_results_simple_model_filename):
+    """
+    Tests that the simulated data is parsed when the simulation contains a single fragment
+    """
+    data = INCASimulation(inca_results_simple_model_filename).simulated_data
+    assert list(data.columns) == ["expt", "id", "time", "type", "mdv", "mass_isotope"]
+    assert data.shape == (4, 6)
+    assert data["mass_isotope"].tolist() == [0, 1, 2, 3]
+    assert data["mdv"].dtype == float
+
+
+def test_simulated_data_time_series():
+    """
+    Tests that the simulated time series are ordered by fragment, time and mass isotopomer
+    """
+    simulation = INCASimulation(inst_file)
+    data = simulation.simulated_data
+    first_fragment = simulation.raw[0]
+    n_isotopomers, n_times = first_fragment["val"].shape
+    first = data.iloc[: n_isotopomers * n_times]
+    np.testing.assert_array_equal(first["mdv"], first_fragment["val"].T.ravel())
+    np.testing.assert_array_equal(first["time"], np.repeat(first_fragment["time"], n_isotopomers))
+    assert data["id"].dtype == object
+
+
+def test_simulated_data_array():
+    """
+    Tests that the dense array contains the same mdvs as the long format
+    """
+    simulation = INCASimulation(inst_file)
+    data = simulation.simulated_data
+    array, coords = simulation.simulated_data_array
+    assert array.shape == tuple(len(coords[name]) for name in ["expt", "id", "time", "mass_isotope"])
+    row = data.iloc[7]
+    idx = tuple(
+        np.searchsorted(coords[name], row[name]) for name in ["expt", "id", "time", "mass_isotope"]
+    )
+    assert array[idx] == row["mdv"]
+    assert np.count_nonzero(~np.isnan(array)) == np.count_nonzero(~np.isnan(data["mdv"]))
@@ -33,3 +33,44 @@ def test_MSMeasurementsSchema_null_value_in_unlabelled_atoms(ms_measurements_tes
     df = ms_measurements_test.copy()
     df["unlabelled_atoms"] = pd.Series([pd.NA, "", None])
     assert isinstance(MSMeasurementsSchema.validate(df), pd.DataFrame)
+
+
+def test_ReactionsSchema_checks(reaction_test):
+    ReactionsSchema.validate(reaction_test)
+
+    df = reaction_test.copy()
+    df.loc[3, "rxn_eqn"] = "C = D"
+    with pytest.raises(pa.errors.SchemaError, match="reaction arrows"):
+        ReactionsSchema.validate(df)
+
+    df = reaction_test.copy()
+    df.loc[3, "rxn_id"] = "r1"
+    with pytest.raises(pa.errors.SchemaError):
+        ReactionsSchema.validate(df)
+
+
+def test_TracerSchema_checks(tracer_df_test):
+    # two labelling groups of the same tracer are allowed
+    df = tracer_df_test.copy()
+    df["tracer_id"] = "[1,2-13C]A"
+    df["met_id"] = "A.ext"
+    TracerSchema.validate(df)
+
+    df.loc[1, "met_id"] = "B"
+    with pytest.raises(pa.errors.SchemaError, match="tracer_id"):
+        TracerSchema.validate(df)
+
+    df = tracer_df_test.copy()
+    df["atom_mdv"] = pd.Series([[0.02, 0.98], (0.05, 0.95)])
+    with pytest.raises(pa.errors.SchemaError, match="python lists"):
+        TracerSchema.validate(df)
+
+
+def test_is_list_checks_the_dtype_first():
+    from incawrapper.core.dataschemas import _is_list
+
+    pyarrow = pytest.importorskip("pyarrow")
+    arrow_lists = pd.Series([[1, 2], None], dtype=pd.ArrowDtype(pyarrow.list_(pyarrow.int64())))
+    assert _is_list(arrow_lists).tolist() == [True, False]
+    assert _is_list(pd.Series([1.0, 2.0])).tolist() == [False, False]
+    assert _is_list(pd.Series([[1], (1,), "a"])).tolist() == [True, False, False]
@@ -0,0 +1,167 @@
+import pytest
+import pathlib
+import numpy as np
+from incawrapper.core.load_matlab_file import load_matlab_file, LazyMatStruct
+
+current_dir = pathlib.Path(__file__).parent.absolute()
+output_file = current_dir / "test_data" / "simple_model_output.mat"
+
+
+def test_load_selected_variables():
+    """Tests that only the requested variables are loaded."""
+    data = load_matlab_file(output_file, variable_names=["f"])
+    assert "f" in data
+    assert "m" not in data
+    assert "s" not in data
+
+
+def test_lazy_loading_matches_eager_loading():
+    """Tests that the lazy proxy gives the same values as the eager conversion."""
+    eager = load_matlab_file(output_file, variable_names=["f"])["f"]
+    lazy = load_matlab_file(output_file, variable_names=["f"], lazy=True)["f"]
+    assert isinstance(lazy, LazyMatStruct)
+    assert set(lazy.keys()) == set(eager.keys())
+    assert lazy["chi2"] == eager["chi2"]
+    assert isinstance(lazy["par"][0], LazyMatStruct)
+    assert lazy["par"][0]["id"] == eager["par"][0]["id"]
+    np.testing.assert_array_equal(lazy["par"][0]["cov"], eager["par"][0]["cov"])
+    assert lazy["par"][0].to_dict()["id"] == eager["par"][0]["id"]
+
+
+def test_lazy_struct_missing_field():
+    """Tests that a KeyError is raised when accessing a field that is not in the struct."""
+    lazy = load_matlab_file(output_file, variable_names=["f"], lazy=True)["f"]
+    with pytest.raises(KeyError):
+        lazy["not_a_field"]
+
+
+def _write_v73_file(path, variables):
+    """Write a .mat file with the layout MATLAB uses for v7.3 files. dicts are written as
+    structs, lists of dicts as 1xn struct arrays, tuples as 1xn cell arrays, strings as char
+    arrays and everything else as double arrays."""
+    h5py = pytest.importorskip("h5py")
+    with h5py.File(path, "w", userblock_size=512) as h5file:
+        refs = h5file.create_group("#refs#")
+
+        def write(parent, name, value):
+            if isinstance(value, dict):
+                node = parent.create_group(name)
+                for field, field_value in value.items():
+                    write(node, field, field_value)
+                matlab_class = "struct"
+            elif isinstance(value, list):
+                node = parent.create_group(name)
+                for field in value[0]:
+                    field_refs = node.create_dataset(field, (len(value), 1), dtype=h5py.ref_dtype)
+                    for idx, elem in enumerate(value):
+                        field_refs[idx, 0] = write(refs, str(len(refs)), elem[field]).ref
+                matlab_class = "struct"
+            elif isinstance(value, tuple):
+                node = parent.create_dataset(name, (len(value), 1), dtype=h5py.ref_dtype)
+                for idx, elem in enumerate(value):
+                    node[idx, 0] = write(refs, str(len(refs)), elem).ref
+                matlab_class = "cell"
+            elif isinstance(value, str):
+                node = parent.create_dataset(name, data=np.array([[ord(c) for c in value]], dtype=np.uint16).T)
+                matlab_class = "char"
+            else:
+                node = parent.create_dataset(name, data=np.atleast_2d(np.asarray(value, dtype=float)).T)
+                matlab_class = "double"
+            node.attrs["MATLAB_class"] = np.bytes_(matlab_class)
+            return node
+
+        for name, value in variables.items():
+            write(h5file, name, value)
+
+    header = b"MATLAB 7.3 MAT-file, Platform: GLNXA64".ljust(116) + b"\x00" * 8 + b"\x00\x02IM"
+    with open(path, "r+b") as f:
+        f.write(header)
+
+
+@pytest.fixture
+def v73_file(tmp_path):
+    path = tmp_path / "results_v73.mat"
+    _write_v73_file(
+        path,
+        {
+            "f": {
+                "chi2": 3.5,
+                "par": [{"id": "R1", "val": 1.0}, {"id": "R2", "val": 2.0}],
+                "cell": ("a", "bc"),
+            },
+            "K": np.arange(24.0).reshape(8, 3),
+        },
+    )
+    return path
+
+
+def test_load_v73_file(v73_file):
+    """Tests that v7.3 (HDF5) files are read into the same structures as v5 files."""
+    data = load_matlab_file(v73_file)
+    assert set(data) == {"f", "K"}
+    assert data["f"]["chi2"] == 3.5
+    assert [par["id"] for par in data["f"]["par"]] == ["R1", "R2"]
+    assert data["f"]["cell"].tolist() == ["a", "bc"]
+    np.testing.assert_array_equal(data["K"], np.arange(24.0).reshape(8, 3))
+    assert set(load_matlab_file(v73_file, variable_names=["f"])) == {"f"}
+
+
+def test_load_v73_file_lazy(v73_file):
+    """Tests that structs are dereferenced on access and arrays are read from disk in blocks."""
+    from incawrapper.core.hdf5_matlab_file import H5MatArray, H5MatStruct
+
+    data = load_matlab_file(v73_file, lazy=True)
+    assert isinstance(data["f"], H5MatStruct)
+    assert isinstance(data["f"]["par"][1], H5MatStruct)
+    assert data["f"]["par"][1]["id"] == "R2"
+    assert data["f"].to_dict()["par"][0] == {"id": "R1", "val": 1.0}
+
+    expected = np.arange(24.0).reshape(8, 3)
+    K = data["K"]
+    assert isinstance(K, H5MatArray)
+    assert K.shape == (8, 3)
+    np.testing.assert_array_equal(K[2:5], expected[2:5])
+    np.testing.assert_array_equal(K[:, 1], expected[:, 1])
+    np.testing.assert_array_equal(np.concatenate(list(K.iter_blocks(3))), expected)
+    np.testing.assert_array_equal(K.memmap(), expected)
+
+
+def test_load_v73_file_large_arrays_stay_on_disk(v73_file, monkeypatch):
+    """Tests that large arrays are not read into memory, also when lazy is False."""
+    from incawrapper.core import hdf5_matlab_file
+
+    monkeypatch.setattr(hdf5_matlab_file, "LARGE_ARRAY_BYTES", 100)
+    data = load_matlab_file(v73_file)
+    assert isinstance(data["K"], hdf5_matlab_file.H5MatArray)
+    assert data["f"]["chi2"] == 3.5
+
+
+def test_load_v73_file_closes_the_file(v73_file, monkeypatch):
+    """Tests that the file is closed when no proxies are returned, and that the proxies close the
+    file explicitly or when they are garbage collected."""
+    import gc
+    from incawrapper.core import hdf5_matlab_file
+
+    opened = []
+    h5py_file = hdf5_matlab_file.h5py.File
+
+    def recording_file(*args, **kwargs):
+        opened.append(h5py_file(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(hdf5_matlab_file.h5py, "File", recording_file)
+
+    data = load_matlab_file(v73_file)
+    assert data["f"]["chi2"] == 3.5
+    assert not opened[-1]  # a closed h5py file is falsy
+
+    with load_matlab_file(v73_file, lazy=True)["f"] as f:
+        assert f["par"][0]["id"] == "R1"
+        assert opened[-1]
+    assert not opened[-1]
+
+    data = load_matlab_file(v73_file, lazy=True)
+    np.testing.assert_array_equal(data["K"][0], [0.0, 1.0, 2.0])
+    del data
+    gc.collect()
+    assert not opened[-1]
@@ -0,0 +1,102 @@
+import os
+import pathlib
+import time
+import numpy as np
+import scipy.io
+from incawrapper.core.hdf5_matlab_file import H5MatArray
+from incawrapper.core.monte_carlo_dump import MonteCarloDumpReader, follow_monte_carlo_dump
+from incawrapper.core.INCAMonteCarloResults import INCAMonteCarloResults
+from .test_load_matlab_file import _write_v73_file
+
+current_dir = pathlib.Path(__file__).parent.absolute()
+parameter_names = ["A", "B", "C"]
+
+
+def _write_dump(path, k, mtime_ns):
+    scipy.io.savemat(path, {"k": k, "ci0": np.zeros((2, 3))})
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_poll_reads_only_new_iterations(tmp_path):
+    """Tests that the reader appends the new iterations of the dump file to the samples."""
+    k = np.random.default_rng(0).random((3, 4, 3))
+    dumpfile = tmp_path / "dump.mat"
+    reader = MonteCarloDumpReader(dumpfile, parameter_names, min_reread_interval=0)
+    assert reader.poll() is None  # the file does not exist yet
+
+    _write_dump(dumpfile, k[0], 1_000_000_000)
+    progress = reader.poll()
+    assert progress.n_iterations == 1
+    np.testing.assert_array_equal(progress.new_samples, k[0])
+    assert reader.poll() is None  # unchanged file
+
+    _write_dump(dumpfile, k, 2_000_000_000)
+    progress = reader.poll()
+    assert progress.n_iterations == 3
+    assert progress.n_samples == 12
+    np.testing.assert_array_equal(progress.new_samples, k[1:].reshape(-1, 3))
+    np.testing.assert_array_equal(reader.samples_array, k.reshape(-1, 3))
+    assert list(progress.running_ci.index) == ["lb", "ub"]
+    np.testing.assert_allclose(progress.summary.mean, k.reshape(-1, 3).mean(axis=0))
+
+
+def test_poll_matches_monte_carlo_results():
+    """Tests that the samples read from a dump file equal the samples of INCAMonteCarloResults."""
+    dumpfile = current_dir / "test_data" / "dump.mat"
+    names = ["A", "B", "C", "D", "E", "F", "G"]
+    reader = MonteCarloDumpReader(dumpfile, names)
+    progress = reader.poll()
+    np.testing.assert_array_equal(reader.samples_array, INCAMonteCarloResults(dumpfile, names).samples_array)
+    assert progress.ci.shape == (2, 7)
+
+
+def test_follow_calls_callback_until_timeout(tmp_path):
+    """Tests that follow yields the progress, calls the callback and stops at the timeout."""
+    dumpfile = tmp_path / "dump.mat"
+    _write_dump(dumpfile, np.ones((2, 4, 3)), 1_000_000_000)
+    received = []
+    updates = list(
+        follow_monte_carlo_dump(dumpfile, parameter_names, poll_interval=0.01, timeout=0.05, callback=received.append)
+    )
+    assert len(updates) == 1
+    assert received == updates
+    assert updates[0].n_samples == 8
+
+
+def test_poll_reads_only_new_iterations_of_v73_files(tmp_path, monkeypatch):
+    """Tests that only the new iterations of a v7.3 dump file are read from the file."""
+    k = np.random.default_rng(0).random((5, 4, 3))
+    dumpfile = tmp_path / "dump.mat"
+    read_shapes = []
+    read = H5MatArray._read
+
+    def recording_read(self, key):
+        data = read(self, key)
+        read_shapes.append(data.shape)
+        return data
+
+    monkeypatch.setattr(H5MatArray, "_read", recording_read)
+    reader = MonteCarloDumpReader(dumpfile, parameter_names)
+
+    _write_v73_file(dumpfile, {"k": k[:2], "ci0": np.zeros((2, 3))})
+    assert reader.poll().n_iterations == 2
+    _write_v73_file(dumpfile, {"k": k, "ci0": np.zeros((2, 3))})
+    progress = reader.poll()
+    assert progress.n_iterations == 5
+    np.testing.assert_array_equal(progress.new_samples, k[2:].reshape(-1, 3))
+    np.testing.assert_array_equal(reader.samples_array, k.reshape(-1, 3))
+    assert (3, 4, 3) in read_shapes and (5, 4, 3) not in read_shapes
+
+
+def test_full_reads_of_v5_files_are_rate_limited(tmp_path):
+    """Tests that a changed v5 dump file is not read again within min_reread_interval."""
+    k = np.random.default_rng(0).random((3, 4, 3))
+    dumpfile = tmp_path / "dump.mat"
+    reader = MonteCarloDumpReader(dumpfile, parameter_names, min_reread_interval=0.2)
+    _write_dump(dumpfile, k[:1], 1_000_000_000)
+    assert reader.poll().n_iterations == 1
+    _write_dump(dumpfile, k, 2_000_000_000)
+    assert reader.poll() is None
+
+    time.sleep(0.25)
+    assert reader.poll().n_iterations == 3
@@ -0,0 +1,94 @@
+import pathlib
+import numpy as np
+import pytest
+from incawrapper.core.INCAResults import INCAResults
+from incawrapper.core.INCAScript import INCAScript
+from incawrapper.core.INCAScript_writing import define_options, define_runner
+from incawrapper.core.inca_backends import FakeINCABackend
+from incawrapper.core.multistart import merge_fits, run_inca_multistart, shard_fit_starts
+
+current_dir = pathlib.Path(__file__).parent
+
+
+def _script(output_file: pathlib.Path, run_montecarlo: bool = False) -> INCAScript:
+    inca_script = INCAScript()
+    inca_script.add_to_block("options", define_options(fit_starts=1000, sim_na=False))
+    inca_script.add_to_block("runner", define_runner(output_file, run_montecarlo=run_montecarlo))
+    return inca_script
+
+
+def test_shard_fit_starts(tmp_path):
+    inca_script = _script(tmp_path / "output.mat")
+    shards = shard_fit_starts(inca_script, fit_starts=10, n_shards=3)
+
+    options = [shard.blocks["options"] for shard in shards]
+    assert [int(block.split("fit_starts = ")[1].split(";")[0]) for block in options] == [4, 3, 3]
+    seeds = {block.split("rng(")[1].split(")")[0] for block in options}
+    assert len(seeds) == 3
+    assert [shard.output_files["filename"] for shard in shards] == [
+        (tmp_path / f"output_start{idx}.mat").resolve() for idx in range(3)
+    ]
+    # the script is not modified and the seeds are reproducible
+    assert "rng(" not in inca_script.blocks["options"]
+    assert [shard.matlab_script for shard in shard_fit_starts(inca_script, 10, 3)] == [
+        shard.matlab_script for shard in shards
+    ]
+    assert len(shard_fit_starts(inca_script, fit_starts=2, n_shards=3)) == 2
+
+    with pytest.raises(ValueError, match="Monte Carlo"):
+        shard_fit_starts(_script(tmp_path / "output.mat", run_montecarlo=True), 10, 3)
+
+
+def test_run_inca_multistart_merges_the_best_fit(tmp_path, inca_results_simple_model_filename):
+    # the quickstart fit has a lower chi2 than the test data fit and has 14 restarts of R1
+    other_fit = current_dir / "test_data" / "simple_model_output.mat"
+    canned_files = [other_fit, inca_results_simple_model_filename, other_fit, inca_results_simple_model_filename]
+    backend = FakeINCABackend(
+        lambda script: canned_files[int(script.output_files["filename"].stem[-1])]
+    )
+
+    fitdata = run_inca_multistart(
+        _script(tmp_path / "output.mat"), tmp_path / "INCAv2.2", fit_starts=1000, n_shards=4, backend=backend
+    )
+
+    assert len(backend.runs) == 4
+    assert fitdata.inca_matlab_file == (tmp_path / "output.mat").resolve()
+    assert fitdata.chi2 == INCAResults(inca_results_simple_model_filename).fitdata.chi2
+    r1_vals = fitdata.fitted_parameters.set_index("id").loc["R1", "vals"]
+    expected_vals = INCAResults(inca_results_simple_model_filename).fitdata.fitted_parameters["vals"].iat[0]
+    np.testing.assert_array_equal(r1_vals, np.concatenate([expected_vals, expected_vals]))
+    # the output file contains the best fit
+    assert INCAResults(tmp_path / "output.mat").fitdata.chi2 == fitdata.chi2
+
+
+def test_run_inca_multistart_failed_shards(tmp_path, inca_results_simple_model_filename):
+    def results(script, failing_shards=("1",)):
+        if script.output_files["filename"].stem[-1] in failing_shards:
+            raise RuntimeError("MATLAB error")
+        return inca_results_simple_model_filename
+
+    with pytest.warns(UserWarning, match=r"shards \[1\]"):
+        fitdata = run_inca_multistart(
+            _script(tmp_path / "output.mat"), tmp_path, fit_starts=10, n_shards=2, backend=FakeINCABackend(results)
+        )
+    assert fitdata.chi2 == INCAResults(inca_results_simple_model_filename).fitdata.chi2
+    assert len(merge_fits([inca_results_simple_model_filename]).fitted_parameters["vals"].iat[0]) == 14
+
+    with pytest.raises(RuntimeError, match="All shards"):
+        run_inca_multistart(
+            _script(tmp_path / "output.mat"), tmp_path, fit_starts=10, n_shards=2,
+            backend=FakeINCABackend(lambda script: results(script, failing_shards=("0", "1"))),
+        )
+
+
+def test_run_inca_multistart_backend_and_engine_pool(tmp_path, monkeypatch):
+    """Invalid combinations of backends fail before the shards are created."""
+    from incawrapper.core import multistart
+    from incawrapper.core.matlab_engine_pool import MatlabEnginePool
+
+    monkeypatch.setattr(multistart, "shard_fit_starts", lambda *args: pytest.fail("shards were created"))
+    with pytest.raises(ValueError, match="backend cannot be combined with engine_pool"):
+        run_inca_multistart(
+            _script(tmp_path / "output.mat"), tmp_path, fit_starts=4, n_shards=2,
+            engine_pool=MatlabEnginePool(tmp_path), backend=FakeINCABackend(tmp_path / "results.mat"),
+        )
@@ -0,0 +1,334 @@
+import asyncio
+import contextlib
+import pathlib
+import shutil
+import stat
+import sys
+import threading
+import time
+import pytest
+from incawrapper.core.INCAResults import INCAResults
+from incawrapper.core.INCAScript import INCAScript
+from incawrapper.core.inca_backends import FakeINCABackend, SubprocessINCABackend
+from incawrapper.core.matlab_engine_pool import EngineBackend, MatlabEnginePool
+from incawrapper.core.INCAScript_writing import define_runner
+from incawrapper.core.result_cache import RunResultCache
+from incawrapper.core.run_inca import run_inca, run_inca_async, run_inca_batch
+
+
+def _script(output_file: pathlib.Path) -> INCAScript:
+    inca_script = INCAScript()
+    inca_script.add_to_block("runner", define_runner(output_file))
+    return inca_script
+
+
+def test_result_cache_store_and_restore(tmp_path):
+    cache = RunResultCache(tmp_path / "cache", "INCAv2.2")
+    inca_script = _script(tmp_path / "run1" / "output.mat")
+    assert cache.lookup(inca_script) is None
+    assert cache.store(inca_script) is None  # the script has not been run
+
+    (tmp_path / "run1").mkdir()
+    (tmp_path / "run1" / "output.mat").write_bytes(b"results")
+    cache.store(inca_script)
+
+    other_output_script = _script(tmp_path / "run2" / "output.mat")
+    assert cache.restore(other_output_script)
+    assert (tmp_path / "run2" / "output.mat").read_bytes() == b"results"
+    assert not RunResultCache(tmp_path / "cache", "INCAv2.3").restore(other_output_script)
+
+
+def test_run_inca_uses_result_cache(tmp_path):
+    """A cached script is not run, thus this works without MATLAB."""
+    inca_base_directory = tmp_path / "INCAv2.2"
+    cache = RunResultCache(tmp_path / "cache", "INCAv2.2")
+    (tmp_path / "output.mat").write_bytes(b"results")
+    cache.store(_script(tmp_path / "output.mat"))
+
+    run_inca(_script(tmp_path / "new_output.mat"), inca_base_directory, result_cache=tmp_path / "cache")
+    assert (tmp_path / "new_output.mat").read_bytes() == b"results"
+
+
+class FakeEngine:
+    """Stand-in for a MATLAB engine that records the calls. Running a script writes the output
+    file of the runner block, or fails if fail_next_script is set."""
+
+    def __init__(self):
+        self.calls = []
+        self.cwd = None
+        self.fail_next_script = False
+        self.script_duration = 0.0
+
+    def cd(self, path, nargout=0):
+        self.cwd = pathlib.Path(path)
+        self.calls.append("cd")
+
+    def eval(self, code, nargout=0):
+        self.calls.append(code)
+
+    def quit(self):
+        self.calls.append("quit")
+
+    def startup(self, nargout=0):
+        self.calls.append("startup")
+
+    def setpath(self, nargout=0):
+        self.calls.append("setpath")
+
+    def inca_script(self, nargout=0, background=False):
+        if background:
+            return FakeFuture(lambda: self.inca_script(nargout), self.script_duration)
+        self.calls.append("inca_script")
+        script = (self.cwd / "inca_script.m").read_text()
+        if self.fail_next_script or "error('fail')" in script:
+            raise RuntimeError("MATLAB error")
+        output_file = script.split("filename = '")[1].split("'")[0]
+        pathlib.Path(output_file).write_bytes(b"results")
+
+
+class FakeFuture:
+    """Stand-in for the future returned by the MATLAB engine for background execution."""
+
+    def __init__(self, run, duration):
+        self.run = run
+        self.finish_time = time.monotonic() + duration
+        self.cancelled = False
+
+    def done(self):
+        return self.cancelled or time.monotonic() >= self.finish_time
+
+    def cancel(self):
+        self.cancelled = True
+        return True
+
+    def result(self):
+        return self.run()
+
+
+class FakeEngineBackend(EngineBackend):
+    def __init__(self, script_duration=0.0):
+        self.engines = []
+        self.script_duration = script_duration
+
+    def start_engine(self):
+        self.engines.append(FakeEngine())
+        self.engines[-1].script_duration = self.script_duration
+        return self.engines[-1]
+
+
+def test_run_inca_with_engine_pool(tmp_path):
+    backend = FakeEngineBackend()
+    with MatlabEnginePool(tmp_path / "INCAv2.2", backend=backend) as pool:
+        for idx in range(3):
+            run_inca(_script(tmp_path / f"output{idx}.mat"), tmp_path / "INCAv2.2", engine_pool=pool)
+            assert (tmp_path / f"output{idx}.mat").read_bytes() == b"results"
+
+        # INCA is only started once, and the engine is reset between the scripts
+        assert len(backend.engines) == 1
+        calls = backend.engines[0].calls
+        assert calls.count("startup") == 1
+        assert calls.count("inca_script") == 3
+        assert calls.count("clear functions") == 3
+
+        # a failed engine is replaced
+        backend.engines[0].fail_next_script = True
+        with pytest.raises(RuntimeError):
+            run_inca(_script(tmp_path / "failed.mat"), tmp_path / "INCAv2.2", engine_pool=pool)
+        assert backend.engines[0].calls[-1] == "quit"
+        run_inca(_script(tmp_path / "output.mat"), tmp_path / "INCAv2.2", engine_pool=pool)
+        assert len(backend.engines) == 2
+    assert backend.engines[1].calls[-1] == "quit"
+    assert pool.n_engines == 0
+
+
+def test_run_inca_batch(tmp_path):
+    backend = FakeEngineBackend()
+    scripts = [_script(tmp_path / f"output{idx}.mat") for idx in range(8)]
+    scripts[3].add_to_block("options", "error('fail')\n")
+
+    results = run_inca_batch(scripts, tmp_path / "INCAv2.2", n_workers=3, engine_backend=backend)
+
+    assert [result.inca_script for result in results] == scripts
+    assert [result.succeeded for result in results] == [True] * 3 + [False] + [True] * 4
+    assert isinstance(results[3].error, RuntimeError)
+    assert results[0].output_files["filename"].read_bytes() == b"results"
+    assert 1 <= len(backend.engines) <= 4  # at most 3 at a time, the failed engine is replaced
+    assert all(engine.calls[-1] == "quit" for engine in backend.engines)
+
+
+def test_run_inca_batch_output_file_collision(tmp_path):
+    scripts = [_script(tmp_path / "output.mat"), _script(tmp_path / "output.mat")]
+    with pytest.raises(ValueError, match="both save their results"):
+        run_inca_batch(scripts, tmp_path / "INCAv2.2", engine_backend=FakeEngineBackend())
+
+
+def test_run_inca_batch_engine_pool_and_engine_backend(tmp_path):
+    backend = FakeEngineBackend()
+    with MatlabEnginePool(tmp_path / "INCAv2.2", backend=backend) as pool:
+        with pytest.raises(ValueError, match="engine_backend"):
+            run_inca_batch([_script(tmp_path / "output.mat")], tmp_path / "INCAv2.2", engine_pool=pool,
+                           engine_backend=backend)
+    assert backend.engines == []
+
+
+def test_backend_cannot_be_combined_with_engines(tmp_path):
+    backend = FakeINCABackend(tmp_path / "results.mat")
+    pool = MatlabEnginePool(tmp_path / "INCAv2.2", backend=FakeEngineBackend())
+    inca_script = _script(tmp_path / "output.mat")
+    with pytest.raises(ValueError, match="backend cannot be combined"):
+        run_inca(inca_script, tmp_path / "INCAv2.2", engine_pool=pool, backend=backend)
+    with pytest.raises(ValueError, match="backend cannot be combined"):
+        asyncio.run(run_inca_async(inca_script, tmp_path / "INCAv2.2", engine_pool=pool, backend=backend))
+    for engines in [{"engine_pool": pool}, {"engine_backend": FakeEngineBackend()}]:
+        with pytest.raises(ValueError, match="backend cannot be combined"):
+            run_inca_batch([inca_script], tmp_path / "INCAv2.2", backend=backend, **engines)
+    assert backend.runs == []
+
+
+def test_run_inca_async(tmp_path):
+    backend = FakeEngineBackend()
+
+    async def main(pool):
+        # two scripts run concurrently in the event loop
+        await asyncio.gather(*[
+            run_inca_async(_script(tmp_path / f"output{idx}.mat"), tmp_path, engine_pool=pool, poll_interval=0.01)
+            for idx in range(2)
+        ])
+
+    with MatlabEnginePool(tmp_path, size=2, backend=backend) as pool:
+        asyncio.run(main(pool))
+    assert (tmp_path / "output0.mat").read_bytes() == b"results"
+    assert (tmp_path / "output1.mat").read_bytes() == b"results"
+    assert len(backend.engines) == 2
+
+
+def test_run_inca_async_releases_the_engine_in_a_thread(tmp_path):
+    """Resetting or shutting down the engine blocks, thus it must not run in the event loop."""
+    backend = FakeEngineBackend()
+    release_threads = []
+
+    async def main(pool):
+        loop_thread = threading.current_thread()
+        for idx, code in enumerate(["", "error('fail')\n"]):
+            inca_script = _script(tmp_path / f"output{idx}.mat")
+            inca_script.add_to_block("options", code)
+            with contextlib.suppress(RuntimeError):
+                await run_inca_async(inca_script, tmp_path, engine_pool=pool, poll_interval=0.01)
+        return loop_thread
+
+    with MatlabEnginePool(tmp_path, backend=backend) as pool:
+        original_start = backend.start_engine
+
+        def start_engine():
+            engine = original_start()
+            engine.eval = lambda code, nargout=0: release_threads.append(threading.current_thread())
+            engine.quit = lambda: release_threads.append(threading.current_thread())
+            return engine
+
+        backend.start_engine = start_engine
+        loop_thread = asyncio.run(main(pool))
+    # the engine is reset after the first script and shut down after the failed one
+    assert len(release_threads) == 2
+    assert loop_thread not in release_threads
+
+
+def test_run_inca_async_timeout_and_cancel(tmp_path):
+    backend = FakeEngineBackend(script_duration=10.0)
+    pool = MatlabEnginePool(tmp_path, backend=backend)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run_inca_async(_script(tmp_path / "output.mat"), tmp_path, engine_pool=pool,
+                                   timeout=0.05, poll_interval=0.01))
+    assert backend.engines[0].calls[-1] == "quit"  # the engine of the cancelled run is shut down
+
+    async def cancel_run():
+        task = asyncio.create_task(
+            run_inca_async(_script(tmp_path / "output.mat"), tmp_path, engine_pool=pool, poll_interval=0.01)
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cancel_run())
+    assert backend.engines[1].calls[-1] == "quit"
+    assert pool.n_engines == 0
+    assert not (tmp_path / "output.mat").exists()
+
+
+def test_fake_backend_runs_the_pipeline_without_matlab(tmp_path, inca_results_simple_model_filename):
+    scripts = [_script(tmp_path / f"output{idx}.mat") for idx in range(3)]
+    scripts[1].add_to_block("options", "error('fail')\n")
+
+    def results(inca_script):
+        if "error('fail')" in inca_script.matlab_script:
+            raise RuntimeError("MATLAB error")
+        return {"filename": inca_results_simple_model_filename}
+
+    backend = FakeINCABackend(results)
+    batch_results = run_inca_batch(scripts, tmp_path / "INCAv2.2", n_workers=2, backend=backend)
+    assert [result.succeeded for result in batch_results] == [True, False, True]
+    assert len(backend.runs) == 3
+
+    asyncio.run(run_inca_async(_script(tmp_path / "async.mat"), tmp_path, backend=backend))
+    expected = INCAResults(inca_results_simple_model_filename).fitdata.fitted_parameters[["id", "val"]]
+    for output_file in [tmp_path / "output0.mat", tmp_path / "async.mat"]:
+        assert INCAResults(output_file).fitdata.fitted_parameters[["id", "val"]].equals(expected)
+
+
+def _fake_matlab(tmp_path) -> pathlib.Path:
+    """Executable that mimics `matlab -batch`: it runs the script in the directory of the last
+    cd command by writing its output file, or fails if the script contains error('fail')."""
+    executable = tmp_path / "matlab"
+    executable.write_text(
+        f"#!{sys.executable}\n"
+        "import pathlib, sys\n"
+        "code = sys.argv[sys.argv.index('-batch') + 1]\n"
+        "directory = code.split('cd(')[-1].split(')')[0].strip(\"'\")\n"
+        "script = (pathlib.Path(directory) / 'inca_script.m').read_text()\n"
+        "print('MATLAB started with', sys.argv[1:-2])\n"
+        "import resource; print('open files', resource.getrlimit(resource.RLIMIT_NOFILE))\n"
+        "if \"error('fail')\" in script:\n"
+        "    print('Error: fail')\n"
+        "    sys.exit(1)\n"
+        "pathlib.Path(script.split(\"filename = '\")[1].split(\"'\")[0]).write_bytes(b'results')\n"
+    )
+    executable.chmod(executable.stat().st_mode | stat.S_IXUSR)
+    return executable
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake matlab executable is a POSIX script")
+def test_subprocess_backend(tmp_path):
+    backend = SubprocessINCABackend(_fake_matlab(tmp_path), extra_args=["-nodisplay"], timeout=60)
+    command = backend.command(tmp_path / "run" / "inca_script.m", tmp_path / "INCAv2.2")
+    assert command[1:3] == ["-nodisplay", "-batch"]
+    assert command[3].endswith("startup; setpath; cd('%s'); inca_script" % (tmp_path / "run").resolve())
+
+    (tmp_path / "run").mkdir()
+    run_inca(_script(tmp_path / "output.mat"), tmp_path / "INCAv2.2", tmp_path / "run", backend=backend)
+    assert (tmp_path / "output.mat").read_bytes() == b"results"
+    assert "-nodisplay" in (tmp_path / "run" / "inca_script.log").read_text()
+
+    failing_script = _script(tmp_path / "failed.mat")
+    failing_script.add_to_block("options", "error('fail')\n")
+    with pytest.raises(RuntimeError, match="Error: fail"):
+        run_inca(failing_script, tmp_path / "INCAv2.2", backend=backend)
+    with pytest.raises(RuntimeError, match="exited with code 1"):
+        asyncio.run(run_inca_async(failing_script, tmp_path / "INCAv2.2", backend=backend))
+    asyncio.run(run_inca_async(_script(tmp_path / "async.mat"), tmp_path / "INCAv2.2", backend=backend))
+    assert (tmp_path / "async.mat").read_bytes() == b"results"
+
+
+@pytest.mark.skipif(shutil.which("prlimit") is None, reason="resource limits require the prlimit command")
+def test_subprocess_backend_resource_limits(tmp_path):
+    import resource
+
+    backend = SubprocessINCABackend(_fake_matlab(tmp_path), resource_limits={resource.RLIMIT_NOFILE: (64, 128)})
+    command = backend.command(tmp_path / "inca_script.m", tmp_path / "INCAv2.2")
+    assert command[1:4] == ["--nofile=64:128", "--", str(tmp_path / "matlab")]
+
+    (tmp_path / "run").mkdir()
+    run_inca(_script(tmp_path / "output.mat"), tmp_path / "INCAv2.2", tmp_path / "run", backend=backend)
+    assert "open files (64, 128)" in (tmp_path / "run" / "inca_script.log").read_text()
+    with pytest.raises(ValueError, match="not supported"):
+        SubprocessINCABackend(resource_limits={-1: (1, 1)})
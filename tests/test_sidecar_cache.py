@@ -0,0 +1,65 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from incawrapper.core.sidecar_cache import MISSING, SidecarCache
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def mat_file(tmp_path):
+    path = tmp_path / "results.mat"
+    path.write_bytes(b"matlab data")
+    return path
+
+
+def test_object_columns_are_json_encoded(mat_file):
+    """Columns that Arrow cannot represent are restored with their types, without pickle."""
+    df = pd.DataFrame({
+        "mixed": ["a", np.array([1.0, np.nan]), {"id": np.empty(0)}, None],
+        "nested": [np.array([np.array([1, 2]), "x"], dtype=object), [1, "b"], np.float32(2.5), 3],
+    })
+    SidecarCache(mat_file).save("frame", df)
+
+    parquet_file = mat_file.with_name("results.mat.incawrapper_cache") / "frame.parquet"
+    assert b"pickle" not in parquet_file.read_bytes()
+    cached = SidecarCache(mat_file).load("frame")
+    assert cached["mixed"][0] == "a"
+    np.testing.assert_array_equal(cached["mixed"][1], [1.0, np.nan])
+    assert cached["mixed"][2]["id"].shape == (0,) and cached["mixed"][3] is None
+    np.testing.assert_array_equal(cached["nested"][0][0], [1, 2])
+    assert cached["nested"][0][0].dtype == df["nested"][0][0].dtype
+    assert cached["nested"][1] == [1, "b"]
+    assert cached["nested"][2] == np.float32(2.5) and type(cached["nested"][2]) is np.float32
+
+
+def test_concurrent_caches_do_not_lose_entries(mat_file):
+    """Two caches of the same file, e.g. in two processes, write their entries independently."""
+    first, second = SidecarCache(mat_file), SidecarCache(mat_file)
+    first.load("chi2")
+    second.load("chi2")
+    first.save("chi2", 1.5)
+    second.save("frame", pd.DataFrame({"x": [1.0]}))
+    second.save("dof", 3)
+
+    cache = SidecarCache(mat_file)
+    assert cache.load("chi2") == 1.5
+    assert cache.load("dof") == 3
+    assert cache.load("frame")["x"].tolist() == [1.0]
+
+
+def test_entries_of_another_file_version_are_ignored(mat_file):
+    stale = SidecarCache(mat_file)
+    stale.load("chi2")
+    mat_file.write_bytes(b"new matlab data")
+    SidecarCache(mat_file).load("chi2")  # discards the cache of the old file
+
+    # an entry written afterwards by a cache that validated the old file is not used
+    stale.save("chi2", 1.5)
+    stale.save("frame", pd.DataFrame({"x": [1.0]}))
+    cache = SidecarCache(mat_file)
+    assert cache.load("chi2") is MISSING
+    assert cache.load("frame") is MISSING
+    manifest = json.loads(cache.manifest_file.read_text())
+    assert manifest["version"] == 2
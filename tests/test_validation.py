@@ -0,0 +1,48 @@
+import pandas as pd
+import pandera as pa
+import pytest
+from incawrapper.core.validation import check_input, validation_cache, trusted_input
+from incawrapper.core.INCAScript_writing import define_ms_data, define_tracers
+from incawrapper.core.dataschemas import MSMeasurementsSchema
+
+
+def _counting_schema():
+    """Schema that counts how many times it has validated a dataframe."""
+    calls = []
+    schema = pa.DataFrameSchema(
+        {"x": pa.Column(pa.Float, coerce=True)},
+        checks=pa.Check(lambda df: calls.append(1) is None),
+    )
+    return schema, calls
+
+
+def test_validation_cache_validates_once():
+    schema, calls = _counting_schema()
+
+    @check_input(schema)
+    def first_value(df):
+        return df["x"].iloc[0]
+
+    df = pd.DataFrame({"x": [1, 2]})
+    first_value(df)
+    first_value(df)
+    assert len(calls) == 2
+
+    with validation_cache():
+        assert first_value(df) == 1.0
+        assert isinstance(first_value(df=df), float)  # the coerced dataframe is reused
+        first_value(df.copy())
+    assert len(calls) == 4
+
+
+def test_trusted_input_skips_validation(tracer_df_test, ms_measurements_test):
+    tracer_df_test["enrichment"] = "[0.5, 0.5]"  # invalid type
+    with pytest.raises(pa.errors.SchemaError):
+        define_tracers(tracer_df_test, "exp1")
+
+    expected_ms_script = define_ms_data(ms_measurements_test, "exp1")
+    with trusted_input():
+        assert define_tracers(tracer_df_test, "exp1").startswith("% define tracers used in exp1")
+        # trusted data must already have the dtypes coerced by the schema
+        validated_ms_measurements = MSMeasurementsSchema.validate(ms_measurements_test)
+        assert define_ms_data(validated_ms_measurements, "exp1") == expected_ms_script